@@ -0,0 +1,52 @@
+#replay.py
+#
+# Replay device: a simulated potentiostat that plays back the samples a rep recorded
+#   (its signal and background) instead of making samples up. The run process uses it
+#   for g.PROC_TYPE_REPLAY requests (see replay in process.py), so a saved rep can be
+#   sent thru everything a live run goes thru (the run process, its frames, the run
+#   viewer's queue, live plot and save) with no device attached.
+#
+# Tests are run back to back, as on the device: each test sends the recorded samples
+#   taken after the time it starts (or, for the first test, at it) up to the time it
+#   ends in the run, with times counted from the start of the test. Steps that collect
+#   no data were not recorded, so tests that only run such steps send nothing, and take
+#   no time.
+#
+#   This module does not import Qt so it can be used by the process script.
+
+import numpy as np
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_core import get_rep_data
+from devices.simulated import SimulatedPotentiostat
+
+TIME_TOLERANCE = 1e-6           # recorded times are rounded, so test boundaries are matched this loosely [s]
+
+
+def get_recording(path, ids):
+    """Returns (t, v, i) arrays of every sample the rep with ids (run-id, rep-id) of the
+    session at path recorded, signal and background, in the order they were taken. A
+    sample taken right where a signal and a background step meet is stored with both,
+    but is only returned once."""
+    (signal, background) = get_rep_data(path, ids)
+    cols = [np.concatenate((signal[key], background[key])) for key in g.R_DATA_COLUMNS]
+    (t, first) = np.unique(cols[0], return_index=True)     # (sorted by time)
+    return (t, cols[1][first], cols[2][first])
+
+
+class ReplayPotentiostat(SimulatedPotentiostat):
+    def __init__(self, recording, speed=1):
+        super().__init__(g.REPLAY_PORT, speed=speed)
+        self.recording = recording
+        self.elapsed = 0                        # time into the run at which the next test starts [s]
+
+    def get_samples(self, segments):
+        start = self.elapsed
+        self.elapsed = start + sum(seg[0] for seg in segments)
+        (t, v, i) = self.recording
+        if start:                                       # (a sample at the end of the last test was sent with it)
+            k0 = np.searchsorted(t, start + TIME_TOLERANCE, side='right')
+        else:                                           # the first test also sends the sample taken at its start
+            k0 = np.searchsorted(t, start - TIME_TOLERANCE, side='left')
+        k1 = np.searchsorted(t, self.elapsed + TIME_TOLERANCE, side='right')
+        return (t[k0:k1] - start, v[k0:k1], i[k0:k1])
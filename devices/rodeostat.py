@@ -0,0 +1,23 @@
+#rodeostat.py
+#
+# Device backend for IO Rodeo's Rodeostat, on a serial port (see get_device_backend in
+#   process.py). Only runs need the device libraries, so they are imported when they are
+#   used rather than with this module.
+#
+# A backend has two functions:
+#   - find_ports()      returns the names of the ports that may hold a device, best guess first
+#   - connect(port)     returns the device on port, with the potentiostat library's interface.
+#                       Raises an error if there isn't one.
+
+
+def find_ports():
+    import serial.tools.list_ports
+    ports = []
+    for port in serial.tools.list_ports.comports():     # the device name contains "USB Serial Device" or "ItsyBitsy M4"
+        if 'USB Serial Device' in port.description or 'ItsyBitsy' in port.description:
+            ports.append(port.device)
+    return ports
+
+def connect(port):
+    from potentiostat import Potentiostat
+    return Potentiostat(port)
@@ -0,0 +1,206 @@
+#simulated.py
+#
+# Device backend with a simulated potentiostat, for running methods with no device attached
+#   (eg. to load test the run process, the live plot and saving on a machine without a
+#   Rodeostat). Select it with g.DEVICE_BACKEND, or by setting the environment variable
+#   g.DEVICE_BACKEND_ENV to g.DEVICE_BACKEND_SIMULATED (see get_device_backend in process.py).
+#
+# SimulatedPotentiostat answers the calls process.py makes to the potentiostat library
+#   (run_test with 'constant', 'linearSweep' and 'multiStep' tests, sample rate, current and
+#   voltage ranges, DIO pins), and streams made up samples to on_data at the sample rate:
+#
+#       - the voltage follows the test's program exactly
+#       - the current is a small resistive background, a charging spike each time the
+#         voltage jumps and, while the voltage sweeps, a capacitive offset and a stripping
+#         peak at each of PEAKS, all scaled to the current range, plus noise
+#
+#   Samples come in real time, or g.SIM_SPEED times faster (overridden by the environment
+#   variable g.SIM_SPEED_ENV). A speed of 0 sends them as fast as on_data takes them. Times
+#   are those of the simulated run either way, so a run looks the same at any speed.
+#
+#   This module does not import Qt so it can be used by the process script.
+
+import os
+import time
+import numpy as np
+from re import sub
+
+from global_scripts import ov_globals as g
+
+PORT = 'SIM0'                                   # the only port the simulated device is found on
+HARDWARE_VARIANT = 'simulated'
+VOLT_RANGES = ['1V', '2V', '5V', '10V']         # sorted low -> high, as the Rodeostat's
+TESTS = ['constant', 'linearSweep', 'multiStep']
+DIO_MODES = ('Input', 'Output', 'InputPullUp')
+
+PEAKS = ((-0.55, 0.25, 0.04),                   # (potential [V], height [fraction of the current range], width [V])
+         (-0.1, 0.12, 0.05))                    #   of each stripping peak
+BACKGROUND = 0.02                               # resistive background [fraction of the current range per V]
+CAPACITIVE = 0.01                               # offset while sweeping [fraction of the current range]
+SPIKE = 0.5                                     # charging spike when the voltage jumps [fraction of the current range per V]...
+SPIKE_TIME = 0.02                               # ...that decays with this time constant [s]
+NOISE = 0.002                                   # standard deviation of the noise [fraction of the current range]
+MAX_SLEEP = 0.01                                # longest wait between checks for due samples [s]
+
+
+def find_ports():
+    return [PORT]
+
+def connect(port):
+    if port != PORT:
+        raise ValueError('No simulated potentiostat on port '+str(port))
+    return SimulatedPotentiostat(port, speed=get_speed())
+
+def get_speed():
+    """Returns how many times faster than real time the simulated device runs"""
+    speed = os.environ.get(g.SIM_SPEED_ENV)
+    return float(speed) if speed else g.SIM_SPEED
+
+
+class SimulatedPotentiostat():
+    def __init__(self, port, speed=1, peaks=PEAKS, noise=NOISE, seed=None):
+        self.port = port
+        self.speed = speed
+        self.peaks = peaks
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.auto_connect = False
+        self.sample_rate = 100                  # [Hz]
+        self.curr_range = '100uA'
+        self.volt_range = VOLT_RANGES[0]
+        self.volt = 0                           # where the last test left the voltage [V]
+        self.dio_modes = {}                     # pin -> mode
+        self.dio_values = {}                    # pin -> 'High' or 'Low'
+
+    #### DEVICE INFO AND SETTINGS
+    def get_hardware_variant(self):
+        return HARDWARE_VARIANT
+
+    def set_auto_connect(self, value):
+        self.auto_connect = value
+
+    def get_test_names(self):
+        return list(TESTS)
+
+    def get_all_volt_range(self):
+        return list(VOLT_RANGES)
+
+    def get_volt_range(self):
+        return self.volt_range
+
+    def set_volt_range(self, volt_range):
+        if volt_range not in VOLT_RANGES:
+            raise ValueError('Unknown voltage range: '+str(volt_range))
+        self.volt_range = volt_range
+
+    def get_curr_range(self):
+        return self.curr_range
+
+    def set_curr_range(self, curr_range):
+        if curr_range not in g.CURRENT_RANGES:
+            raise ValueError('Unknown current range: '+str(curr_range))
+        self.curr_range = curr_range
+
+    def get_sample_rate(self):
+        return self.sample_rate
+
+    def set_sample_rate(self, rate):
+        if rate <= 0:
+            raise ValueError('Sample rate must be positive')
+        self.sample_rate = rate
+
+    def get_sample_period(self):
+        return g.S2MS / self.sample_rate        # [ms]
+
+    #### DIO
+    def set_dio_pin_mode(self, pin, mode):
+        if mode not in DIO_MODES:
+            raise ValueError('Unknown DIO pin mode: '+str(mode))
+        self.dio_modes[pin] = mode
+
+    def get_dio_pin_mode(self, pin):
+        return self.dio_modes.get(pin, 'Input')
+
+    def set_dio_value(self, pin, value):
+        if self.dio_modes.get(pin) != 'Output':
+            raise ValueError('DIO pin '+str(pin)+' is not an output')
+        self.dio_values[pin] = value
+
+    def get_dio_value(self, pin):
+        return self.dio_values.get(pin, 'Low')
+
+    #### TESTS
+    def run_test(self, testname, param=None, on_data=None, display=None, filename=None):
+        """Runs the test testname with the parameters param (as the potentiostat library
+        takes them: voltages in [V], times in [ms]), calling on_data(chan, t, volt, curr)
+        for each sample as it is due. Returns (t, volt, curr) lists of every sample."""
+        segments = get_segments(testname, param or {})
+        (t, v, i) = self.get_samples(segments)
+        self.stream(t, v, i, on_data)
+        self.volt = segments[-1][2]
+        return (t.tolist(), v.tolist(), i.tolist())
+
+    def get_samples(self, segments):
+        """Takes in the (duration [s], start voltage, end voltage) segments of a test.
+        Returns (t, v, i) arrays of the samples the test takes."""
+        dt = 1 / self.sample_rate
+        durations = np.array([seg[0] for seg in segments])
+        ends = np.cumsum(durations)
+        n = int(round(ends[-1] / dt))
+        t = np.arange(1, n+1) * dt
+        k = np.minimum(np.searchsorted(ends, t - dt/2), len(segments) - 1)     # segment each sample is in
+        starts = ends - durations
+        v0 = np.array([seg[1] for seg in segments])
+        v1 = np.array([seg[2] for seg in segments])
+        into = t - starts[k]
+        frac = np.divide(into, durations[k], out=np.zeros(n), where=durations[k] > 0)
+        v = v0[k] + (v1[k] - v0[k]) * np.clip(frac, 0, 1)
+
+        full = int(sub('[^0-9]', '', self.curr_range))
+        jumps = v0 - np.concatenate(([self.volt], v1[:-1]))                     # voltage step at the start of each segment
+        sweep = np.sign(v1 - v0)[k]
+        i = BACKGROUND * v + SPIKE * jumps[k] * np.exp(-into / SPIKE_TIME) + CAPACITIVE * sweep
+        for (peak_v, height, width) in self.peaks:
+            i = i + sweep * height * np.exp(-((v - peak_v) / width)**2)
+        i = full * (i + self.noise * self.rng.standard_normal(n))
+        return (t, v, np.clip(i, -full, full))                                 # the device saturates at its range
+
+    def stream(self, t, v, i, on_data):
+        """Sends the samples to on_data as they become due"""
+        if on_data is None:
+            return
+        (t, v, i) = (t.tolist(), v.tolist(), i.tolist())
+        started = time.perf_counter()
+        k = 0
+        while k < len(t):
+            k_due = len(t)
+            if self.speed:
+                due = (time.perf_counter() - started) * self.speed  # time into the test that has passed
+                k_due = int(np.searchsorted(t, due, side='right'))
+                if k_due == k:
+                    time.sleep(min((t[k] - due) / self.speed, MAX_SLEEP))
+                    continue
+            for j in range(k, k_due):
+                on_data(0, t[j], v[j], i[j])
+            k = k_due
+
+
+def get_segments(testname, param):
+    """Takes in a test and its parameters. Returns the test's voltage program as a list
+    of (duration [s], start voltage, end voltage) segments, quiet period first."""
+    segments = []
+    quiet = param.get('quietTime', 0) / g.S2MS
+    if quiet > 0:
+        segments.append((quiet, param['quietValue'], param['quietValue']))
+    if testname == 'constant':
+        segments.append((param['duration'] / g.S2MS, param['value'], param['value']))
+    elif testname == 'linearSweep':
+        segments.append((param['duration'] / g.S2MS, param['startValue'], param['finalValue']))
+    elif testname == 'multiStep':
+        for (duration, value) in param['step']:
+            segments.append((duration / g.S2MS, value, value))
+    else:
+        raise ValueError('The simulated potentiostat cannot run '+str(testname)+' tests')
+    if not segments or sum(seg[0] for seg in segments) <= 0:
+        raise ValueError('Test has no duration')
+    return segments
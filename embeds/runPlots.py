@@ -6,6 +6,7 @@ runVoltagePlot.py
 from global_scripts import ov_globals as g
 from global_scripts import ov_lang as l
 from global_scripts.ov_functions import *
+from global_scripts.ov_lod import MinMaxDecimator, chunk_length
 
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT, FigureCanvasQTAgg  
 from matplotlib.figure import Figure
@@ -47,6 +48,21 @@ class RunPlots(QMainWindow):
         widget = QWidget()              # Add layout to central widget of QMainWindow and show!
         widget.setLayout(layout)
         self.setCentralWidget(widget)
+
+        # Live data is drawn by blitting: everything that doesn't change (axes, the measurement spans, and all
+        #   data drawn so far) is kept as a saved image of the figure (self.background). Each update only draws
+        #   the samples that are new since the last one on top of it, so an update costs the same no matter
+        #   how long the run has been going. Whenever the whole figure is redrawn (resize, zoom, pan, new
+        #   limits), on_draw draws all the data so far again and saves a new background. That full draw is
+        #   decimated to the plot's resolution (see ov_lod): the decimators keep the decimated data and only
+        #   decimate new samples, until a zoom, pan or resize changes the resolution.
+        self.line_v = None              # Line2D artists for the live data (made in init_plot)
+        self.line_I = None
+        self.data = None                # (t, v, I) of the last update
+        self.n_drawn = 0                # number of samples in the saved background
+        self.background = None
+        self.decimators = None          # (chunk length, MinMaxDecimator for v, MinMaxDecimator for I)
+        self.canvas.mpl_connect('draw_event', self.on_draw)
         self.show()
 
     def init_plot(self, method):
@@ -68,6 +84,13 @@ class RunPlots(QMainWindow):
             self.canvas.axes_v.axvspan(t_step[0],t_step[1],facecolor='#f6e3fc')
             self.canvas.axes_I.axvspan(t_step[0],t_step[1],facecolor='#f6e3fc')
 
+        (self.line_v,) = self.canvas.axes_v.plot([], [], 'grey', animated=True)   # animated lines are left out of
+        (self.line_I,) = self.canvas.axes_I.plot([], [], 'black', animated=True)  #   full redraws, on_draw draws them
+        self.t_max = 1.02*duration      # x and current limits that the data has to stay within
+        self.I_lims = None              #   before the whole figure is redrawn with bigger ones
+        self.data = None
+        self.n_drawn = 0
+        self.decimators = None
         self.canvas.draw()
 
     def set_axis_labels(self):
@@ -76,18 +99,66 @@ class RunPlots(QMainWindow):
         self.canvas.axes_I.set_xlabel('Time [s]')
 
     def update_plots(self, t, v, I):
-        
-        #for line in list(self.canvas.axes_v.lines):     # remove all existing lines from plot
-        #    line.remove()
-
-        self.remove_all_lines()
-            
-        self.canvas.axes_v.plot(t, v, 'grey')
-        self.canvas.axes_I.plot(t, I, 'black')
-        self.canvas.draw()
+        """Takes in all of the run's data so far (arrays, eg. views of its AcquisitionBuffer)
+        and draws the samples that are new since the last update"""
+        if not self.line_v or not len(t):
+            return
+        self.data = (t, v, I)
+        i0 = max(self.n_drawn - 1, 0)                   # start one sample back so the new bit joins the old
+        if self.limits_exceeded(t[i0:], I[i0:]) or self.background is None:
+            self.canvas.draw()                          # redraw the whole figure (on_draw draws all the data)
+            return
+
+        self.canvas.restore_region(self.background)
+        self.line_v.set_data(t[i0:], v[i0:])
+        self.line_I.set_data(t[i0:], I[i0:])
+        self.canvas.axes_v.draw_artist(self.line_v)
+        self.canvas.axes_I.draw_artist(self.line_I)
+        self.canvas.blit(self.canvas.axes_v.bbox)
+        self.canvas.blit(self.canvas.axes_I.bbox)
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)  # the new samples are now part of the background
+        self.n_drawn = len(t)
+
+    def limits_exceeded(self, t, I):
+        """Takes in new samples. If they don't fit in the plot's limits, widens the
+        limits and returns True. Otherwise returns False."""
+        exceeded = False
+        if t[-1] > self.t_max:
+            self.t_max = 1.1*t[-1]
+            self.canvas.axes_v.set_xlim(left=0, right=self.t_max)
+            exceeded = True
+        (lo, hi) = (np.nanmin(I), np.nanmax(I))
+        if self.I_lims is None or lo < self.I_lims[0] or hi > self.I_lims[1]:
+            if self.I_lims is not None:
+                (lo, hi) = (min(lo, self.I_lims[0]), max(hi, self.I_lims[1]))
+            margin = 0.1*(hi - lo) or 0.1*abs(hi) or 1
+            self.I_lims = (lo - margin, hi + margin)
+            self.canvas.axes_I.set_ylim(bottom=self.I_lims[0], top=self.I_lims[1])
+            exceeded = True
+        return exceeded
+
+    def on_draw(self, event):
+        """Runs after every full redraw of the figure. Draws all the data so far
+        on top of it and saves the result as the background for updates."""
+        if not self.line_v:
+            return
+        if self.data:
+            (t, v, I) = self.data
+            axes = self.canvas.axes_v
+            chunk = chunk_length(t, axes.bbox.width, axes.get_xlim())
+            if not self.decimators or self.decimators[0] != chunk:     # resolution changed (or first draw)
+                self.decimators = (chunk, MinMaxDecimator(chunk), MinMaxDecimator(chunk))
+            self.line_v.set_data(*self.decimators[1].update(t, v))
+            self.line_I.set_data(*self.decimators[2].update(t, I))
+            self.canvas.axes_v.draw_artist(self.line_v)
+            self.canvas.axes_I.draw_artist(self.line_I)
+            self.n_drawn = len(t)
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
 
     def clear_axes(self):
         self.remove_all_lines()
+        self.line_v = None              # the live data lines went with the rest
+        self.line_I = None
         for axes in self.axes:
             axes.cla()
         self.canvas.draw()
@@ -22,18 +22,22 @@ There are two ways to add data to the plot:
     runs. All reps of the same run are styled (color and linestyle) the
     same. A legend is displayed that shows the styles for each run.
 
+Data lines are drawn decimated to the plot's resolution (see ov_lod), and
+are decimated again on every zoom, pan or resize.
+
 """
 
 from global_scripts import ov_globals as g
 from global_scripts import ov_lang as l
 from global_scripts.ov_functions import *
+from global_scripts.ov_lod import MinMaxLOD
+from global_scripts import ov_analysis
 
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT, FigureCanvasQTAgg
 from matplotlib.figure import Figure
 
 import numpy as np
 import pandas as pd
-from scipy.signal import savgol_filter, butter, filtfilt, argrelextrema
 
 from PyQt6.QtWidgets import QMainWindow, QVBoxLayout, QWidget
 
@@ -70,6 +74,7 @@ class VoltamogramPlot(QMainWindow):
 
         self.set_axis_labels()
         self.axes = self.canvas.axes
+        self.lod = MinMaxLOD(self.axes)                                                     # keeps data lines decimated to what the plot can show
 
         self.colors = ['deeppink','limegreen','chocolate','mediumturquoise','gold','purple','red','blue']
         self.linestyles = ['solid', 'dotted', 'dashed', 'dashdot']
@@ -88,78 +93,34 @@ class VoltamogramPlot(QMainWindow):
         self.canvas.axes.set_xlabel('Voltage [V]')
         self.canvas.axes.set_ylabel('Current [uA]')
 
-    def plot_rep(self, rep, subbackground=True, showsmoothed=False, showraw=True, predictpeak=False, color='black', linestyle='solid', lbl=''):
-        if rep[g.R_DATA]:
-            # 1. Convert rep signal and background data to 1D numpy arrays then resize
-            # 1a. Convert to numpy array
-            x = np.array(pd.DataFrame(rep[g.R_DATA])[[g.R_DATA_VOLT]].values)
-            x = x.reshape(x.shape[0])
-            y = np.array(pd.DataFrame(rep[g.R_DATA])[[g.R_DATA_CURR]].values)
-            y = y.reshape(y.shape[0])
-            '''x = self.resize_data(x, g.VOG_RESIZE)
-            y = self.resize_data(y, g.VOG_RESIZE)'''
-
-            if rep[g.R_BACKGROUND]:
-                x_back = np.array(pd.DataFrame(rep[g.R_BACKGROUND])[[g.R_DATA_VOLT]].values)
-                x_back = x_back.reshape(x_back.shape[0])
-                y_back = np.array(pd.DataFrame(rep[g.R_BACKGROUND])[[g.R_DATA_CURR]].values)
-                y_back = y_back.reshape(y_back.shape[0])
-
-                ###### DO NOT RESIZE EITHER SIGNAL OR BACKGROUND
-                #
-                '''
-                if x.size > x_back.size:
-                    x_back = self.resize_data(x_back, x.size)
-                    y_back = self.resize_data(y_back, x.size)
-                elif x.size < x_back.size:
-                    x = self.resize_data(x, x_back.size)
-                    y = self.resize_data(y, x_back.size)
-                '''
-                #
-                ##################################################
-
-            else:
-                x_back, y_back = (np.zeros(0), np.zeros(0))
-
-            # 2. If background is present & subbackground==True, interpolate background and subtract
-            if x_back.size and subbackground:
-                y_back = np.interp(x, x_back, y_back)   # interpolate background to match voltage of signal
-                y = y - y_back                          # subtrack background from signal
-
-            y_raw = y.copy()                            # store copy of y as y_raw in case we want to display it to user
+    def plot_rep(self, rep, subbackground=True, showsmoothed=False, showraw=True, predictpeak=False, color='black', linestyle='solid', lbl='', analysis=None):
+        if has_raw_data(rep[g.R_DATA]):
+            # 1. Grab rep signal and background data, subtract the background if subbackground==True (the
+            #   background is interpolated to match the voltage of the signal) and smooth the result if
+            #   showsmoothed==True as the method calls for (see ov_analysis.get_curve)
+            method = rep[g.R_UID_METHOD]
+            (x, y_raw, y) = ov_analysis.get_curve(rep[g.R_DATA], rep[g.R_BACKGROUND], method,
+                                                  subbackground=subbackground, smoothed=showsmoothed)
 
-            # 3. Show raw data
+            # 2. Show raw data
             if showraw:                                 # first, show raw data if requested
-                self.canvas.axes.plot(x, y_raw, 'lightgrey', linestyle=linestyle,
-                                      linewidth=1, label='raw data')
-
-            # 4. If smooth, smooth result
-            if showsmoothed:
-            
-                method = rep[g.R_UID_METHOD]            # get method from rep
-                window = method[g.M_SG_WINDOW]
-                order = method[g.M_SG_ORDER]
-
-                # 4a. If the method calls for smoothing (Savitzky Golay) do it!
-                if method[g.M_SG]:
-                    y = savgol_filter(y, window_length=window,
-                                      polyorder=order, mode='nearest')
+                raw, = self.canvas.axes.plot(x, y_raw, 'lightgrey', linestyle=linestyle,
+                                             linewidth=1, label='raw data')
+                self.lod.add(raw, x, y_raw)
 
-                # 4b. If method calls for low pass filtering, do it!
-                if method[g.M_LP]:
-                    y = self.butter_lowpass_filter(y, method)
-
-
-            # 5. If predictpeak, guess baseline and peak locations, store as vars in self
+            # 3. If predictpeak, start from the baseline and peak of analysis if one was passed in (eg. a
+            #   provisional analysis), otherwise guess them, store as vars in self
             if predictpeak:
-                peak, base = self.get_predicted_basepoints(x, y, method)
+                basepoints = ov_analysis.get_analysis_basepoints(x, analysis) if analysis else None
+                peak, base = basepoints or ov_analysis.get_predicted_basepoints(x, y, method)
             
-            # 6. Show smoothed data
+            # 4. Show smoothed data
             if showsmoothed:
                 self.smoothed, = self.canvas.axes.plot(x, y, color, linestyle=linestyle,
                                       linewidth=2, label=lbl, picker=2)          
+                self.lod.add(self.smoothed, x, y)                                   # (picking uses self.x/self.y, not the drawn points)
 
-            # 7. If predictpeak, show baseline (with adjustable handles) and peak location
+            # 5. If predictpeak, show baseline (with adjustable handles) and peak location
             if predictpeak:
                 self.x = x      # store x and y for access from mouseclick/move handlers
                 self.y = y
@@ -197,144 +158,6 @@ class VoltamogramPlot(QMainWindow):
             self.canvas.draw()
 
 
-    #####################################################
-    #                                                   #
-    #   PEAK FINDING FUNCTIONS AND THEIR FRIENDS        #
-    #           (BETWEEN REVOLUTIONS :P )               #
-    #                                                   #
-    #   1. get_local_extremes()                         #
-    #   2. get_x_y_valules()                            #
-    #   3. get_index_of_closest_vaule(l, val)           #
-    #   4. get_predicted_basepoints()                   #
-    #                                                   #
-    #####################################################
-
-    def get_local_extremes_i(self, data):
-        data = np.gradient(data)
-        prev_d = None
-        mins = []
-        maxes = []
-        for i,d in enumerate(data):
-            if d == 0:
-                pass
-            elif prev_d:
-                if d*prev_d < 0:  # if this and the previous data point are on oposite sides of zero
-                    if prev_d > 0:
-                        if abs(d)<abs(prev_d): maxes.append(i)
-                        else: maxes.append(i-1)
-                    else:
-                        if abs(d)<abs(prev_d): mins.append(i)
-                        else: mins.append(i-1)
-                prev_d = d
-            else:
-                prev_d = d
-    
-        return mins, maxes
-
-    def get_x_y_values(self, x, y, iz):
-        """Takes in:
-        - x, a numpy array of x values
-        - y, a numpy array of y values
-        - iz, a list of indices such that all indices in iz are on both x and y
-        ALGORITHM:
-        For each index, grab the corresponding x and y values.
-        Returns:
-          - [0], a list of the x values at the indices
-          - [1], a list of the y values at the indices"""
-        ext_x = []
-        ext_y = []
-        for i in iz:
-            ext_x.append(float(x[i]))
-            ext_y.append(float(y[i]))
-        return ext_x, ext_y
-
-    def get_index_of_closest_value(self, l, val):
-        """takes in a list of floats or ints, l, and a vaule (float or int).
-        Returns the index of the value in l which is closest to val"""
-        difs = []
-        for el in l:
-            dif = abs(float(val)-float(el))
-            difs.append(dif)
-        min_dif = min(difs)
-        return difs.index(min_dif)
-
-    def get_predicted_basepoints(self, x, y, method):
-        base = ((x[0], x[-1]), (y[0], y[-1]))               # set defaullt basepoints to ends of curve
-        peak = (0,0)
-        
-        I_d1 = np.gradient(y, x)                            # 1st deriv
-        I_d2 = np.gradient(I_d1, x)                         # 2nd deriv
-        I_d3 = np.gradient(I_d2, x)                         # 3rd deriv
-             
-        mins0_i, maxes0_i = self.get_local_extremes_i(y)         # maxes/mins of originall function
-        mins2_i, maxes2_i = self.get_local_extremes_i(I_d2)      # maxes/mins of 2nd deriv
-        mins3_i, maxes3_i = self.get_local_extremes_i(I_d3)      # maxes/mins of 3rd deriv
-
-        # 1. Guess the peak
-        peaks_x, peaks_y = self.get_x_y_values(x, y, maxes0_i)   # get x and y vaules of the local maxes of y
-
-        if len(peaks_x) == 0:                               # no peaks id'd, set baseline endpoints to end of run values
-            return peak, base 
-                                                    
-        vmin = method[g.M_PEAK_V_MIN]                       # if there is at least 1 identified peak    
-        vmax = method[g.M_PEAK_V_MAX]                       # grab the index of the peak closest to the middle
-        x_mid = vmin + (vmax-vmin)/2.                       # of the user-set expected peak voltage range
-        i = self.get_index_of_closest_value(peaks_x, x_mid)
-
-        peak = (peaks_x[i],peaks_y[i])
-        peak_i = maxes0_i[i]
-
-        # 2. Guess the basepoints 
-        bp_candidates_i = mins0_i + maxes2_i + maxes3_i     # Start with all possible basepoints (mins of y or maxes of y'' or y''')
-        bps_left_i = []
-        bps_right_i = []
-        n = x.size
-        cutoff_i = 0.075*n                                  # define a cutoff (nearness to the end for which we'll ignore possible basepoints)
-        
-        for bp_i in bp_candidates_i:
-            if bp_i > cutoff_i and bp_i < n - cutoff_i:     # discard any possible basepoints that are too close to ends of data
-                if bp_i < peak_i:                           # if basepoint to the left of peak
-                    bps_left_i.append(bp_i)                 #   add it to the list of possible basepoints left of peak
-                elif bp_i > peak_i:                         # if its to the right of the peak (ok to discard peak)
-                    bps_right_i.append(bp_i)                #   add it to the list of possible basepoints right of peak
-
-        bp_pairs_i = []                                     # Build a list of possible basepoints, inculde distance between them
-        for i in bps_left_i:
-            for j in bps_right_i:
-                bp_pairs_i.append({'left': i,
-                                   'right': j,
-                                   'dif': j-i})
-                                            
-        bp_pairs_i = list(reversed(sorted(bp_pairs_i, key=lambda x: x['dif'])))     # sort the list from largest to smallest difference
-        bp_found = False
-        for pair in bp_pairs_i:                             # loop through all possible pairs (from furthest apart to closest)
-            i1, i2 = pair['left'], pair['right']            # as soon as we find a pair whose baseline doesn't intersect the curve
-            x1, y1, x2, y2 = x[i1], y[i1], x[i2], y[i2]     # at all, those are our baselines!
-            m = (y2 - y1) / (x2 - x1)                       # slope
-            b = y2 - m*x2                                   # intercept
-
-            blx = x[i1+1:i2]                                # array of x vaules for baseline (exculde actual baseline points where baseline for sure intersects
-            bly = []                
-            for val in blx:
-                bly.append(m*val+b)                         # for each baseline x value, get the corresponding baseline y value (y = mx+b)
-
-            y_sub = y[i1+1:i2]                              # subset of y that matchest range of this particular baseilne
-
-            bly = np.array(bly)                             # convert to np arrays for intersection comparison
-            y_sub = np.array(y_sub)
-
-            intersections = np.argwhere(np.diff(np.sign(y_sub-bly))).flatten() # get list of indices of intersection points between baseline and curve
-
-            if len(intersections) == 0:                     # if the lines don't cross
-                bp_found = True                             # we found our suggested baseline!
-                break
-
-        if bp_found:                                        # if a baseline was found, 
-            base = ((x1, x2), (y1,y2))                      #   overwrite the default baselines with our new found baseline
-
-        return peak, base
-
-            
     #################################################
     #                                               #
     #   Interactivity handlers (and their friends)  #
@@ -408,22 +231,7 @@ class VoltamogramPlot(QMainWindow):
         ALGORITHM: picks highest point between the two endpoints
             of the baseline."""
         
-        (x0, y0, x1, y1, m, b) = self.get_baseline_params()
-
-        if x0==x1:          # if the endpoints are on top of one another
-            x_max = x0      # do this to avoid a divide-by-zero error
-            y_max = y0
-            y_max_base = y0
-        else:
-            x_min_index = np.where(self.x == x0)[0][0]  # get data index of lower bound
-            x_max_index = np.where(self.x == x1)[0][0]  # get data index of upper bound
-            
-            i_max = np.argmax(self.y[x_min_index:x_max_index]) + x_min_index    # get index of highest point between bounds
-
-            y_max = self.y[i_max]
-            x_max = self.x[i_max]
-            y_max_base = m * x_max + b
-
+        (x_max, y_max_base, y_max) = ov_analysis.guess_peak(self.x, self.y, self.base_x, self.base_y)
         self.set_peak(x_max, y_max_base, y_max)
 
     def drag_peak(self, i):
@@ -455,46 +263,9 @@ class VoltamogramPlot(QMainWindow):
         self.peakpoint.set_ydata([y1])
 
     def get_baseline_params(self):
-        """lower bound of baseline: (x0, y0)
-        upper bound of baseline: (x1, y1)
-        slope of baseline: m
-        y-intercetp of baseline: b
-
-        returns (x0, y0, x1, y1, m, b)"""
-        
-        i_lo = np.argmin(self.base_x)
-        i_hi = 1-i_lo
-
-        x0 = self.base_x[i_lo]
-        y0 = self.base_y[i_lo]
-        x1 = self.base_x[i_hi]
-        y1 = self.base_y[i_hi]
-
-        if x0==x1:                      # avoid divide-by-zero error
-            return (x0, y0, x1, y1, 0, 0)
-        
-        m = float(y1-y0)/float(x1-x0)   # slope of baseline
-        b = y0-m*x0                     # y intercept of baseline
-        return (x0, y0, x1, y1, m, b)
-
-    def get_derivs(self):
-        (x0, y0, x1, y1, m, b) = self.get_baseline_params()
-        x0i = np.where(self.x==x0)[0][0]
-        x1i = np.where(self.x==x1)[0][0]
-        peakxi = np.where(self.x==self.peak_x)[0][0]
-
-        x_left = self.x[x0i:peakxi+1]
-        y_left = self.y[x0i:peakxi+1]
-        x_right = self.x[peakxi:x1i+1]
-        y_right = self.y[peakxi:x1i+1]
-
-        d_left = np.gradient(y_left, x_left)
-        d_right = np.gradient(y_right, x_right)
-        l_max = abs(float(max(d_left)))
-        r_max = abs(float(min(d_right)))
-        mean_max = (l_max + r_max) / 2.
-
-        return l_max, r_max, mean_max
+        """returns (x0, y0, x1, y1, m, b), the lower and upper bounds of the baseline,
+        its slope and its y-intercept (see ov_analysis.get_baseline_params)"""
+        return ov_analysis.get_baseline_params(self.base_x, self.base_y)
 
     def tell_parent_plot_updated(self):
         try:
@@ -512,15 +283,17 @@ class VoltamogramPlot(QMainWindow):
     #                                   #
     #####################################
 
-    def plot_reps(self, reps, subbackground=True, showsmoothed=False, showraw=True, predictpeak=False, color=None, legend=True):
-        # 1. Get data from file for specified reps
+    def plot_reps(self, reps, subbackground=True, showsmoothed=False, showraw=True, predictpeak=False, color=None, legend=True, raw=None, analysis=None):
+        # raw: optional dict of {(run_id, rep_id): (data, background)} for reps whose raw data is already in memory
+        # analysis: optional analysis to start the baseline and peak from (if predictpeak), instead of guessing them
+        # 1. Get data from file for specified reps (unless it was passed in raw)
         path = self.grandparent.path
         if not confirmPathExists(path):
             reopenSession(self.grandparent, self.parent)            
             return
         
         
-        all_data = get_data_from_file(path)     # read file including all raw data
+        all_data = self.grandparent.data        # session metadata (raw data is read per rep below)
         
         reps_to_disp = []
         runs_to_disp = []
@@ -545,19 +318,13 @@ class VoltamogramPlot(QMainWindow):
                     for fullrep in fullrun[g.R_REPLICATES]:
                         if fullrep[g.R_UID_SELF] == rep_id:
                             found = True
-                            try: 
-                                rep[g.R_DATA] = fullrep[g.R_DATA]               # grab data if there is any
-                            except Exception as e:
-                                print(e)
-                                rep[g.R_DATA] = []
-                            try:
-                                rep[g.R_BACKGROUND] = fullrep[g.R_BACKGROUND]   # grab background data if there is any
-                            except Exception as e:
-                                print(e)
-                                rep[g.R_BACKGROUND] = []
+                            if raw and tuple(task) in raw:
+                                (rep[g.R_DATA], rep[g.R_BACKGROUND]) = raw[tuple(task)]
+                            else:
+                                (rep[g.R_DATA], rep[g.R_BACKGROUND]) = get_rep_data(path, task, fullrep.get(g.R_RAW_INDEX))   # grab data and background from sidecar
                             break
                     if found: break
-            if rep[g.R_DATA] or rep[g.R_BACKGROUND]:
+            if found and (has_raw_data(rep[g.R_DATA]) or has_raw_data(rep[g.R_BACKGROUND])):
                 rep[g.R_UID_METHOD] = method
                 reps_to_disp.append(rep)
 
@@ -594,7 +361,7 @@ class VoltamogramPlot(QMainWindow):
 
             self.plot_rep(rep, subbackground=subbackground, showsmoothed=showsmoothed,
                           showraw=showraw, predictpeak=predictpeak,
-                          color=lcolor, linestyle=lstyle, lbl=lbl)
+                          color=lcolor, linestyle=lstyle, lbl=lbl, analysis=analysis)
             runs_displayed.append(rep['run_uid'])
             
         # 3. Add legend
@@ -619,7 +386,6 @@ class VoltamogramPlot(QMainWindow):
     #   Helper functions for data processing    #
     #                                           #
     #   1. resize_data                          #
-    #   2. butter_lowpass_filter                #
     #                                           #
     #############################################
 
@@ -645,25 +411,6 @@ class VoltamogramPlot(QMainWindow):
           
         return file_out
 
-    def butter_lowpass_filter(self, data, method):
-        """
-        Applies a Butterworth low-pass filter to the input data.
-
-        Args:
-            data (numpy.array): The input signal.
-            cutoff_freq (float): The cutoff frequency of the filter (in Hz).
-            fs (float): The sampling frequency of the signal (in Hz).
-            order (int): The order of the filter.
-
-        Returns:
-            numpy.array: The filtered signal.
-        """
-        order = method[g.M_LP_ORDER]
-        freq = method[g.M_LP_FREQ]
-        b, a = butter(order, freq, btype='low', analog=False)
-        filtered_data = filtfilt(b, a, data) # Use filtfilt for zero phase distortion
-        return filtered_data
-
 
     #####################################
     #                                   #
@@ -705,18 +452,5 @@ class VoltamogramPlot(QMainWindow):
             return
         
     def get_analysis_results(self):
-        (x0, y0, x1, y1, m, b) = self.get_baseline_params()
-        y_base = m*self.peak_x+b
-        ht = self.peak_y-y_base
-        deriv_l, deriv_r, deriv_avg = self.get_derivs()
-        
-        return {g.A_PEAK_X: float(self.peak_x),
-                g.A_PEAK_Y: float(self.peak_y),
-                g.A_PEAK_HEIGHT: float(ht),
-                g.A_BASE_0_X: float(x0),
-                g.A_BASE_0_Y: float(y0),
-                g.A_BASE_1_X: float(x1),
-                g.A_BASE_1_Y: float(y1),
-                g.A_DERIV_LEFT: deriv_l,
-                g.A_DERIV_RIGHT: deriv_r,
-                g.A_DERIV_MEAN: deriv_avg}
+        return ov_analysis.get_analysis_results(self.x, self.y, self.base_x, self.base_y,
+                                                self.peak_x, self.peak_y)
@@ -0,0 +1,378 @@
+# ov_analysis.py
+#
+# Peak finding on a rep's voltamogram, without a plot.
+#
+#   The analysis window (see VoltamogramPlot) shows each rep with a baseline under its
+#   peak, which the user can move before accepting the analysis. The baseline and peak
+#   it starts from are guessed here (see get_predicted_basepoints and guess_peak).
+#
+#   The run viewer makes that same guess in the background for each rep as soon as it is
+#   saved, and stores it on the rep as a provisional analysis (see analyze_rep), so the
+#   analysis window can open on it instead of working it out pane by pane. A provisional
+#   analysis is stored under g.R_ANALYSIS_PROVISIONAL along with the method settings it
+#   was made with, and is only used while the method still has those settings (see
+#   get_provisional_analysis). It never counts as an analysis of the rep: g.R_ANALYSIS
+#   is only set once the user accepts it.
+#
+#   This module does not import Qt or matplotlib so it can be used without the GUI.
+
+from copy import deepcopy
+
+import numpy as np
+from scipy.signal import savgol_filter, butter, filtfilt
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_core import (has_raw_data,
+                                    get_rep,
+                                    save_data_to_file,
+                                    get_run_from_file_data,
+                                    get_method_from_file_data)
+
+METHOD_KEYS = (g.M_PEAK_V_MIN, g.M_PEAK_V_MAX,      # method settings that change the analysis of a rep
+               g.M_SG, g.M_SG_WINDOW, g.M_SG_ORDER,
+               g.M_LP, g.M_LP_ORDER, g.M_LP_FREQ)
+
+
+#############################################
+#                                           #
+#   Curve                                   #
+#                                           #
+#   1. get_curve                            #
+#   2. smooth                               #
+#   3. butter_lowpass_filter                #
+#                                           #
+#############################################
+
+def get_curve(signal, background, method, subbackground=True, smoothed=True):
+    """Takes in the raw data columns of a rep's signal and background and its method.
+    Returns (x, y_raw, y): the voltage, the current (less the background, if
+    subbackground and there is one) and that current smoothed as the method asks
+    (if smoothed, otherwise y is y_raw)."""
+    x = np.asarray(signal[g.R_DATA_VOLT])
+    y = np.asarray(signal[g.R_DATA_CURR])
+    if subbackground and has_raw_data(background):
+        x_back = np.asarray(background[g.R_DATA_VOLT])
+        y_back = np.asarray(background[g.R_DATA_CURR])
+        y = y - np.interp(x, x_back, y_back)        # interpolate background to match voltage of signal and subtract it
+    y_raw = y.copy()
+    if smoothed:
+        y = smooth(y, method)
+    return (x, y_raw, y)
+
+def smooth(y, method):
+    if method[g.M_SG]:                              # if the method calls for smoothing (Savitzky Golay) do it!
+        y = savgol_filter(y, window_length=method[g.M_SG_WINDOW],
+                          polyorder=method[g.M_SG_ORDER], mode='nearest')
+    if method[g.M_LP]:                              # if method calls for low pass filtering, do it!
+        y = butter_lowpass_filter(y, method)
+    return y
+
+def butter_lowpass_filter(data, method):
+    """
+    Applies a Butterworth low-pass filter to the input data.
+
+    Args:
+        data (numpy.array): The input signal.
+        method (dict): The method, with the filter's order (g.M_LP_ORDER) and
+            cutoff frequency as a fraction of the Nyquist frequency (g.M_LP_FREQ).
+
+    Returns:
+        numpy.array: The filtered signal.
+    """
+    b, a = butter(method[g.M_LP_ORDER], method[g.M_LP_FREQ], btype='low', analog=False)
+    return filtfilt(b, a, data)     # Use filtfilt for zero phase distortion
+
+
+#####################################################
+#                                                   #
+#   PEAK FINDING                                    #
+#                                                   #
+#   1. get_local_extremes_i                         #
+#   2. get_x_y_values                               #
+#   3. get_index_of_closest_value                   #
+#   4. get_predicted_basepoints                     #
+#   5. get_baseline_params                          #
+#   6. guess_peak                                   #
+#   7. get_derivs                                   #
+#   8. get_analysis_results                         #
+#                                                   #
+#####################################################
+
+def get_local_extremes_i(data):
+    data = np.gradient(data)
+    prev_d = None
+    mins = []
+    maxes = []
+    for i,d in enumerate(data):
+        if d == 0:
+            pass
+        elif prev_d:
+            if d*prev_d < 0:  # if this and the previous data point are on oposite sides of zero
+                if prev_d > 0:
+                    if abs(d)<abs(prev_d): maxes.append(i)
+                    else: maxes.append(i-1)
+                else:
+                    if abs(d)<abs(prev_d): mins.append(i)
+                    else: mins.append(i-1)
+            prev_d = d
+        else:
+            prev_d = d
+
+    return mins, maxes
+
+def get_x_y_values(x, y, iz):
+    """Takes in:
+    - x, a numpy array of x values
+    - y, a numpy array of y values
+    - iz, a list of indices such that all indices in iz are on both x and y
+    ALGORITHM:
+    For each index, grab the corresponding x and y values.
+    Returns:
+      - [0], a list of the x values at the indices
+      - [1], a list of the y values at the indices"""
+    ext_x = []
+    ext_y = []
+    for i in iz:
+        ext_x.append(float(x[i]))
+        ext_y.append(float(y[i]))
+    return ext_x, ext_y
+
+def get_index_of_closest_value(l, val):
+    """takes in a list of floats or ints, l, and a vaule (float or int).
+    Returns the index of the value in l which is closest to val"""
+    difs = []
+    for el in l:
+        dif = abs(float(val)-float(el))
+        difs.append(dif)
+    min_dif = min(difs)
+    return difs.index(min_dif)
+
+def get_predicted_basepoints(x, y, method):
+    """Takes in a (smoothed) voltamogram, x and y, and its method. Returns
+    (peak, base): the guessed peak as (x, y) and the guessed baseline endpoints
+    as ((x0, x1), (y0, y1))."""
+    base = ((x[0], x[-1]), (y[0], y[-1]))               # set defaullt basepoints to ends of curve
+    peak = (0,0)
+
+    I_d1 = np.gradient(y, x)                            # 1st deriv
+    I_d2 = np.gradient(I_d1, x)                         # 2nd deriv
+    I_d3 = np.gradient(I_d2, x)                         # 3rd deriv
+
+    mins0_i, maxes0_i = get_local_extremes_i(y)         # maxes/mins of originall function
+    mins2_i, maxes2_i = get_local_extremes_i(I_d2)      # maxes/mins of 2nd deriv
+    mins3_i, maxes3_i = get_local_extremes_i(I_d3)      # maxes/mins of 3rd deriv
+
+    # 1. Guess the peak
+    peaks_x, peaks_y = get_x_y_values(x, y, maxes0_i)   # get x and y vaules of the local maxes of y
+
+    if len(peaks_x) == 0:                               # no peaks id'd, set baseline endpoints to end of run values
+        return peak, base
+
+    vmin = method[g.M_PEAK_V_MIN]                       # if there is at least 1 identified peak
+    vmax = method[g.M_PEAK_V_MAX]                       # grab the index of the peak closest to the middle
+    x_mid = vmin + (vmax-vmin)/2.                       # of the user-set expected peak voltage range
+    i = get_index_of_closest_value(peaks_x, x_mid)
+
+    peak = (peaks_x[i],peaks_y[i])
+    peak_i = maxes0_i[i]
+
+    # 2. Guess the basepoints
+    bp_candidates_i = mins0_i + maxes2_i + maxes3_i     # Start with all possible basepoints (mins of y or maxes of y'' or y''')
+    bps_left_i = []
+    bps_right_i = []
+    n = x.size
+    cutoff_i = 0.075*n                                  # define a cutoff (nearness to the end for which we'll ignore possible basepoints)
+
+    for bp_i in bp_candidates_i:
+        if bp_i > cutoff_i and bp_i < n - cutoff_i:     # discard any possible basepoints that are too close to ends of data
+            if bp_i < peak_i:                           # if basepoint to the left of peak
+                bps_left_i.append(bp_i)                 #   add it to the list of possible basepoints left of peak
+            elif bp_i > peak_i:                         # if its to the right of the peak (ok to discard peak)
+                bps_right_i.append(bp_i)                #   add it to the list of possible basepoints right of peak
+
+    bp_pairs_i = []                                     # Build a list of possible basepoints, inculde distance between them
+    for i in bps_left_i:
+        for j in bps_right_i:
+            bp_pairs_i.append({'left': i,
+                               'right': j,
+                               'dif': j-i})
+
+    bp_pairs_i = list(reversed(sorted(bp_pairs_i, key=lambda x: x['dif'])))     # sort the list from largest to smallest difference
+    bp_found = False
+    for pair in bp_pairs_i:                             # loop through all possible pairs (from furthest apart to closest)
+        i1, i2 = pair['left'], pair['right']            # as soon as we find a pair whose baseline doesn't intersect the curve
+        x1, y1, x2, y2 = x[i1], y[i1], x[i2], y[i2]     # at all, those are our baselines!
+        m = (y2 - y1) / (x2 - x1)                       # slope
+        b = y2 - m*x2                                   # intercept
+
+        blx = x[i1+1:i2]                                # array of x vaules for baseline (exculde actual baseline points where baseline for sure intersects
+        bly = m*blx + b                                 # the baseline's y at each of them (y = mx+b)
+        y_sub = y[i1+1:i2]                              # subset of y that matchest range of this particular baseilne
+
+        side = np.sign(y_sub-bly)                       # which side of the baseline the curve is on at each point
+
+        if not np.any(side[1:] != side[:-1]):           # if the lines don't cross (the curve never changes sides)
+            bp_found = True                             # we found our suggested baseline!
+            break
+
+    if bp_found:                                        # if a baseline was found,
+        base = ((x1, x2), (y1,y2))                      #   overwrite the default baselines with our new found baseline
+
+    return peak, base
+
+def get_baseline_params(base_x, base_y):
+    """Takes in the x and y of both baseline endpoints (in either order).
+    lower bound of baseline: (x0, y0)
+    upper bound of baseline: (x1, y1)
+    slope of baseline: m
+    y-intercetp of baseline: b
+
+    returns (x0, y0, x1, y1, m, b)"""
+    i_lo = np.argmin(base_x)
+    i_hi = 1-i_lo
+
+    x0 = base_x[i_lo]
+    y0 = base_y[i_lo]
+    x1 = base_x[i_hi]
+    y1 = base_y[i_hi]
+
+    if x0==x1:                      # avoid divide-by-zero error
+        return (x0, y0, x1, y1, 0, 0)
+
+    m = float(y1-y0)/float(x1-x0)   # slope of baseline
+    b = y0-m*x0                     # y intercept of baseline
+    return (x0, y0, x1, y1, m, b)
+
+def guess_peak(x, y, base_x, base_y):
+    """Guesses where the peak is, given the baseline endpoints (which must be points
+    of x): the highest point between them. Returns (x of the peak, y of the baseline
+    under the peak, y of the peak)."""
+    (x0, y0, x1, y1, m, b) = get_baseline_params(base_x, base_y)
+
+    if x0==x1:          # if the endpoints are on top of one another
+        return (x0, y0, y0)     # do this to avoid a divide-by-zero error
+
+    x_min_index = np.where(x == x0)[0][0]   # get data index of lower bound
+    x_max_index = np.where(x == x1)[0][0]   # get data index of upper bound
+
+    i_max = np.argmax(y[x_min_index:x_max_index]) + x_min_index    # get index of highest point between bounds
+
+    y_max = y[i_max]
+    x_max = x[i_max]
+    return (x_max, m * x_max + b, y_max)
+
+def get_derivs(x, y, base_x, base_y, peak_x):
+    (x0, y0, x1, y1, m, b) = get_baseline_params(base_x, base_y)
+    x0i = np.where(x==x0)[0][0]
+    x1i = np.where(x==x1)[0][0]
+    peakxi = np.where(x==peak_x)[0][0]
+
+    x_left = x[x0i:peakxi+1]
+    y_left = y[x0i:peakxi+1]
+    x_right = x[peakxi:x1i+1]
+    y_right = y[peakxi:x1i+1]
+
+    d_left = np.gradient(y_left, x_left)
+    d_right = np.gradient(y_right, x_right)
+    l_max = abs(float(max(d_left)))
+    r_max = abs(float(min(d_right)))
+    mean_max = (l_max + r_max) / 2.
+
+    return l_max, r_max, mean_max
+
+def get_analysis_results(x, y, base_x, base_y, peak_x, peak_y):
+    """Returns the analysis of a voltamogram (x, y) with the baseline endpoints and
+    peak given, as stored on a rep"""
+    (x0, y0, x1, y1, m, b) = get_baseline_params(base_x, base_y)
+    y_base = m*peak_x+b
+    ht = peak_y-y_base
+    deriv_l, deriv_r, deriv_avg = get_derivs(x, y, base_x, base_y, peak_x)
+
+    return {g.A_PEAK_X: float(peak_x),
+            g.A_PEAK_Y: float(peak_y),
+            g.A_PEAK_HEIGHT: float(ht),
+            g.A_BASE_0_X: float(x0),
+            g.A_BASE_0_Y: float(y0),
+            g.A_BASE_1_X: float(x1),
+            g.A_BASE_1_Y: float(y1),
+            g.A_DERIV_LEFT: deriv_l,
+            g.A_DERIV_RIGHT: deriv_r,
+            g.A_DERIV_MEAN: deriv_avg}
+
+
+#############################################
+#                                           #
+#   Provisional analysis                    #
+#                                           #
+#   1. analyze_rep                          #
+#   2. get_method_settings                  #
+#   3. get_provisional_analysis             #
+#   4. get_analysis_basepoints              #
+#   5. save_provisional_analysis            #
+#                                           #
+#############################################
+
+def analyze_rep(signal, background, method):
+    """Takes in the raw data columns of a rep's signal and background and its method.
+    Returns what the analysis window would start the rep's analysis from, as a
+    provisional analysis to store on the rep (under g.R_ANALYSIS_PROVISIONAL), or
+    None if the rep can't be analyzed (eg. it has no signal)."""
+    if not has_raw_data(signal):
+        return None
+    try:
+        (x, y_raw, y) = get_curve(signal, background, method)
+        (peak, base) = get_predicted_basepoints(x, y, method)
+        (base_x, base_y) = (np.array(base[0]), np.array(base[1]))
+        (peak_x, y_base, peak_y) = guess_peak(x, y, base_x, base_y)
+        results = get_analysis_results(x, y, base_x, base_y, peak_x, peak_y)
+    except Exception as e:                          # eg. too few samples between the baseline endpoints
+        print(e)
+        return None
+    if not np.all(np.isfinite(list(results.values()))):
+        return None
+    return {g.A_PROVISIONAL_RESULTS: results,
+            g.A_PROVISIONAL_METHOD: get_method_settings(method)}
+
+def get_method_settings(method):
+    """Returns the settings of method that the analysis of a rep depends on"""
+    return {key: method.get(key) for key in METHOD_KEYS}
+
+def get_provisional_analysis(data, ids):
+    """Returns the provisional analysis stored on the rep with ids (run-id, rep-id),
+    as an analysis, or False if it has none or the rep's method has changed since
+    it was made"""
+    rep = get_rep(data, ids)
+    if not rep or not rep.get(g.R_ANALYSIS_PROVISIONAL):
+        return False
+    run = get_run_from_file_data(data, ids[0])
+    method = get_method_from_file_data(data, run[g.R_UID_METHOD])
+    provisional = rep[g.R_ANALYSIS_PROVISIONAL]
+    if not method or provisional[g.A_PROVISIONAL_METHOD] != get_method_settings(method):
+        return False
+    return provisional[g.A_PROVISIONAL_RESULTS]
+
+def get_analysis_basepoints(x, analysis):
+    """Takes in the x of a voltamogram and an analysis of it. Returns the analysis'
+    (peak, base) in the form get_predicted_basepoints returns them, or None if its
+    baseline endpoints are not points of x (the analysis is of other data)."""
+    base_x = (analysis[g.A_BASE_0_X], analysis[g.A_BASE_1_X])
+    if not all(np.any(x == bx) for bx in base_x):
+        return None
+    base = (base_x, (analysis[g.A_BASE_0_Y], analysis[g.A_BASE_1_Y]))
+    return ((analysis[g.A_PEAK_X], analysis[g.A_PEAK_Y]), base)
+
+def save_provisional_analysis(path, ids, raw, data):
+    """Takes in the ids (run-id, rep-id) of a rep that was just saved to the session at
+    path, its raw data (signal, background) and the session data. Guesses the rep's
+    analysis and saves it on the rep as its provisional analysis. Returns the session
+    data after the save. If the rep can't be analyzed, it is left as it is."""
+    try:
+        run = get_run_from_file_data(data, ids[0])
+        provisional = analyze_rep(raw[0], raw[1], get_method_from_file_data(data, run[g.R_UID_METHOD]))
+        if provisional:
+            rep = deepcopy(get_rep(data, ids))
+            rep[g.R_ANALYSIS_PROVISIONAL] = provisional
+            data = save_data_to_file(path, g.SAVE_TYPE_REP_MOD, [[list(ids)], [rep]], data)
+    except Exception as e:
+        print(e)
+    return data
@@ -0,0 +1,59 @@
+# ov_buffer.py
+#
+# Buffer for the samples of a run as they come in from the potentiostat.
+#
+#   Samples are stored in one preallocated float64 array with a row per column in
+#   g.R_DATA_COLUMNS (time, volt, current), sized up front from the length of the
+#   method and its sample frequency (steps that collect no data only send a preview,
+#   see get_step_keep_every). If a run sends more samples than expected, the
+#   array doubles in size. The live plot gets views into the array rather than
+#   copies.
+#
+#   This module does not import Qt so it can be used without the GUI.
+
+import threading
+import numpy as np
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_core import get_method_expected_samples
+
+
+class AcquisitionBuffer():
+    def __init__(self, capacity=g.R_BUFFER_MIN_SAMPLES):
+        self.lock = threading.Lock()            # samples are appended and read from different threads
+        self.arr = np.empty((len(g.R_DATA_COLUMNS), max(int(capacity), 1)), dtype=g.R_DATA_DTYPE)
+        self.n = 0
+
+    @classmethod
+    def for_method(cls, method):
+        """Returns a buffer big enough for every sample of a run of method"""
+        expected = get_method_expected_samples(method)
+        return cls(max(expected * g.R_BUFFER_HEADROOM, g.R_BUFFER_MIN_SAMPLES))
+
+    def __len__(self):
+        return self.n
+
+    def append(self, t, v, i):
+        """Appends a block of samples. t, v and i are equal length 1D arrays"""
+        k = len(t)
+        with self.lock:
+            if self.n + k > self.arr.shape[1]:
+                self.grow(self.n + k)
+            self.arr[0, self.n:self.n+k] = t
+            self.arr[1, self.n:self.n+k] = v
+            self.arr[2, self.n:self.n+k] = i
+            self.n = self.n + k
+
+    def grow(self, needed):
+        capacity = self.arr.shape[1]
+        while capacity < needed:
+            capacity = capacity * 2
+        arr = np.empty((self.arr.shape[0], capacity), dtype=self.arr.dtype)
+        arr[:, :self.n] = self.arr[:, :self.n]
+        self.arr = arr
+
+    def view(self):
+        """Returns (t, v, i), views of every sample appended so far. The views
+        don't see samples appended after this call."""
+        with self.lock:
+            return (self.arr[0, :self.n], self.arr[1, :self.n], self.arr[2, :self.n])
@@ -0,0 +1,1190 @@
+# ov_core.py
+#
+# Data layer of OpenVoltam: reading and writing lab session and method files,
+#   raw data, saves, and lookups into session data. Nothing in here imports Qt,
+#   so the process script (and any headless tool) can import this module without
+#   paying for PyQt6. GUI helpers live in ov_functions, which re-exports everything
+#   in this module.
+
+import os
+import time
+import json
+import zlib
+import hashlib
+from copy import deepcopy
+from tabularjson import parse, stringify, StringifyOptions
+from re import sub
+import numpy as np
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_sqlite import SqliteSession, is_sqlite_session
+
+def encodeCustomName(custom_name):
+    return g.CUSTOM_NAME_FLAG+custom_name
+
+def isCustomName(s):
+    return s.startswith(g.CUSTOM_NAME_FLAG)
+
+def decodeCustomName(encoded_name):
+    return encoded_name.replace(g.CUSTOM_NAME_FLAG, '', 1)
+
+def custText(arr):
+    return arr[g.L]
+    
+def confirmPathExists(path):
+    """Takes in a path in the system. If the path exists, returns True. Else False."""
+    if os.path.exists(path):
+        return True
+    return False
+
+def guess_filename(name):
+    """Takes in a name and returns a best guess at the filename
+    by stripping all characters other than letters, numbers,
+    em-dashes, and underscores and by replacing all blankspace
+    with dashes"""
+    guess = sub('[^A-Za-z0-9 ]', '', name)  # remove all characters other than a-z, numbers, and spaces
+    guess = ' '.join(guess.split())         # convert all sequential blankspace to a single space
+    guess = guess.replace(' ', '-')         # replace all spaces with em-dashes
+    return guess
+
+def get_data_from_file(path):
+    """Reads the file at path and returns its contents as a dict. For lab
+    sessions, the returned dict holds metadata only: raw data arrays live in the
+    sidecar folder and are read on demand with get_rep_data(). Sessions saved
+    before the sidecar existed (raw data inline in the .ovs) are migrated the
+    first time they are read. Saves still in the session's journal are replayed
+    on top of the file. Returns False if the file cannot be read."""
+    try:
+        if is_sqlite_session(path):             # .ovdb sessions hold no raw data in their
+            if not os.path.exists(path):        #   metadata tables and have no journal
+                return False
+            with SqliteSession(path) as db:
+                return db.read()
+        with open(path, 'r') as file:
+            content = file.read()
+            data = parse(content)
+        if g.S_RUNS in data:                    # if this is a lab session
+            for (saveType, params) in read_journal(path):
+                data = apply_save(data, saveType, params)  # replay saves not yet folded into the file
+        if has_inline_raw_data(data):           # if this is an old-style session file
+            write_data_to_file(path, data)      #   move its raw data into the sidecar
+        return data
+    except Exception as e:
+        print(e)
+        return False
+
+def write_data_to_file(path, data):
+    """Writes data to the file at path. For lab sessions, any raw data found on
+    the reps (R_DATA or R_BACKGROUND) is moved out of data and into the sidecar,
+    and sidecar arrays of reps that no longer exist are deleted. Reps without raw
+    data keys keep whatever is already in the sidecar. Folds away the session's
+    journal, if it has one."""
+    try:
+        if is_sqlite_session(path):
+            raw = {}
+            for run in data.get(g.S_RUNS, []):
+                for rep in run[g.R_REPLICATES]:
+                    rep.pop(g.R_RAW_INDEX, None)    # .ovdb sessions keep raw data in their own table
+                    for key in (g.R_DATA, g.R_BACKGROUND):
+                        if key in rep:
+                            cols = raw_data_to_columns(rep.pop(key))
+                            raw[(run[g.R_UID_SELF], rep[g.R_UID_SELF], key)] = np.vstack([cols[col] for col in g.R_DATA_COLUMNS])
+            with SqliteSession(path) as db:
+                db.write(data, raw)
+            return True
+        if g.S_RUNS in data:                    # only lab sessions have a sidecar
+            store_raw_data(path, data)
+        with open(path, 'w') as file:
+            
+            options: StringifyOptions = {
+                "indentation": 4,
+                "trailingCommas": False,
+                "output_as_table": lambda tabular_data, path: g.R_DATA_TIME in tabular_data[0] or g.C_RUN_ID in tabular_data[0]
+                }
+            tab_json_to_write = stringify(data, options)       #   convert dictionary to json string
+            file.write(tab_json_to_write)                                       #   write json string to file
+            #json_to_write = dumps(data, indent=4)
+            #file.write(json_to_write)
+            file.close()                                                    #   close the file (to avoid taking up too much memory)
+        clear_journal(path)                     # the file now holds every journaled save
+        return True
+    except Exception as e:
+        print(e)
+        return False
+
+def remove_data_from_layout(d):
+    for run in d[g.S_RUNS]:                 # For each run in data dict
+        for rep in run[g.R_REPLICATES]:     #  And for each rep of the run
+            rep.pop(g.R_DATA, None)         #   Remove the raw data
+            rep.pop(g.R_BACKGROUND, None)   #   Remove raw background data
+    return d
+
+#############################################
+#                                           #
+#   Raw data sidecar                        #
+#                                           #
+#   Raw data for a session at 'x.ovs' lives #
+#   in the folder 'x.ovd'. Each rep has one #
+#   .npy file for its signal and one for    #
+#   its background. Each file is a 2D array #
+#   with one row per column in              #
+#   g.R_DATA_COLUMNS (time, volt, current). #
+#                                           #
+#############################################
+
+def get_sidecar_path(path):
+    """Takes in the path of a session file, returns the path of the folder
+    that holds the session's raw data arrays."""
+    return os.path.splitext(path)[0] + g.DATA_EXT
+
+def get_raw_data_filename(ids, key):
+    """Takes in ids as (run-id, rep-id) and key (g.R_DATA or g.R_BACKGROUND).
+    Returns the name of the sidecar file that holds that raw data."""
+    return ids[0] + '_' + ids[1] + '_' + key + g.RAW_DATA_EXT
+
+def get_raw_data_path(path, ids, key):
+    return os.path.join(get_sidecar_path(path), get_raw_data_filename(ids, key))
+
+def empty_raw_data():
+    """Returns raw data columns with no samples in them"""
+    return {key: np.zeros(0, dtype=g.R_DATA_DTYPE) for key in g.R_DATA_COLUMNS}
+
+def raw_data_to_columns(raw):
+    """Takes in raw data either as a list of rows (dicts with a value for each
+    key in g.R_DATA_COLUMNS, as stored in old .ovs files) or as a dict of columns.
+    Returns a dict of columns, each a 1D numpy array."""
+    if isinstance(raw, dict):
+        return {key: np.asarray(raw[key], dtype=g.R_DATA_DTYPE) for key in g.R_DATA_COLUMNS}
+    if not raw:
+        return empty_raw_data()
+    cols = {}
+    for key in g.R_DATA_COLUMNS:
+        cols[key] = np.fromiter((row[key] for row in raw), dtype=g.R_DATA_DTYPE, count=len(raw))
+    return cols
+
+def has_raw_data(cols):
+    """Returns True if the raw data columns, cols, hold at least one sample"""
+    return len(cols[g.R_DATA_TIME]) > 0
+
+def write_raw_data(path, ids, key, raw):
+    """Writes raw data (rows or columns) for one rep of the session at path to
+    the sidecar. If raw is empty, removes any stored array instead. Returns the
+    index entry for the array, [byte offset of the data in the file, n samples],
+    or None if nothing was stored."""
+    cols = raw_data_to_columns(raw)
+    filepath = get_raw_data_path(path, ids, key)
+    if not has_raw_data(cols):
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        return None
+    os.makedirs(get_sidecar_path(path), exist_ok=True)
+    arr = np.vstack([cols[col] for col in g.R_DATA_COLUMNS])
+    with open(filepath + '.tmp', 'wb') as file:     # write to a temporary file first so an
+        np.save(file, arr)                          #   interrupted write never leaves a
+        offset = file.tell() - arr.nbytes           #   half-written array behind
+    os.replace(filepath + '.tmp', filepath)
+    return [offset, arr.shape[1]]
+
+def read_raw_data(path, ids, key, entry=None):
+    """Returns the raw data columns stored for one rep of the session at path.
+    If the rep's index entry is given, seeks straight to the samples instead of
+    parsing the file's header. If nothing is stored, returns empty columns."""
+    filepath = get_raw_data_path(path, ids, key)
+    if not os.path.exists(filepath):
+        return empty_raw_data()
+    if entry:
+        (offset, n) = entry
+        arr = np.fromfile(filepath, dtype=g.R_DATA_DTYPE, count=len(g.R_DATA_COLUMNS)*n, offset=offset)
+        arr = arr.reshape((len(g.R_DATA_COLUMNS), n))
+    else:
+        arr = np.load(filepath)
+    return {col: arr[i] for i, col in enumerate(g.R_DATA_COLUMNS)}
+
+def get_rep_data(path, ids, index=None):
+    """ Takes in:
+        - path     Str.   Path to a lab session file
+        - ids      Tuple. With structure (run-id, rep-id)
+        - index    Dict.  Optional, the rep's g.R_RAW_INDEX entry from the session metadata
+    Returns (signal, background), each a dict of raw data columns."""
+    if is_sqlite_session(path):
+        with SqliteSession(path) as db:
+            return (db.read_raw(ids, g.R_DATA) or empty_raw_data(),
+                    db.read_raw(ids, g.R_BACKGROUND) or empty_raw_data())
+    if index is None:
+        index = {}
+    return (read_raw_data(path, ids, g.R_DATA, index.get(g.R_DATA)),
+            read_raw_data(path, ids, g.R_BACKGROUND, index.get(g.R_BACKGROUND)))
+
+def rep_has_data(path, ids):
+    """Returns True if the rep with ids (run-id, rep-id) has signal data saved"""
+    if is_sqlite_session(path):
+        with SqliteSession(path) as db:
+            return db.has_raw(ids)
+    return os.path.exists(get_raw_data_path(path, ids, g.R_DATA))
+
+def has_inline_raw_data(data):
+    """Returns True if data is a lab session with raw data stored on its reps"""
+    if not isinstance(data, dict) or g.S_RUNS not in data:
+        return False
+    for run in data[g.S_RUNS]:
+        for rep in run[g.R_REPLICATES]:
+            if g.R_DATA in rep or g.R_BACKGROUND in rep:
+                return True
+    return False
+
+def store_raw_data(path, data):
+    """Moves all raw data found on the reps of data into the sidecar of the
+    session at path (removing it from data) and records where it went in each
+    rep's g.R_RAW_INDEX. Then deletes any sidecar arrays that belong to reps that
+    are no longer in data."""
+    for run in data[g.S_RUNS]:
+        for rep in run[g.R_REPLICATES]:
+            ids = (run[g.R_UID_SELF], rep[g.R_UID_SELF])
+            for key in (g.R_DATA, g.R_BACKGROUND):
+                if key in rep:
+                    entry = write_raw_data(path, ids, key, rep.pop(key))
+                    index = rep.setdefault(g.R_RAW_INDEX, {})   # keep the rep's index of
+                    if entry:                                   #   where its arrays are
+                        index[key] = entry                      #   in the sidecar up to date
+                    else:
+                        index.pop(key, None)
+                    if not index:
+                        rep.pop(g.R_RAW_INDEX)
+    prune_raw_data(path, data)
+
+def prune_raw_data(path, data):
+    """Deletes the sidecar arrays of the session at path that belong to reps
+    that are no longer in data."""
+    folder = get_sidecar_path(path)
+    if not os.path.isdir(folder):
+        return
+    to_keep = set()
+    for run in data[g.S_RUNS]:
+        for rep in run[g.R_REPLICATES]:
+            ids = (run[g.R_UID_SELF], rep[g.R_UID_SELF])
+            for key in (g.R_DATA, g.R_BACKGROUND):
+                to_keep.add(get_raw_data_filename(ids, key))
+    for filename in os.listdir(folder):
+        if filename.endswith(g.RAW_DATA_EXT) and filename not in to_keep:
+            os.remove(os.path.join(folder, filename))
+
+#############################################
+#                                           #
+#   Session journal                         #
+#                                           #
+#   Saves to the session at 'x.ovs' are     #
+#   appended to 'x.ovs.ovj', one record per #
+#   line, instead of rewriting the whole    #
+#   session. Each record is its length and  #
+#   CRC-32, then the record as JSON, so a   #
+#   torn or damaged record is recognized    #
+#   and skipped, not taken for the end of   #
+#   the journal. The first record is a      #
+#   header with a hash of the session file  #
+#   the journal applies to, so a journal    #
+#   left behind by an interrupted fold is   #
+#   recognized as stale (and set aside, not #
+#   deleted). Every read replays the        #
+#   journal on top of the file.             #
+#                                           #
+#############################################
+
+def get_journal_path(path):
+    return path + g.JOURNAL_EXT
+
+def get_file_hash(path):
+    """Returns a hash of the contents of the file at path"""
+    with open(path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def to_json(obj):
+    """Makes the numpy values that save params may hold JSON serializable"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError('Cannot journal a '+type(obj).__name__)
+
+def encode_journal_record(obj):
+    """Returns the bytes of the journal line that holds obj"""
+    payload = json.dumps(obj, separators=(',', ':'), default=to_json).encode('ascii')     # (keeps NaN and Infinity)
+    return b'%d %08x ' % (len(payload), zlib.crc32(payload)) + payload + b'\n'
+
+def decode_journal_record(line):
+    """Returns the object held by a line of a journal. Raises a ValueError if the
+    line is incomplete or damaged."""
+    if not line.endswith(b'\n'):
+        raise ValueError('incomplete journal record')
+    (n, crc, payload) = line[:-1].split(b' ', 2)
+    if len(payload) != int(n) or zlib.crc32(payload) != int(crc, 16):
+        raise ValueError('damaged journal record')
+    return json.loads(payload)
+
+def read_journal_header(path):
+    """Returns the header of the journal of the session at path as
+    (hash of the session file, time the journal was started), or None if there
+    is no journal."""
+    try:
+        with open(get_journal_path(path), 'rb') as file:
+            return tuple(decode_journal_record(file.readline()))
+    except Exception:
+        return None
+
+def set_journal_aside(path):
+    """Renames the journal of the session at path so it is no longer replayed, but
+    its saves are not lost. Returns the new path of the journal."""
+    jpath = get_journal_path(path)
+    aside = jpath + '.' + time.strftime('%Y%m%d-%H%M%S') + g.JOURNAL_STALE_EXT
+    os.replace(jpath, aside)
+    return aside
+
+def read_journal(path):
+    """Returns the list of saves, each as (saveType, params), recorded in the
+    journal of the session at path. A journal that does not belong to the current
+    session file is set aside (see set_journal_aside) and ignored. Records that are
+    damaged or half-written (the app was closed mid-save) are skipped."""
+    jpath = get_journal_path(path)
+    if not os.path.exists(jpath):
+        return []
+    header = read_journal_header(path)
+    if not header or header[0] != get_file_hash(path):
+        aside = set_journal_aside(path)
+        print('Warning: the journal of '+path+' does not match the session file. Its saves were not applied, it was kept as '+aside)
+        return []
+    records = []
+    with open(jpath, 'rb') as file:
+        file.readline()                         # (the header)
+        for (i, line) in enumerate(file):
+            try:
+                records.append(tuple(decode_journal_record(line)))
+            except Exception as e:
+                print('Warning: skipped record '+str(i+1)+' of the journal of '+path+' ('+str(e)+')')
+    return records
+
+def trim_journal(jpath):
+    """Cuts a half-written last record (the app was closed mid-save) off the end of
+    the journal at jpath, so the next record starts on a line of its own"""
+    with open(jpath, 'rb+') as file:
+        content = file.read()
+        if content and not content.endswith(b'\n'):
+            file.truncate(content.rfind(b'\n') + 1)
+
+def append_to_journal(path, saveType, params):
+    """Appends one save to the journal of the session at path, starting a new
+    journal if there isn't one yet (or the one there doesn't belong to the
+    session file anymore)."""
+    jpath = get_journal_path(path)
+    if os.path.exists(jpath):
+        trim_journal(jpath)
+        header = read_journal_header(path)
+        if not header or header[0] != get_file_hash(path):
+            aside = set_journal_aside(path)
+            print('Warning: the journal of '+path+' does not match the session file, it was kept as '+aside)
+    record = b''
+    if not os.path.exists(jpath):
+        record = encode_journal_record((get_file_hash(path), time.time()))
+    record = record + encode_journal_record((saveType, params))
+    with open(jpath, 'ab') as file:
+        file.write(record)
+        file.flush()
+        os.fsync(file.fileno())     # make sure the save is on disk before reporting success
+
+def journal_needs_fold(path):
+    """Returns True if the journal of the session at path is big enough or old
+    enough that it should be folded into the session file."""
+    header = read_journal_header(path)
+    if not header:
+        return False
+    if os.path.getsize(get_journal_path(path)) > g.JOURNAL_MAX_BYTES:
+        return True
+    return time.time() - header[1] > g.JOURNAL_MAX_AGE
+
+def clear_journal(path):
+    jpath = get_journal_path(path)
+    if os.path.exists(jpath):
+        os.remove(jpath)
+
+def save_data_to_file(path, saveType, params, data=None):
+    """Applies one save of saveType with params to the lab session at path.
+    .ovdb sessions run the save as a single transaction. .ovs sessions record it
+    in the journal, folding the journal into the file when it is due. If data is
+    given, it must be the current contents of the session (it is saved to in
+    place) and the session is not re-read. Returns the session data after the
+    save (without raw data)."""
+    if is_sqlite_session(path):
+        with SqliteSession(path) as db:
+            db.save(saveType, params)
+            if not data:
+                return db.read()
+        return apply_save(data, saveType, deepcopy(params))    # (the same save, on the copy in memory)
+
+    if not data:
+        data = get_data_from_file(path)         # read file from path, replaying any journaled saves
+    data = apply_save(data, saveType, deepcopy(params))  # save ops may consume their params, so pass a copy
+    prune_raw_data(path, data)                  # drop raw data of any reps this save deleted
+    if journal_needs_fold(path):                # if the journal has grown too big or too old
+        write_data_to_file(path, data)          #   fold everything into the session file (clears the journal)
+    else:
+        append_to_journal(path, saveType, params)  # otherwise, just record this save at the end of the journal
+    return data
+
+def save_rep_raw_data(path, ids, newRep, signal, background, data=None):
+    """Saves one rep of the lab session at path along with its raw data, and
+    nothing else: the rep's signal and background (raw data columns) are written
+    on their own (to the sidecar, or the raw data table of a .ovdb session), then
+    newRep, the rep's params, is saved as one g.SAVE_TYPE_REP_WITH_DATA save. If
+    data is given, it must be the current contents of the session (it is saved to
+    in place). Returns the session data after the save (without raw data)."""
+    newRep = {key: newRep[key] for key in newRep if key not in (g.R_DATA, g.R_BACKGROUND, g.R_RAW_INDEX)}
+    raw = {g.R_DATA: signal, g.R_BACKGROUND: background}
+    if is_sqlite_session(path):
+        with SqliteSession(path) as db:
+            with db.con:                        # the arrays and the rep in one transaction
+                for key in raw:
+                    cols = raw_data_to_columns(raw[key])
+                    db.write_raw(ids, key, np.vstack([cols[col] for col in g.R_DATA_COLUMNS]))
+                db.apply_save(g.SAVE_TYPE_REP_WITH_DATA, [ids, newRep])
+            if not data:
+                return db.read()
+        return apply_save(data, g.SAVE_TYPE_REP_WITH_DATA, [ids, newRep])
+
+    index = {}
+    for key in raw:
+        entry = write_raw_data(path, ids, key, raw[key])    # only this rep's arrays are written
+        if entry:
+            index[key] = entry
+    if index:
+        newRep[g.R_RAW_INDEX] = index
+    return save_data_to_file(path, g.SAVE_TYPE_REP_WITH_DATA, [tuple(ids), newRep], data)
+
+def convert_session(src, dst):
+    """Copies the lab session at src, including all raw data, to dst. The
+    format of each is picked by its extension (.ovs or .ovdb), so this both
+    imports into and exports from the SQLite format. Returns True on success."""
+    data = get_data_from_file(src)
+    if not data:
+        return False
+    for run in data[g.S_RUNS]:
+        for rep in run[g.R_REPLICATES]:
+            ids = (run[g.R_UID_SELF], rep[g.R_UID_SELF])
+            (rep[g.R_DATA], rep[g.R_BACKGROUND]) = get_rep_data(src, ids, rep.get(g.R_RAW_INDEX))
+    return write_data_to_file(dst, data)
+
+#############################################
+#                                           #
+#   Save operations                         #
+#                                           #
+#   Each takes in the session data and the  #
+#   params of one save, applies the save to #
+#   data and returns it. See process.py for #
+#   the params each save type expects.      #
+#                                           #
+#############################################
+
+def apply_save(data, saveType, params):
+    if saveType == g.SAVE_TYPE_EDIT_SESH_NAME:
+        data=save_edit_session_name(data, params)
+    elif saveType == g.SAVE_TYPE_SAMPLE_NEW:
+        data=save_new_sample(data, params)
+    elif saveType == g.SAVE_TYPE_SAMPLE_EDIT:
+        data=save_edit_sample(data, params)
+    elif saveType == g.SAVE_TYPE_SAMPLE_DELETE:
+        data=save_delete_sample(data, params)
+    elif saveType == g.SAVE_TYPE_RUN_NEW:
+        data=save_add_new_run(data, params)
+    elif saveType == g.SAVE_TYPE_REP_DELETE:
+        data=save_delete_rep(data, params)
+    elif saveType == g.SAVE_TYPE_REP_MOD:
+        data=save_modify_rep(data, params)
+    elif saveType == g.SAVE_TYPE_REP_WITH_DATA:
+        data=save_rep_with_data(data, params)
+    elif saveType == g.SAVE_TYPE_RUN_MOD:
+        data=save_modify_run(data, params)
+    elif saveType == g.SAVE_TYPE_RUN_MOVE:
+        data=save_move_run(data, params)
+    elif saveType == g.SAVE_TYPE_METHOD_TO_SAMPLE:
+        data=save_method_to_sample(data, params)
+    elif saveType == g.SAVE_TYPE_METHOD_MOD:
+        data=save_modify_method(data, params)
+    elif saveType == g.SAVE_TYPE_CALC_NEW:
+        data=save_new_calc(data, params)
+    elif saveType == g.SAVE_TYPE_CALC_EDIT:
+        data=save_old_calc(data, params)
+    elif saveType == g.SAVE_TYPE_CALC_DELETE:
+        data=save_delete_calc(data, params)
+    elif saveType == g.SAVE_TYPE_CALCS_ARCHIVE:
+        data=save_change_calcs_archive(data,params)
+    elif saveType == g.SAVE_TYPE_ANALYSES_DEL:
+        data=save_delete_analyses(data, params)
+    elif saveType == g.SAVE_TYPE_CALCS_FROM_METHOD:
+        data=save_update_calcs_method_settings(data, params)
+    elif saveType == g.SAVE_TYPE_TRANSACTION:
+        data=save_transaction(data, params)
+    return data
+
+def save_transaction(data, params):
+    # params is a list of [saveType, params] pairs, applied in order. The caller writes
+    # the result once (one journal record, or one SQLite transaction), so either all of
+    # them are saved or none are.
+    for (saveType, p) in params:
+        data = apply_save(data, saveType, p)
+    return data
+
+def save_edit_session_name(data, params):
+    name = params[0]
+    data[g.S_NAME] = name
+    return data
+
+def save_new_sample(data, params):   # Takes the sample parameters
+    newData = params[0]                 # passed in params[0]
+    data[g.S_SAMPLES].append(newData)
+    return data
+
+def save_edit_sample(data, params):
+    newSamp = params[0]
+    s_id = newSamp[g.R_UID_SELF]
+    found = False
+    for sample in data[g.S_SAMPLES]:        # Find the relevant sample from file
+        if sample[g.R_UID_SELF] == s_id:
+            found = True
+            break
+    if found:                               # If found
+        for key in sample.keys():           # Loop thru sample keys
+            sample[key] = newSamp[key]
+    return data
+
+def save_delete_sample(data, params):
+    """Takes in the id of a sample to delete.
+    Algorithm:
+    1. Finds a list of all runs linked to that sample
+    2. Finds a list of all calcs linked to that sample
+    3. Deletes all runs from #1
+    4. Deletes all calcs from #2
+    5. Deletes sample"""
+    s_id = params[0]
+    replist = []
+    calclist = []
+
+    for run in data[g.S_RUNS]:                  # get list of all reps of runs from this sample
+        if run[g.R_UID_SAMPLE] == s_id:
+            for rep in run[g.R_REPLICATES]:
+                replist.append((run[g.R_UID_SELF], rep[g.R_UID_SELF]))
+
+    for calc in data[g.S_PROCESSED]:            # get list of calculations from this sample
+        if calc[g.C_SAMPLE_ID] == s_id:
+            calclist.append(calc[g.R_UID_SELF])
+
+    if replist:
+        data = save_delete_rep(data, [replist])     # delete reps, runs, and -- if applicable -- methods                  
+        
+    if calclist:
+        data = save_delete_calc(data, [calclist])   # delete calcs
+
+    
+    found = False                                   # remove sample with s_id as ID from data
+    for i, s in enumerate(data[g.S_SAMPLES]):
+        if s[g.R_UID_SELF] == s_id:
+            found = True
+            break
+    if found:
+        data[g.S_SAMPLES].pop(i)
+
+    return data
+
+    
+
+    
+    
+
+
+def save_add_new_run(data, params):
+    newRun = params[0]               
+    data[g.S_RUNS].append(newRun)
+    return data
+
+def save_delete_rep(data, params):
+    """ Args:
+        params[0] -- list of tuples w format (runID, repID)
+
+        Function:
+        Deletes all of the replicates indicated in the argument list.
+        Then checks whether there are any runs whose reps have all been deleted.
+            if so, deletes them too.
+        Then checks whether there are any methods which are no longer referenced
+            by any runs in the sample file. If so, deletes these methods too.
+
+        Returns: data"""
+    tasks = params[0]
+
+    #Delete the requested replicates
+    while tasks:                                            
+        task = tasks[0]
+        run_id = task[0]
+        rep_id = task[1]
+
+        found = False
+        index = False
+        for run in data[g.S_RUNS]:                  # First, find the replicate 
+            if run[g.R_UID_SELF] == run_id:
+                for i, rep in enumerate(run[g.R_REPLICATES]):
+                    if rep[g.R_UID_SELF] == rep_id:
+                        found = True
+                        index = i
+                        break
+                if found:
+                    break
+
+        if found:                                   # If it was found, remove it!
+            run[g.R_REPLICATES].pop(index)
+        tasks.pop(0)
+
+    # Delete empty runs
+    some_runs_empty = True
+    while some_runs_empty:                          # Now that we've deleted all reps
+        found = False                               # Check whether there are any runs where al;
+        for i,run in enumerate(data[g.S_RUNS]):     #   reps have been deleted
+            if not run[g.R_REPLICATES]:
+                found = True
+                break
+
+        if found:                                   # Delete these empty runs as well!
+            data[g.S_RUNS].pop(i)                           
+        else:
+            some_runs_empty = False
+
+    # Delete unreferenced methods
+    methods_to_keep = []                            # Get list of uids of methods to keep
+    for run in data[g.S_RUNS]:
+        if not run[g.R_UID_METHOD] in methods_to_keep:
+            methods_to_keep.append(run[g.R_UID_METHOD])
+            
+    methods_floating = True                         
+    while methods_floating:
+        found = False                               # If there is a floating method
+        for i,method in enumerate(data[g.S_METHODS]):
+            if not method[g.M_UID_SELF] in methods_to_keep:
+                found = True
+                break
+        if found:
+            data[g.S_METHODS].pop(i)                # delete it!
+        else:
+            methods_floating = False
+          
+    return data
+
+def save_modify_rep(data, params):
+    tasks = params[0]       # a list of tuples, each with the form (runID, repID)
+    newReps = params[1]     # a list of the same length as tasks, with all rep params to save
+    for i, task in enumerate(tasks):
+        rep = get_rep(data, task)
+        if rep:
+            keys = list(rep.keys())     # get a list of all keys in saved rep
+            for key in keys:            # remove all keys and values from rep except data
+                if key not in (g.R_DATA, g.R_BACKGROUND, g.R_RAW_INDEX):
+                    rep.pop(key, None)      
+            for key in newReps[i]:      # add new keys and values to rep (does not include raw data)
+                if key not in (g.R_DATA, g.R_BACKGROUND, g.R_RAW_INDEX):
+                    rep[key] = newReps[i][key]
+    return data
+
+def save_rep_with_data(data, params):
+    ids = params[0]         # a tuple with the form (runID, repID)
+    newRep = params[1]      # all rep params to save, including its g.R_RAW_INDEX (the raw data itself is
+                            #   written separately, see save_rep_raw_data)
+    rep = get_rep(data, ids)
+    if rep:
+        rep.clear()
+        for key in newRep:
+            if key not in (g.R_DATA, g.R_BACKGROUND):
+                rep[key] = newRep[key]
+    return data
+
+def save_modify_run(data, params):
+    run_id = params[0]
+    newRun = params[1]
+
+    run = get_run_from_file_data(data, run_id)
+    
+    if run:
+        prevReps = run[g.R_REPLICATES]  # store previous replicates (includes raw data)
+        keys = list(run.keys())         # get a list of all keys in saved run
+        for key in keys:                # remove all keys and values from run
+            run.pop(key, None)      
+        for key in newRun:              # add new keys and values to run (does not include replicates)
+            run[key] = newRun[key]
+        run[g.R_REPLICATES] = prevReps  # add the old replicates (with raw data) back in   
+    
+    return data
+
+def save_move_run(data, params):
+    tasks = params[0]
+    sample_id = params[1]
+    for run in data[g.S_RUNS]:              # Loop thru all runs
+        if run[g.R_UID_SELF] in tasks:      # If this run is on the list of runs to move
+            run[g.R_UID_SAMPLE] = sample_id # Reset sample_id to destination sample_id
+    return data
+
+def save_method_to_sample(data, params):     # append method to sample file
+    newMethod = params[0]               
+    data[g.S_METHODS].append(newMethod)
+    return data
+
+def save_modify_method(data, params):        # modify the method in a sample file
+    method_id = params[0]
+    newMethod = params[1]
+    
+    method = get_method_from_file_data(data, method_id)
+
+    if method:
+        keys = list(method.keys())
+        for key in keys:
+            method.pop(key, None)
+        for key in newMethod:
+            method[key] = newMethod[key]
+    return data
+
+def save_new_calc(data, params):   
+    newCalcs = params[0]
+    for newCalc in newCalcs:
+        data[g.S_PROCESSED].append(newCalc)
+    return data
+
+def save_old_calc(data, params):
+    calc_id = params[0]
+    newCalc = params[1]
+    for calc in data[g.S_PROCESSED]:
+        if calc[g.R_UID_SELF] == calc_id:
+            keys = list(calc.keys())
+            for key in keys:
+                calc.pop(key, None)
+            for key in newCalc:
+                calc[key] = newCalc[key]
+            break
+    return data
+
+def save_delete_calc(data, params):
+    tasks = params[0]
+    while tasks:
+        calc_id = tasks[0]
+        found = False
+        index = None
+        for i, calc in enumerate(data[g.S_PROCESSED]):
+            if calc[g.R_UID_SELF] == calc_id:
+                found = True
+                index = i
+                break
+        if found:
+            data[g.S_PROCESSED].pop(index)
+        tasks.pop(0)
+    return data
+
+def save_change_calcs_archive(data, params):
+    archive_status = params[0]
+    calcs = params[1]
+    for calc in data[g.S_PROCESSED]:
+        if calc[g.R_UID_SELF] in calcs:
+            calc[g.C_ARCHIVED] = archive_status
+    return data
+
+def save_delete_analyses(data, params):
+    tasks = params[0]
+    for task in tasks:
+        run_id, rep_id = task
+        for run in data[g.S_RUNS]:
+            rep_wiped = False
+            for rep in run[g.R_REPLICATES]:
+                if run[g.R_UID_SELF] == run_id and rep[g.R_UID_SELF] == rep_id:
+                    rep[g.R_ANALYSIS] = {}
+                    rep_wiped = True
+                    break
+            if rep_wiped: break
+    return data
+
+def save_update_calcs_method_settings(data, params):
+    unit, dl, conf, calcs = params
+    for calc in data[g.S_PROCESSED]:
+        if calc[g.R_UID_SELF] in calcs:
+            if not calc[g.C_ARCHIVED]: 
+                calc[g.M_UNIT] = unit
+                calc[g.M_DETECTION_LIMIT] = dl
+                calc[g.M_CONF] = conf
+    return data
+
+def merge_saves(saveType1, params1, saveType2, params2):
+    """Takes in two saves that are meant to run one after the other. If they can
+    be done as a single save with the same result, returns the params of that
+    save (of type saveType1). Otherwise, returns None. Mergeable saves are:
+        - two g.SAVE_TYPE_REP_MOD saves (if both touch the same rep, the second wins)
+        - two g.SAVE_TYPE_CALCS_ARCHIVE saves that set the same archive status"""
+    if saveType1 != saveType2:
+        return None
+    if saveType1 == g.SAVE_TYPE_REP_MOD:
+        tasks = [tuple(task) for task in params1[0]]
+        newReps = list(params1[1])
+        for task, newRep in zip(params2[0], params2[1]):
+            task = tuple(task)
+            if task in tasks:
+                newReps[tasks.index(task)] = newRep
+            else:
+                tasks.append(task)
+                newReps.append(newRep)
+        return [tasks, newReps]
+    if saveType1 == g.SAVE_TYPE_CALCS_ARCHIVE and params1[0] == params2[0]:
+        calcs = list(params1[1])
+        for calc_id in params2[1]:
+            if calc_id not in calcs:
+                calcs.append(calc_id)
+        return [params1[0], calcs]
+    return None
+
+#############################################
+#                                           #
+#   Save deltas                             #
+#                                           #
+#   A delta lists what a save changed in    #
+#   each collection of the session          #
+#   (g.S_BLANK_ARRAYS), by uid, so the      #
+#   worker doesn't have to send back (and   #
+#   the GUI doesn't have to redraw) the     #
+#   whole session after every save.         #
+#                                           #
+#############################################
+
+def diff_sessions(old, new):
+    """Takes in the session data before and after a save. Returns a delta that
+    turns old into new when passed to apply_delta"""
+    delta = {g.DELTA: True, g.DELTA_SESSION: {}}
+    for key in new:
+        if key not in g.S_BLANK_ARRAYS and old.get(key) != new[key]:
+            delta[g.DELTA_SESSION][key] = new[key]
+    for key in g.S_BLANK_ARRAYS:
+        olds = {e[g.R_UID_SELF]: e for e in old.get(key, [])}
+        news = [e[g.R_UID_SELF] for e in new.get(key, [])]
+        added = [e for e in new.get(key, []) if e[g.R_UID_SELF] not in olds]
+        changed = [e for e in new.get(key, []) if e[g.R_UID_SELF] in olds and olds[e[g.R_UID_SELF]] != e]
+        removed = [uid for uid in olds if uid not in news]
+        if not (added or changed or removed) and list(olds) == news:
+            continue
+        delta[key] = {g.DELTA_ADDED: added, g.DELTA_CHANGED: changed, g.DELTA_REMOVED: removed}
+        patched = [uid for uid in olds if uid not in removed] + [e[g.R_UID_SELF] for e in added]
+        if patched != news:                                 # eg. a run moved within the list
+            delta[key][g.DELTA_ORDER] = news
+    return delta
+
+def is_delta(data):
+    return isinstance(data, dict) and data.get(g.DELTA, False)
+
+def apply_delta(data, delta):
+    """Applies delta (from diff_sessions) to session data. Returns the data"""
+    data.update(delta[g.DELTA_SESSION])
+    for key in g.S_BLANK_ARRAYS:
+        if key not in delta:
+            continue
+        d = delta[key]
+        changed = {e[g.R_UID_SELF]: e for e in d[g.DELTA_CHANGED]}
+        entities = [changed.get(e[g.R_UID_SELF], e) for e in data[key] if e[g.R_UID_SELF] not in d[g.DELTA_REMOVED]]
+        entities = entities + d[g.DELTA_ADDED]
+        if g.DELTA_ORDER in d:
+            by_uid = {e[g.R_UID_SELF]: e for e in entities}
+            entities = [by_uid[uid] for uid in d[g.DELTA_ORDER]]
+        data[key] = entities
+    return data
+
+def get_delta_sample_ids(data, delta):
+    """Returns the uids of the samples in data whose runs, methods or calcs are
+    touched by delta. Call it on the session data from both before and after the
+    delta is applied to catch runs and calcs that moved between samples."""
+    s_ids = set()
+    uids = {}
+    for key in g.S_BLANK_ARRAYS:
+        if key in delta:
+            d = delta[key]
+            uids[key] = set(d[g.DELTA_REMOVED]) | {e[g.R_UID_SELF] for e in d[g.DELTA_ADDED] + d[g.DELTA_CHANGED]}
+        else:
+            uids[key] = set()
+    s_ids.update(uids[g.S_SAMPLES])
+    for run in data[g.S_RUNS]:
+        if run[g.R_UID_SELF] in uids[g.S_RUNS] or run[g.R_UID_METHOD] in uids[g.S_METHODS]:
+            s_ids.add(run[g.R_UID_SAMPLE])
+    for calc in data[g.S_PROCESSED]:
+        if calc[g.R_UID_SELF] in uids[g.S_PROCESSED]:
+            s_ids.add(calc[g.C_SAMPLE_ID])
+    return s_ids
+
+def get_next_id(ids, prefix):
+        """ Takes in a list of ids, loops through them to find the
+        most recent one. Returns the id of the next one, which should be
+        one greater than the current. Assumes IDs are of the format:
+             [PREFIX]-n
+        For example, if the [PREFIX] was 'fulano' the first few would be:
+        fulano-1, fulano-2, fulano-3, etc.
+        """
+        max_id = -1
+        for ID in ids:
+            num = int(ID.replace(prefix,''))
+            if num > max_id:
+                max_id = num
+        return prefix+str(max_id+1)
+
+def get_ids(data, key):
+    '''assumes that data is a dictionary with many key value pairs. Assumes
+    that key is a key whose value is a list. Returns the unique IDs of
+    every object in the list.'''
+    ids = []
+    for obj in data[key]:
+        ids.append(obj[g.R_UID_SELF])
+    return ids
+    
+
+def methods_match(m1, m2):
+    ''' Takes in two method dicts, m1 and m2
+    checks whether they match. If so, returns True,
+    if not, returns False'''
+    
+    keys_to_ignore = [g.M_UID_SELF]   # List all keys to ignore
+    for key in m1:                      # Loop thru all keys in m1
+        if key not in keys_to_ignore:   # If key is not on ignore list
+            if key not in m2:           # if the key from m1 is not in m2
+                return False            #   We don't have a match...
+            elif m1[key] != m2[key]:    # if the key exists but the values don't match
+                return False            #   Still no match...
+    return True                         # If we get all the way thru, its a match! 
+
+def get_sample_from_file_data(data, sample_id):
+    for sample in data[g.S_SAMPLES]:
+        if sample[g.R_UID_SELF] == sample_id:
+            return sample
+    return False
+
+def get_runs_in_sample(data, sample_id):
+    runs_of_sample = []
+    for run in data[g.S_RUNS]:
+        if run[g.R_UID_SAMPLE] == sample_id:
+            runs_of_sample.append(run)
+    return runs_of_sample
+
+def get_run_from_file_data(data, run_id):
+    
+    """ takes in a full dataset dictionary, data, and the uid of the run
+    we are seeking, run_id. Loops through all run elements in the data
+    looking for one with a matching uid. If found, returns the dictionary
+    of that run. Otherwise, returns False."""
+    
+    for run in data[g.S_RUNS]:          
+        if run[g.R_UID_SELF] == run_id: 
+            return run
+    return False
+
+def get_rep(data, ids):
+    """ Takes in:
+        - data     Dict.  With structure of .ovs data file
+        - ids      Tuple. With structure (run-id, rep-id)
+    Gets the run with ID that matches run-id from the data.
+    If it finds one, finds the rep whose ID matches rep-id.
+    If found, returns the rep dictionary. If not, returns False."""
+    runid = ids[0]
+    repid = ids[1]
+    run = get_run_from_file_data(data, runid)
+    if run:
+        for rep in run[g.R_REPLICATES]:
+            if rep[g.R_UID_SELF] == repid:
+                return rep
+    return False
+
+def get_all_reps_from_run_id(data, run_id):
+    """Takes in either a run_id (str) or a list of run_ids (list).
+    Returns a list of all reps of the form [(runid, repid}, (runid,
+    repid),...,(runid, repid)]"""
+    runlist = run_id
+    if type(run_id) == type('str'): # This makes fn back-compatible with calls that
+        runlist = [run_id]          # request reps from a single run and just pass the id.
+
+    replist = []
+    for run_id in runlist:
+        run = get_run_from_file_data(data, run_id)
+        for rep in run[g.R_REPLICATES]:
+            replist.append((run_id, rep[g.R_UID_SELF]))
+    return replist
+        
+
+def get_method_from_file_data(data, method_id):
+
+    """ takes in a full sample dataset dictionary, data, and the uid of the method
+    we are seeking, method_id. Loops through all method elements in the data
+    looking for one with a matching uid. If found, returns the dictionary
+    of that method. Otherwise, returns False."""
+    if method_id:
+        for method in data[g.S_METHODS]:
+            if method[g.M_UID_SELF] == method_id:
+                return method
+    return False
+
+def get_analysis(data, ids):
+    """ Takes in:
+        - data     Dict.  With structure of .ovs data file
+        - ids      Tuple. With structure (run-id, rep-id)
+    Gets the analysis for the rep specificed in ids. If no
+    analysis present, returns False."""
+    rep = get_rep(data, ids)
+    if not rep:
+        return False
+    if not rep[g.R_ANALYSIS]:
+        return False
+    else:
+        return rep[g.R_ANALYSIS]
+
+def get_v_max_abs(step):
+
+    """ takes in a step of the method, and returns the maximum amplitude
+    of volutage (always positive) during that step. """
+
+    if step[g.M_TYPE] == g.M_CONSTANT:
+        return abs(step[g.M_CONST_V])
+
+    elif step[g.M_TYPE] == g.M_RAMP:
+        v0 = abs(step[g.M_RAMP_V1])
+        v1 = abs(step[g.M_RAMP_V2])
+        return max(v0, v1)
+
+def get_method_duration(steps):
+    t = 0
+    for step in steps:
+        t = t + step[g.M_T]
+    return t
+
+def get_step_sample_freq(method_freq, step):
+    """Takes in the method's sample frequency and one of its steps. Returns the
+    sample frequency [Hz] the step is run at."""
+    return step.get(g.M_STEP_SAMPLE_FREQ) or method_freq
+
+def device_supports_sample_freq(device, freq):
+    """Takes in a device (see devices/supportedDevices.py) and a sample
+    frequency [Hz]. Returns True if the device can sample that often."""
+    return device['dtmin'] <= 1/freq <= device['dtmax']
+
+def get_step_keep_every(step):
+    """Takes in a step of the method. Returns N, where the run sends every Nth
+    sample of the step: every sample of steps that collect data, only a preview
+    (see g.R_PREVIEW_EVERY_N) of steps whose data is thrown away. 0 means the
+    step sends no samples at all."""
+    if step[g.M_DATA_COLLECT] == g.M_DATA_NONE:
+        return g.R_PREVIEW_EVERY_N
+    return 1
+
+def get_method_expected_samples(method):
+    """Returns how many samples a run of method should send"""
+    n = 0
+    for step in method[g.M_STEPS]:
+        keep_every = get_step_keep_every(step)
+        if keep_every:
+            n = n + step[g.M_T] * get_step_sample_freq(method[g.M_SAMPLE_FREQ], step) / keep_every
+    return n
+        
+def get_method_v_extremes(steps):
+    v_min = 0
+    v_max = 0
+    for step in steps:
+        if step[g.M_TYPE] == g.M_CONSTANT:
+            if step[g.M_CONST_V] < v_min:
+                v_min = step[g.M_CONST_V]
+            elif step[g.M_CONST_V] > v_max:
+                v_max = step[g.M_CONST_V]
+        elif step[g.M_TYPE] == g.M_RAMP:
+            if step[g.M_RAMP_V1] > step[g.M_RAMP_V2]:
+                hi = step[g.M_RAMP_V1]
+                lo = step[g.M_RAMP_V2]
+            else:
+                hi = step[g.M_RAMP_V2]
+                lo = step[g.M_RAMP_V1]
+            if lo < v_min:
+                v_min = lo
+            if hi > v_max:
+                v_max = hi
+    return (v_min, v_max)
+
+def get_method_measurement_bounds(steps):
+    signal_bounds = []
+    background_bounds = []
+    t_tot = 0
+    for step in steps:
+        if step[g.M_TYPE] == g.M_RELAY_STEP:    # relay steps take no time
+            continue
+        t_step = step[g.M_T]
+        if step[g.M_DATA_COLLECT] == g.M_DATA_SIGNAL:
+            signal_bounds.append((t_tot, t_tot+t_step))
+        elif step[g.M_DATA_COLLECT] == g.M_DATA_BACKGROUND:
+            background_bounds.append((t_tot, t_tot+t_step))
+        t_tot = t_tot+t_step
+    return (signal_bounds, background_bounds)
+
+def get_collect_masks(steps, t):
+    """Takes in the steps of a run and the times of its samples (counted from the
+    start of the run). Returns (in_signal, in_background), boolean arrays saying
+    which samples were taken during steps that collect signal or background. A
+    sample right on the boundary between two steps counts as taken in both."""
+    steps = [step for step in steps if step[g.M_TYPE] != g.M_RELAY_STEP]    # relay steps take no time
+    edges = np.cumsum([0] + [step[g.M_T] for step in steps])                # start of each step, then end of the last
+    codes = {g.M_DATA_SIGNAL: 1, g.M_DATA_BACKGROUND: 2}                     # anything else collects nothing (0)
+    collects = np.array([0] + [codes.get(step[g.M_DATA_COLLECT], 0) for step in steps] + [0], dtype=np.int8)
+    t = np.asarray(t)
+    after = collects[np.searchsorted(edges, t, side='right')]   # what the step starting at or before each sample collects
+    before = collects[np.searchsorted(edges, t, side='left')]   # what the step ending at or after each sample collects
+    return ((after == 1) | (before == 1), (after == 2) | (before == 2))
+
+def split_raw_data(steps, t, v, i):
+    """Takes in the steps of a run and all of the samples it took, as arrays of
+    time (counted from the start of the run), voltage and current. Returns
+    (signal, background), the raw data columns of the samples taken during steps
+    that collect signal and during steps that collect background."""
+    splits = []
+    for keep in get_collect_masks(steps, t):
+        cols = dict(zip(g.R_DATA_COLUMNS, (np.round(t[keep], 4), v[keep], i[keep])))
+        splits.append(cols)
+    return tuple(splits)
+
+def html_escape(s):
+    s = s.replace("&", "&amp;")
+    s = s.replace("<", "&lt;")
+    s = s.replace(">", "&gt;")
+    s = s.replace('"', "&quot;")
+    s = s.replace("'", "&#39;")
+    return s
+
+def get_relay_text(name, i):
+    if name == "":
+        return 'device '+str(i+1)
+    return name
+
+def get_analyzed_value(a, atype):
+    """Returns a floating point value from the dict, rep, based on which type
+    of analysis, atype, has been given. If there is no analysis for the given
+    rep, returns None."""
+    
+    if not a:
+        return None
+    if atype == g.C_TYPE_PEAKBASE:
+        return a[g.A_PEAK_HEIGHT]
+    elif atype == g.C_TYPE_PEAKZERO:
+        return a[g.A_PEAK_Y]
+    elif atype == g.C_TYPE_SLOPE_L:
+        return a[g.A_DERIV_LEFT]
+    elif atype == g.C_TYPE_SLOPE_R:
+        return a[g.A_DERIV_RIGHT]
+    elif atype == g.C_TYPE_SLOPE_AVG:
+        return a[g.A_DERIV_MEAN]
+
+
+
+def convert_conc_to_file_unit(conc, unit):
+    """converts the value (float) in unit units into grams per liter"""
+    return conc * g.UNIT_CONV_CONC[unit]
+
+def convert_conc_from_file_unit(conc, unit):
+    """converts the value (float) in grams per liter to the requested unit"""
+    return conc / g.UNIT_CONV_CONC[unit]
+
+def convert_vol_to_file_unit(vol, unit):
+    return vol * g.UNIT_CONV_VOL[unit]
+
+def convert_vol_from_file_unit(vol, unit):
+    return vol / g.UNIT_CONV_VOL[unit]
@@ -1,14 +1,9 @@
 # ov_functions.py
 #		
 
-import os
-from tabularjson import parse, stringify, StringifyOptions, is_homogeneous
-from re import sub
-
-from json import dumps
-
 from global_scripts import ov_globals as g
 from global_scripts import ov_lang as l
+from global_scripts.ov_core import *    # all GUI-free helpers (file and data handling) live in ov_core
 
 from PyQt6.QtCore import Qt 
 from PyQt6.QtWidgets import (
@@ -20,24 +15,6 @@ from PyQt6.QtWidgets import (
     QFileDialog
 )
 
-def encodeCustomName(custom_name):
-    return g.CUSTOM_NAME_FLAG+custom_name
-
-def isCustomName(s):
-    return s.startswith(g.CUSTOM_NAME_FLAG)
-
-def decodeCustomName(encoded_name):
-    return encoded_name.replace(g.CUSTOM_NAME_FLAG, '', 1)
-
-def custText(arr):
-    return arr[g.L]
-    
-def confirmPathExists(path):
-    """Takes in a path in the system. If the path exists, returns True. Else False."""
-    if os.path.exists(path):
-        return True
-    return False
-    
 def reopenSession(main, self=None):
     """Takes in a main window object and an optional current window option. Only pass a
     current window object. Pass a current window object if the reopen request is coming
@@ -82,23 +59,13 @@ def show_alert(obj, title, msg):
     dlg.setText(msg)
     dlg.exec()
 
-def guess_filename(name):
-    """Takes in a name and returns a best guess at the filename
-    by stripping all characters other than letters, numbers,
-    em-dashes, and underscores and by replacing all blankspace
-    with dashes"""
-    guess = sub('[^A-Za-z0-9 ]', '', name)  # remove all characters other than a-z, numbers, and spaces
-    guess = ' '.join(guess.split())         # convert all sequential blankspace to a single space
-    guess = guess.replace(' ', '-')         # replace all spaces with em-dashes
-    return guess
-
 def get_path_from_user(win, pathtype):
     """Takes in a parent window and type of path
     Returns a path if one is selected, otherwise returns an empty string"""
     try:
         path = ''
         if pathtype=='session':
-            path = QFileDialog.getOpenFileName(win, 'Open session', '', g.SAMPLE_FILE_TYPES)[0]
+            path = QFileDialog.getOpenFileName(win, 'Open session', '', g.SAMPLE_OPEN_FILE_TYPES)[0]
         elif pathtype=='method':
             path = QFileDialog.getOpenFileName(win, 'Open method', '', g.METHOD_FILE_TYPES)[0]
         elif pathtype=='folder':
@@ -110,81 +77,6 @@ def get_path_from_user(win, pathtype):
         
     
 
-def get_data_from_file(path):
-    try:
-        with open(path, 'r') as file:
-            content = file.read()
-            data = parse(content)
-        return data
-    except Exception as e:
-        print(e)
-        return False
-
-def write_data_to_file(path, data):
-    try:
-        with open(path, 'w') as file:                            
-            
-            options: StringifyOptions = {
-                "indentation": 4,
-                "trailingCommas": False,
-                "output_as_table": lambda tabular_data, path: g.R_DATA_TIME in tabular_data[0] or g.C_RUN_ID in tabular_data[0]
-                }
-            tab_json_to_write = stringify(data, options)       #   convert dictionary to json string
-            file.write(tab_json_to_write)                                       #   write json string to file
-            #json_to_write = dumps(data, indent=4)
-            #file.write(json_to_write)
-            file.close()                                                    #   close the file (to avoid taking up too much memory)
-        return True
-    except Exception as e:
-        print(e)
-        return False
-
-def remove_data_from_layout(d):
-    for run in d[g.S_RUNS]:                 # For each run in data dict
-        for rep in run[g.R_REPLICATES]:     #  And for each rep of the run
-            rep.pop(g.R_DATA, None)         #   Remove the raw data
-            rep.pop(g.R_BACKGROUND, None)   #   Remove raw background data
-    return d
-
-def get_next_id(ids, prefix):
-        """ Takes in a list of ids, loops through them to find the
-        most recent one. Returns the id of the next one, which should be
-        one greater than the current. Assumes IDs are of the format:
-             [PREFIX]-n
-        For example, if the [PREFIX] was 'fulano' the first few would be:
-        fulano-1, fulano-2, fulano-3, etc.
-        """
-        max_id = -1
-        for ID in ids:
-            num = int(ID.replace(prefix,''))
-            if num > max_id:
-                max_id = num
-        return prefix+str(max_id+1)
-
-def get_ids(data, key):
-    '''assumes that data is a dictionary with many key value pairs. Assumes
-    that key is a key whose value is a list. Returns the unique IDs of
-    every object in the list.'''
-    ids = []
-    for obj in data[key]:
-        ids.append(obj[g.R_UID_SELF])
-    return ids
-    
-
-def methods_match(m1, m2):
-    ''' Takes in two method dicts, m1 and m2
-    checks whether they match. If so, returns True,
-    if not, returns False'''
-    
-    keys_to_ignore = [g.M_UID_SELF]   # List all keys to ignore
-    for key in m1:                      # Loop thru all keys in m1
-        if key not in keys_to_ignore:   # If key is not on ignore list
-            if key not in m2:           # if the key from m1 is not in m2
-                return False            #   We don't have a match...
-            elif m1[key] != m2[key]:    # if the key exists but the values don't match
-                return False            #   Still no match...
-    return True                         # If we get all the way thru, its a match! 
-
 def get_row_ws(w_parent, i):
     """Accepts:
     - w_parent: a widget that contains a grid layout
@@ -224,156 +116,6 @@ def get_row_ws(w_parent, i):
 #
 ###########################################################3
 
-def get_sample_from_file_data(data, sample_id):
-    for sample in data[g.S_SAMPLES]:
-        if sample[g.R_UID_SELF] == sample_id:
-            return sample
-    return False
-
-def get_runs_in_sample(data, sample_id):
-    runs_of_sample = []
-    for run in data[g.S_RUNS]:
-        if run[g.R_UID_SAMPLE] == sample_id:
-            runs_of_sample.append(run)
-    return runs_of_sample
-
-def get_run_from_file_data(data, run_id):
-    
-    """ takes in a full dataset dictionary, data, and the uid of the run
-    we are seeking, run_id. Loops through all run elements in the data
-    looking for one with a matching uid. If found, returns the dictionary
-    of that run. Otherwise, returns False."""
-    
-    for run in data[g.S_RUNS]:          
-        if run[g.R_UID_SELF] == run_id: 
-            return run
-    return False
-
-def get_rep(data, ids):
-    """ Takes in:
-        - data     Dict.  With structure of .ovs data file
-        - ids      Tuple. With structure (run-id, rep-id)
-    Gets the run with ID that matches run-id from the data.
-    If it finds one, finds the rep whose ID matches rep-id.
-    If found, returns the rep dictionary. If not, returns False."""
-    runid = ids[0]
-    repid = ids[1]
-    run = get_run_from_file_data(data, runid)
-    if run:
-        for rep in run[g.R_REPLICATES]:
-            if rep[g.R_UID_SELF] == repid:
-                return rep
-    return False
-
-def get_all_reps_from_run_id(data, run_id):
-    """Takes in either a run_id (str) or a list of run_ids (list).
-    Returns a list of all reps of the form [(runid, repid}, (runid,
-    repid),...,(runid, repid)]"""
-    runlist = run_id
-    if type(run_id) == type('str'): # This makes fn back-compatible with calls that
-        runlist = [run_id]          # request reps from a single run and just pass the id.
-
-    replist = []
-    for run_id in runlist:
-        run = get_run_from_file_data(data, run_id)
-        for rep in run[g.R_REPLICATES]:
-            replist.append((run_id, rep[g.R_UID_SELF]))
-    return replist
-        
-
-def get_method_from_file_data(data, method_id):
-
-    """ takes in a full sample dataset dictionary, data, and the uid of the method
-    we are seeking, method_id. Loops through all method elements in the data
-    looking for one with a matching uid. If found, returns the dictionary
-    of that method. Otherwise, returns False."""
-    if method_id:
-        for method in data[g.S_METHODS]:
-            if method[g.M_UID_SELF] == method_id:
-                return method
-    return False
-
-def get_analysis(data, ids):
-    """ Takes in:
-        - data     Dict.  With structure of .ovs data file
-        - ids      Tuple. With structure (run-id, rep-id)
-    Gets the analysis for the rep specificed in ids. If no
-    analysis present, returns False."""
-    rep = get_rep(data, ids)
-    if not rep:
-        return False
-    if not rep[g.R_ANALYSIS]:
-        return False
-    else:
-        return rep[g.R_ANALYSIS]
-
-def get_v_max_abs(step):
-
-    """ takes in a step of the method, and returns the maximum amplitude
-    of volutage (always positive) during that step. """
-
-    if step[g.M_TYPE] == g.M_CONSTANT:
-        return abs(step[g.M_CONST_V])
-
-    elif step[g.M_TYPE] == g.M_RAMP:
-        v0 = abs(step[g.M_RAMP_V1])
-        v1 = abs(step[g.M_RAMP_V2])
-        return max(v0, v1)
-
-def get_method_duration(steps):
-    t = 0
-    for step in steps:
-        t = t + step[g.M_T]
-    return t
-        
-def get_method_v_extremes(steps):
-    v_min = 0
-    v_max = 0
-    for step in steps:
-        if step[g.M_TYPE] == g.M_CONSTANT:
-            if step[g.M_CONST_V] < v_min:
-                v_min = step[g.M_CONST_V]
-            elif step[g.M_CONST_V] > v_max:
-                v_max = step[g.M_CONST_V]
-        elif step[g.M_TYPE] == g.M_RAMP:
-            if step[g.M_RAMP_V1] > step[g.M_RAMP_V2]:
-                hi = step[g.M_RAMP_V1]
-                lo = step[g.M_RAMP_V2]
-            else:
-                hi = step[g.M_RAMP_V2]
-                lo = step[g.M_RAMP_V1]
-            if lo < v_min:
-                v_min = lo
-            if hi > v_max:
-                v_max = hi
-    return (v_min, v_max)
-
-def get_method_measurement_bounds(steps):
-    signal_bounds = []
-    background_bounds = []
-    t_tot = 0
-    for step in steps:
-        t_step = step[g.M_T]
-        if step[g.M_DATA_COLLECT] == g.M_DATA_SIGNAL:
-            signal_bounds.append((t_tot, t_tot+t_step))
-        elif step[g.M_DATA_COLLECT] == g.M_DATA_BACKGROUND:
-            background_bounds.append((t_tot, t_tot+t_step))
-        t_tot = t_tot+t_step
-    return (signal_bounds, background_bounds)
-
-def html_escape(s):
-    s = s.replace("&", "&amp;")
-    s = s.replace("<", "&lt;")
-    s = s.replace(">", "&gt;")
-    s = s.replace('"', "&quot;")
-    s = s.replace("'", "&#39;")
-    return s
-
-def get_relay_text(name, i):
-    if name == "":
-        return 'device '+str(i+1)
-    return name
-
 def show_warning(title, msg):
     confirm = warningMessageBox(title, msg)
     resp = confirm.exec()
@@ -475,46 +217,6 @@ def check_calc_conflict(data, reps_to_change):
     # If user says 'archive and continue' 
     return True, calcs_in_conflict
 
-def get_analyzed_value(a, atype):
-    """Returns a floating point value from the dict, rep, based on which type
-    of analysis, atype, has been given. If there is no analysis for the given
-    rep, returns None."""
-    
-    if not a:
-        return None
-    if atype == g.C_TYPE_PEAKBASE:
-        return a[g.A_PEAK_HEIGHT]
-    elif atype == g.C_TYPE_PEAKZERO:
-        return a[g.A_PEAK_Y]
-    elif atype == g.C_TYPE_SLOPE_L:
-        return a[g.A_DERIV_LEFT]
-    elif atype == g.C_TYPE_SLOPE_R:
-        return a[g.A_DERIV_RIGHT]
-    elif atype == g.C_TYPE_SLOPE_AVG:
-        return a[g.A_DERIV_MEAN]
-
-
-
-def convert_conc_to_file_unit(conc, unit):
-    """converts the value (float) in unit units into grams per liter"""
-    return conc * g.UNIT_CONV_CONC[unit]
-
-def convert_conc_from_file_unit(conc, unit):
-    """converts the value (float) in grams per liter to the requested unit"""
-    return conc / g.UNIT_CONV_CONC[unit]
-
-def convert_vol_to_file_unit(vol, unit):
-    return vol * g.UNIT_CONV_VOL[unit]
-
-def convert_vol_from_file_unit(vol, unit):
-    return vol / g.UNIT_CONV_VOL[unit]
-
-
-
-
-
-
-
 # Classes!
 
 class QVLine(QFrame):
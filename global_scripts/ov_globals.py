@@ -56,6 +56,7 @@ M_CURRENT_RANGE = 'current-range'
 M_EXT_DEVICES = 'ext_devices'
 M_STEPS = 'steps'
 M_STEP_NAME = 'name'
+M_STEP_SAMPLE_FREQ = 'sample-frequency-hz'  # optional on a step: its own sample frequency, instead of the method's M_SAMPLE_FREQ
 M_DATA_COLLECT = 'data-collect'
 M_DATA_NONE = 'no'
 M_DATA_SIGNAL = 'signal'
@@ -112,6 +113,8 @@ R_STATUS = 'status'
 R_DATA = 'data'
 R_BACKGROUND = 'background'
 R_ANALYSIS = 'analysis'
+R_ANALYSIS_PROVISIONAL = 'analysis-provisional'   # analysis guessed in the background after the run, not yet accepted (see ov_analysis)
+R_RAW_INDEX = 'raw-index'   # {R_DATA or R_BACKGROUND: [byte offset, n samples]} of the rep's arrays in the sidecar
 R_TIMESTAMP_REP = 'time-ended'
 R_STATUS_PENDING = "pending"
 R_STATUS_ERROR = "error"
@@ -121,12 +124,21 @@ R_REPLICATE_UID_PREFIX = "rep-"
 R_TYPES = [R_TYPE_BLANK, R_TYPE_SAMPLE, R_TYPE_STDADD]
 
 # Run window
-R_PLOT_REFRESH_TIME = 0.1   # refreshes graph every x seconds
-R_POST_RUN_WAIT_TIME = 0.5  # time after run to wait for last data [s]
+R_PLOT_REFRESH_TIME = 0.1   # refreshes graph at most every x seconds...
+R_PLOT_MAX_REFRESH_TIME = 1.0 # ...and at least every x seconds
+R_PLOT_MAX_LOAD = 0.5       # the live plot slows its refreshes so drawing takes at most this fraction of the GUI's time
+R_FRAME_INTERVAL = 0.02     # run process sends the samples it has buffered at least this often [s]
+R_BUFFER_HEADROOM = 1.1     # run buffers are sized for this many times the samples a method should take
+R_BUFFER_MIN_SAMPLES = 1024 # ...but never for fewer than this many samples
+R_AUTO_ANALYZE = True       # guess the analysis of each rep in the background once it is saved (see ov_analysis)
+R_MULTISTEP_MAX_STEPS = 50  # most constant voltage steps merged into one multi-step device test
+R_PREVIEW_EVERY_N = 10      # steps that collect no data send only every Nth sample (and their last), for the live plot. 0 sends none
+R_SPILL_FSYNC_INTERVAL = 1.0 # samples spilled to disk during a run are forced onto the disk at least this often [s]
 R_STATUS_PREFIX = 'STA'
 R_DATA_PREFIX = 'DAT'
 R_PORT_PREFIX = 'POR'
 R_RELAY_PREFIX = 'REL'
+R_REPLAY_PREFIX = 'RPL'
 R_ERROR_NO_CONNECT = 'Could not find a potentiostat.'
 R_ERROR_VMAX_TOO_HIGH = 'Vmax of the method exceeds capacity of device.'
 R_ERROR_DURING_RUN = '2'
@@ -135,6 +147,8 @@ R_FINISHED_MSG = 'FIN'
 R_DATA_TIME = 'time_s'
 R_DATA_VOLT = 'voltage_V'
 R_DATA_CURR = 'current_mA'
+R_DATA_COLUMNS = (R_DATA_TIME, R_DATA_VOLT, R_DATA_CURR)   # column order of raw data arrays
+R_DATA_DTYPE = 'float64'                                    # dtype of raw data arrays stored on disk
 
 # Analysis (peak finding)
 A_PEAK_X = 'peak_x'
@@ -147,6 +161,8 @@ A_BASE_1_Y = 'baseline_upper_y'
 A_DERIV_LEFT = 'max-derivative-left'
 A_DERIV_RIGHT = 'max-derivative-right'
 A_DERIV_MEAN = 'mean-max-derivatives'
+A_PROVISIONAL_RESULTS = 'analysis'         # a provisional analysis holds the analysis...
+A_PROVISIONAL_METHOD = 'method-settings'   # ...and the method settings it was made with
 
 # Calculation window globals
 C_STACK_INDEX_BASE = 0
@@ -217,6 +233,12 @@ PROC_TYPE_OVERWRITE = 'overwrite'
 PROC_TYPE_EXPORT = 'export'
 PROC_TYPE_READ = 'read'
 PROC_TYPE_RUN = 'run'
+PROC_TYPE_RUN_SESSION = 'run-session'   # one process that runs every rep of a batch, one request per rep
+PROC_TYPE_REPLAY = 'replay'             # a run session request that plays back a rep's recorded samples (see replay in process.py)
+PROC_TYPE_CONVERT = 'convert'
+PROC_TYPE_RECOVER = 'recover'
+PROC_TYPE_PROMOTE = 'promote'           # saves a rep that just finished running from its spill file (see promote in process.py)
+PROC_TYPE_WORKER = 'worker'
 PROC_SCRIPT = 'external/process.exe'
 PROC_SCRIPT_PYTHON = 'processes/process.py'
 PROC_RUN_FROM_PYTHON = 'python'
@@ -232,6 +254,35 @@ PROC_RUN_FROM = PROC_RUN_FROM_PYTHON
 #
 ###############################################
 
+# Device backends (the module in devices/ that runs talk to the device thru, see get_device_backend in process.py)
+DEVICE_BACKEND_RODEOSTAT = 'rodeostat'      # IO Rodeo's Rodeostat, on a serial port
+DEVICE_BACKEND_SIMULATED = 'simulated'      # a simulated potentiostat, for running with no device attached
+DEVICE_BACKEND_ENV = 'OPENVOLTAM_DEVICE'    # environment variable that, if set, overrides DEVICE_BACKEND (eg. on CI machines)
+SIM_SPEED = 1                               # the simulated potentiostat runs this many times faster than real time (0: as fast as it can)
+SIM_SPEED_ENV = 'OPENVOLTAM_SIM_SPEED'      # environment variable that, if set, overrides SIM_SPEED
+REPLAY_PORT = 'replay'                      # port the replay device (see devices/replay.py) is on
+REPLAY_SPEEDS = (1, 10, 0)                  # speeds a rep can be replayed at, times real time (0: as fast as it can)
+REPLAY_LATE_TIME = 0.1                      # a replayed batch of samples stored this long after a live run would have stored it is late [s]
+
+### CHANGE THIS TO RUN ON THE SIMULATED POTENTIOSTAT
+#
+#
+DEVICE_BACKEND = DEVICE_BACKEND_RODEOSTAT
+#DEVICE_BACKEND = DEVICE_BACKEND_SIMULATED
+#
+#
+###############################################
+
+# Worker process (one per open lab session, see WORKER in process.py)
+# Frame types of messages between the GUI and the worker (see ov_ipc)
+IPC_FRAME_REQUEST = 'Q'     # GUI -> worker: [process type, arg1, arg2, ...]
+IPC_FRAME_DATA = 'D'        # worker -> GUI: data sent back for the current request
+IPC_FRAME_ERROR = 'E'       # worker -> GUI: error sent back for the current request
+IPC_FRAME_FINISHED = 'F'    # worker -> GUI: the current request is done (no payload)
+IPC_FRAME_SAMPLES = 'S'     # run process -> GUI: a batch of samples from one step (binary, see ov_ipc.pack_samples)
+IPC_BINARY_FRAMES = (IPC_FRAME_SAMPLES,)    # frame types whose payload is raw bytes rather than JSON
+W_STOP_TIMEOUT = 3000       # time to let the worker finish its last request when the session closes [ms]
+
 # Asynchronous save
 SAVE_TYPE_EDIT_SESH_NAME = 'edit-session-name'
 SAVE_TYPE_SAMPLE_NEW = 'sample-new'
@@ -251,6 +302,15 @@ SAVE_TYPE_CALC_DELETE = 'calc-del'
 SAVE_TYPE_CALCS_ARCHIVE = 'calcs-archive'
 SAVE_TYPE_ANALYSES_DEL = 'analyses-del'
 SAVE_TYPE_CALCS_FROM_METHOD = 'calcs-method-settings'
+SAVE_TYPE_TRANSACTION = 'transaction'
+
+# Save deltas (what a save changed, sent back by the worker instead of the whole session)
+DELTA = 'delta'                 # key that marks a reply as a delta
+DELTA_SESSION = 'session'       # top-level session keys (eg. the name) that changed
+DELTA_ADDED = 'added'           # entities added to a collection
+DELTA_CHANGED = 'changed'       # entities in a collection that changed (whole entity)
+DELTA_REMOVED = 'removed'       # uids of entities removed from a collection
+DELTA_ORDER = 'order'           # new order of uids, only if patching doesn't give it
 
 # Input 
 RC_REPS_MIN = 1
@@ -272,6 +332,7 @@ CUSTOM_NAME_FLAG = 'ov_'
 DATE_DISPLAY_FORMAT = 'dd-MMM-yyyy'
 DATE_STORAGE_FORMAT = 'yyyy-MM-dd'
 DATETIME_STORAGE_FORMAT = DATE_STORAGE_FORMAT+' hh:mmap'
+DATETIME_STORAGE_STRFTIME = '%Y-%m-%d %I:%M%p'     # DATETIME_STORAGE_FORMAT for time.strftime (lowercase the result), for code without Qt
 SAMPLE_NAME_MIN_LENGTH = 3
 
 # Widget name mgmt (for targeting with QSS)
@@ -289,8 +350,18 @@ PADDING = 4
 #File system navigation
 SAMPLE_EXT = '.ovs'
 METHOD_EXT = '.ovm'
-SAMPLE_FILE_TYPES = 'OV Sample (*'+SAMPLE_EXT+')'
+SQLITE_EXT = '.ovdb'     # lab session stored in a single SQLite file (see ov_sqlite)
+SAMPLE_FILE_TYPES = 'OV Sample (*'+SAMPLE_EXT+');;OV Sample database (*'+SQLITE_EXT+')'
+SAMPLE_OPEN_FILE_TYPES = 'OV Sample (*'+SAMPLE_EXT+' *'+SQLITE_EXT+')'
 METHOD_FILE_TYPES = 'OV Method (*'+METHOD_EXT+')'
+DATA_EXT = '.ovd'       # folder next to each .ovs file that holds the session's raw data arrays
+RAW_DATA_EXT = '.npy'   # one file per rep per raw data key (signal or background) inside the .ovd folder
+JOURNAL_EXT = '.ovj'     # appended to the .ovs path for the file that journals saves not yet written into the .ovs
+JOURNAL_STALE_EXT = '.stale'    # appended to the journal path (with the time) for a journal set aside because it doesn't match its .ovs
+SPILL_EXT = '.spill'     # folder next to each session that holds the spill files of runs in progress (see ov_spill)
+SPILL_FILE_EXT = '.ovr'  # one spill file per rep inside the .spill folder
+JOURNAL_MAX_BYTES = 256 * 1024  # fold the journal into the .ovs once it is bigger than this [bytes]
+JOURNAL_MAX_AGE = 300           # or once its oldest save is older than this [s]
 
 # Unit conversions
 MM2IN = 1. / 25.4   # milimeters to inches
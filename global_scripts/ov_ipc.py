@@ -0,0 +1,121 @@
+# ov_ipc.py
+#
+# Framed messages between the GUI and process.py.
+#
+# Every message is one frame:
+#
+#       1 byte      frame type (one of the g.IPC_FRAME_* characters)
+#       4 bytes     length of the payload in bytes (unsigned, big-endian)
+#       n bytes     payload, JSON encoded as UTF-8
+#
+#   except for the frame types in g.IPC_BINARY_FRAMES, whose payload is raw bytes.
+#   The run process sends its samples this way (see pack_samples), so the GUI can
+#   turn a whole batch into arrays at once instead of parsing it sample by sample.
+#
+#   Because each frame says how long it is, payloads can be any size and a
+#   reader can tell when a frame has fully arrived, no matter how the pipe
+#   splits it up.
+#
+#   This module does not import Qt so it can be used by the process script.
+
+import json
+import struct
+import numpy as np
+
+from global_scripts import ov_globals as g
+
+HEADER = struct.Struct('>cI')   # frame type, payload length
+SAMPLES_HEADER = struct.Struct('>II')   # step index, number of samples
+SAMPLES_DTYPE = '<f8'                   # samples are little-endian float64
+
+
+def encode_frame(ftype, obj=None):
+    """Returns the bytes of one frame of type ftype carrying obj"""
+    payload = json.dumps(obj, separators=(',', ':')).encode('utf8')
+    return HEADER.pack(ftype.encode('ascii'), len(payload)) + payload
+
+def encode_raw_frame(ftype, payload):
+    """Returns the bytes of one frame of type ftype carrying the bytes payload as is"""
+    return HEADER.pack(ftype.encode('ascii'), len(payload)) + payload
+
+def decode_payload(payload):
+    return json.loads(payload.decode('utf8'))
+
+def decode_frame(ftype, payload):
+    """Returns (frame type as str, payload object) of a frame read off a stream"""
+    ftype = ftype.decode('ascii')
+    if ftype in g.IPC_BINARY_FRAMES:
+        return (ftype, bytes(payload))
+    return (ftype, decode_payload(payload))
+
+def write_frame(stream, ftype, obj=None):
+    """Writes one frame to stream (a binary file object) and flushes it"""
+    stream.write(encode_frame(ftype, obj))
+    stream.flush()
+
+def write_raw_frame(stream, ftype, payload):
+    """Writes one frame with a bytes payload to stream and flushes it"""
+    stream.write(encode_raw_frame(ftype, payload))
+    stream.flush()
+
+def read_exactly(stream, n):
+    """Reads n bytes from stream, blocking until they arrive. Returns fewer
+    than n bytes only if the stream closes first."""
+    buf = b''
+    while len(buf) < n:
+        chunk = stream.read(n - len(buf))
+        if not chunk:
+            break
+        buf = buf + chunk
+    return buf
+
+def read_frame(stream):
+    """Reads one frame from stream (a blocking binary file object). Returns
+    (frame type, payload object), or None if the stream closes first."""
+    header = read_exactly(stream, HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (ftype, n) = HEADER.unpack(header)
+    payload = read_exactly(stream, n)
+    if len(payload) < n:
+        return None
+    return decode_frame(ftype, payload)
+
+
+class FrameReader():
+    """Reassembles frames from bytes that arrive in arbitrary chunks (e.g.
+    from QProcess.readAllStandardOutput). Feed it each chunk as it arrives;
+    it returns every frame completed so far and keeps any partial frame
+    until the rest of it arrives."""
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        frames = []
+        i = 0
+        while len(self.buffer) - i >= HEADER.size:
+            (ftype, n) = HEADER.unpack_from(self.buffer, i)
+            if len(self.buffer) - i - HEADER.size < n:      # rest of this frame hasn't arrived yet
+                break
+            start = i + HEADER.size
+            frames.append(decode_frame(ftype, self.buffer[start:start+n]))
+            i = start + n
+        del self.buffer[:i]
+        return frames
+
+
+def pack_samples(step, t, v, i):
+    """Takes in the index of the step the samples are from and equal length lists
+    of time, voltage and current. Returns the payload of a g.IPC_FRAME_SAMPLES frame:
+    the step index and number of samples followed by all the times, then all the
+    voltages, then all the currents."""
+    n = len(t)
+    return SAMPLES_HEADER.pack(step, n) + struct.pack('<'+str(3*n)+'d', *t, *v, *i)
+
+def unpack_samples(payload):
+    """Takes in the payload of a g.IPC_FRAME_SAMPLES frame. Returns (step index,
+    array of shape (3, n)) with rows time, voltage and current."""
+    (step, n) = SAMPLES_HEADER.unpack_from(payload)
+    cols = np.frombuffer(payload, dtype=SAMPLES_DTYPE, count=3*n, offset=SAMPLES_HEADER.size)
+    return (step, cols.reshape(3, n))
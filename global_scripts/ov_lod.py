@@ -0,0 +1,101 @@
+# ov_lod.py
+#
+# Level of detail for plotting long series.
+#
+#   A long run has far more samples than a plot has pixels. Before a series is
+#   drawn, it is cut into chunks of consecutive samples, each covering about one
+#   pixel of x along the plot, and only the lowest and highest sample of each chunk
+#   is kept (in the order they were taken). The drawn line looks the same as the full
+#   series at that zoom level but has at most a few points per pixel.
+#
+#   Chunks are sized by how far x travels, not by x itself, so series whose x goes
+#   back and forth (eg. the voltage of a cyclic voltammogram) keep their shape.
+#
+#   Only what is drawn is decimated. The full arrays stay the data for analysis,
+#   picking, saving, etc.
+#
+#   This module does not import Qt or matplotlib. It works on anything with the
+#   matplotlib Axes and Line2D interface.
+
+import numpy as np
+
+
+def chunk_length(x, width_px, xlim):
+    """Takes in the x values of a series, the width of the plot in pixels and the
+    plot's x limits. Returns how many consecutive samples cover one pixel of x."""
+    if len(x) < 2 or width_px < 1:
+        return 1
+    px = abs(xlim[1] - xlim[0]) / width_px          # x units per pixel
+    path = np.abs(np.diff(x)).sum()                 # total distance travelled along x
+    if not px or not path:
+        return 1
+    return max(int(len(x) * px / path), 1)
+
+def decimate_minmax(x, y, chunk):
+    """Takes in a series (x, y) and a chunk length. Returns (x, y) with only the
+    lowest and highest y of each chunk of samples, in their original order."""
+    n = len(y)
+    if chunk <= 2 or n <= 2*chunk:
+        return (x, y)
+    k = -(-n // chunk)                              # number of chunks (the last may be short)
+    padded = np.full(k*chunk, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(k, chunk)
+    starts = np.arange(k) * chunk
+    i_min = starts + np.nanargmin(rows, axis=1)
+    i_max = starts + np.nanargmax(rows, axis=1)
+    idx = np.column_stack((np.minimum(i_min, i_max), np.maximum(i_min, i_max))).ravel()
+    return (x[idx], y[idx])
+
+
+class MinMaxDecimator():
+    """Decimates a series that keeps growing (eg. a live run) without going over the
+    samples it has already decimated. Only whole chunks are decimated; samples in
+    the last, unfinished chunk are returned as they are."""
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.n_done = 0                 # samples decimated so far
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+
+    def update(self, x, y):
+        """Takes in the whole series so far. Returns it decimated."""
+        n_full = (len(x) // self.chunk) * self.chunk
+        if n_full > self.n_done:
+            (xd, yd) = decimate_minmax(x[self.n_done:n_full], y[self.n_done:n_full], self.chunk)
+            self.x = np.concatenate((self.x, xd))
+            self.y = np.concatenate((self.y, yd))
+            self.n_done = n_full
+        return (np.concatenate((self.x, x[self.n_done:])), np.concatenate((self.y, y[self.n_done:])))
+
+
+class MinMaxLOD():
+    """Keeps the lines added to it on one matplotlib axes decimated to what the
+    axes can show. Lines are decimated again whenever the x limits change (home,
+    pan or zoom on the toolbar) or the canvas is resized."""
+    def __init__(self, axes):
+        self.axes = axes
+        self.lines = []                 # (line, full x, full y, whether x is sorted) of each line
+        axes.callbacks.connect('xlim_changed', self.update)
+        axes.figure.canvas.mpl_connect('resize_event', self.update)
+
+    def add(self, line, x, y):
+        """Takes in a line already plotted on the axes and its full data"""
+        (x, y) = (np.asarray(x), np.asarray(y))
+        sorted_x = len(x) < 2 or bool(np.all(np.diff(x) >= 0))
+        self.lines.append((line, x, y, sorted_x))
+        self.decimate(line, x, y, sorted_x)
+
+    def decimate(self, line, x, y, sorted_x):
+        xlim = self.axes.get_xlim()
+        if sorted_x:                    # if x only goes up (eg. time), only what is in view needs drawing
+            i0 = max(np.searchsorted(x, min(xlim), side='left') - 1, 0)
+            i1 = np.searchsorted(x, max(xlim), side='right') + 1
+            (x, y) = (x[i0:i1], y[i0:i1])
+        chunk = chunk_length(x, self.axes.bbox.width, xlim)
+        line.set_data(*decimate_minmax(x, y, chunk))
+
+    def update(self, event=None):
+        self.lines = [entry for entry in self.lines if entry[0].axes]     # forget lines that were removed
+        for entry in self.lines:
+            self.decimate(*entry)
@@ -0,0 +1,79 @@
+# ov_replay.py
+#
+# Throughput of a replay (see WindowReplay): how fast the samples of a replayed rep got
+#   from the run process into the run viewer, and which batches of them got there late
+#   or not at all.
+#
+#   A batch (one g.IPC_FRAME_SAMPLES frame) is late if it was stored more than
+#   g.REPLAY_LATE_TIME after it would have been on a live run, which takes each sample at
+#   its time in the run. Each step is timed from when its first batch was stored, since the
+#   replay skips steps that recorded nothing (the run's clock doesn't carry over from one
+#   step to the next). Replays at full speed have no live run to keep up with, so none of
+#   their batches are late.
+#
+#   This module does not import Qt so it can be used without the GUI.
+
+from global_scripts import ov_globals as g
+
+
+def get_speed_text(speed):
+    return str(speed)+'x' if speed else 'full speed'
+
+
+class ReplayStats():
+    def __init__(self, speed):
+        self.speed = speed
+        self.expected = None            # samples in the recording (the run process says, once the replay starts)
+        self.frames = 0                 # batches stored
+        self.samples = 0                # samples stored
+        self.dropped = 0                # batches that could not be stored
+        self.late = 0                   # batches stored late
+        self.worst = 0                  # the most any batch was late by [s]
+        self.started = None             # when (perf_counter) the first batch was stored...
+        self.ended = None               # ...and the last
+        self.anchor = None              # (step, when stored, time in the run of its last sample) of the step's first batch
+        self.draws = []                 # how long each redraw of the live plot took [s]
+
+    def add_frame(self, step, t, stored):
+        """Takes in the step index and sample times of a batch that was stored, and
+        when (perf_counter) it was stored"""
+        if self.started is None:
+            self.started = stored
+        self.ended = stored
+        self.frames = self.frames + 1
+        self.samples = self.samples + len(t)
+        if not len(t):
+            return
+        if self.anchor is None or self.anchor[0] != step:
+            self.anchor = (step, stored, t[-1])
+        elif self.speed:
+            due = self.anchor[1] + (t[-1] - self.anchor[2]) / self.speed
+            self.worst = max(self.worst, stored - due)
+            if stored - due > g.REPLAY_LATE_TIME:
+                self.late = self.late + 1
+
+    def add_dropped(self):
+        self.dropped = self.dropped + 1
+
+    def add_draw(self, seconds):
+        self.draws.append(seconds)
+
+    def get_summary(self):
+        """Returns the stats as a list of (label, value as text)"""
+        elapsed = self.ended - self.started if self.frames else 0
+        rate = self.samples / elapsed if elapsed else 0
+        summary = [('Speed', get_speed_text(self.speed)),
+                   ('Samples stored', str(self.samples) + ('' if self.expected is None else ' of '+str(self.expected))),
+                   ('Sustained rate', str(round(rate))+' samples/s over '+str(round(elapsed, 3))+' s'),
+                   ('Batches stored', str(self.frames))]
+        if self.speed:
+            summary.append(('Late batches', str(self.late)+' (worst '+str(round(1000*self.worst))+' ms)'))
+        else:
+            summary.append(('Late batches', 'n/a at full speed'))
+        summary.append(('Dropped batches', str(self.dropped)))
+        if self.expected is not None:
+            summary.append(('Missing samples', str(self.expected - self.samples)))
+        if self.draws:
+            mean = sum(self.draws) / len(self.draws)
+            summary.append(('Plot redraws', str(len(self.draws))+' (mean '+str(round(1000*mean, 1))+' ms, max '+str(round(1000*max(self.draws), 1))+' ms)'))
+        return summary
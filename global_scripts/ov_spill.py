@@ -0,0 +1,175 @@
+# ov_spill.py
+#
+# Spill files: the samples of a run, streamed to disk as they come in.
+#
+#   While a rep is running, every batch of samples the GUI gets from the run process
+#   is also appended to the rep's spill file, 'x.spill/<run-id>_<rep-id>.ovr' next to
+#   the session at 'x.ovs' (or 'x.ovdb'). The file is made of ov_ipc frames:
+#
+#       1 g.IPC_FRAME_DATA frame        {ids, steps, started}, what is needed to
+#                                       turn the samples into a rep's raw data
+#       n g.IPC_FRAME_SAMPLES frames    one per batch of samples, with time counted
+#                                       from the start of the run
+#
+#   Frames are only ever appended, and the file is forced onto the disk at least
+#   every g.R_SPILL_FSYNC_INTERVAL seconds. If the app dies mid-run, everything up
+#   to the last sync is still in the file, and a half-written last frame is ignored
+#   when it is read back.
+#
+#   When a rep finishes, its spill file is promoted: split into signal and background
+#   and saved as the rep's raw data (only that rep is written), then deleted. Spill files left behind by a run
+#   that never finished are promoted the same way the next time the session is opened
+#   (see recover_spills), with the rep marked as errored.
+#
+#   This module does not import Qt so it can be used by the process script.
+
+import os
+import time
+import numpy as np
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_core import (get_data_from_file,
+                                    save_rep_raw_data,
+                                    get_rep,
+                                    split_raw_data)
+from global_scripts.ov_ipc import (encode_frame,
+                                   encode_raw_frame,
+                                   read_frame,
+                                   unpack_samples,
+                                   SAMPLES_HEADER,
+                                   SAMPLES_DTYPE)
+
+SPILL_IDS = 'ids'
+SPILL_STEPS = 'steps'
+SPILL_STARTED = 'started'
+
+
+def get_spill_folder(path):
+    """Takes in the path of a session file, returns the path of the folder that
+    holds the session's spill files."""
+    return os.path.splitext(path)[0] + g.SPILL_EXT
+
+def get_spill_path(path, ids):
+    """Returns the path of the spill file of the rep with ids (run-id, rep-id)
+    of the session at path."""
+    return os.path.join(get_spill_folder(path), ids[0] + '_' + ids[1] + g.SPILL_FILE_EXT)
+
+def find_spills(path):
+    """Returns the paths of all spill files of the session at path"""
+    folder = get_spill_folder(path)
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(g.SPILL_FILE_EXT)]
+
+def remove_spill(spillpath):
+    if os.path.exists(spillpath):
+        os.remove(spillpath)
+    folder = os.path.dirname(spillpath)
+    if os.path.isdir(folder) and not os.listdir(folder):     # don't leave an empty folder behind
+        os.rmdir(folder)
+
+
+class SpillWriter():
+    """Appends the samples of one rep to its spill file as they come in. Starting
+    a writer for a rep that already has a spill file (eg. the user chose to try the
+    rep again) starts that file over."""
+    def __init__(self, path, ids, steps):
+        self.path = get_spill_path(path, ids)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, 'wb')
+        meta = {SPILL_IDS: list(ids), SPILL_STEPS: steps, SPILL_STARTED: time.time()}
+        self.file.write(encode_frame(g.IPC_FRAME_DATA, meta))
+        self.sync()
+
+    def append(self, step, t, v, i):
+        """Appends a block of samples from the step with index step (in the run's
+        steps). t, v and i are equal length 1D arrays."""
+        if self.file is None:
+            return
+        cols = np.vstack((t, v, i)).astype(SAMPLES_DTYPE)
+        payload = SAMPLES_HEADER.pack(step, cols.shape[1]) + cols.tobytes()
+        self.file.write(encode_raw_frame(g.IPC_FRAME_SAMPLES, payload))
+        self.file.flush()                                           # hand it to the OS right away...
+        if time.monotonic() - self.synced > g.R_SPILL_FSYNC_INTERVAL:
+            self.sync()                                             # ...and onto the disk every so often
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.synced = time.monotonic()
+
+    def is_open(self):
+        return self.file is not None
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        """Closes and deletes the spill file (its samples are not wanted)"""
+        self.close()
+        remove_spill(self.path)
+
+
+def read_spill(spillpath):
+    """Reads the spill file at spillpath. Returns (meta, (t, v, i)), with the samples
+    as arrays, or None if the file does not even hold its metadata. Stops at the
+    first frame that is incomplete (the app died while writing it)."""
+    with open(spillpath, 'rb') as file:
+        frame = read_frame(file)
+        if not frame or frame[0] != g.IPC_FRAME_DATA:
+            return None
+        meta = frame[1]
+        blocks = []
+        frame = read_frame(file)
+        while frame and frame[0] == g.IPC_FRAME_SAMPLES:
+            blocks.append(unpack_samples(frame[1])[1])
+            frame = read_frame(file)
+    if blocks:
+        cols = np.hstack(blocks)
+    else:
+        cols = np.zeros((len(g.R_DATA_COLUMNS), 0), dtype=g.R_DATA_DTYPE)
+    return (meta, (cols[0], cols[1], cols[2]))
+
+def promote_spill(path, spillpath, status, timestamp, data=None):
+    """Saves the samples in the spill file at spillpath as the raw data of their
+    rep in the session at path, sets the rep's status and end time, and deletes the
+    spill file. Nothing but the rep is written (see save_rep_raw_data). If data is
+    given, it must be the current contents of the session (it is saved to in place).
+    Returns (the session data after the save, (signal, background) raw data columns
+    of the rep), or None if the spill file's rep is not in the session anymore."""
+    spill = read_spill(spillpath)
+    if not data:
+        data = get_data_from_file(path)
+    rep = get_rep(data, tuple(spill[0][SPILL_IDS])) if spill else None
+    if not rep:                                                     # unreadable, or its rep was deleted
+        remove_spill(spillpath)
+        return None
+    (meta, (t, v, i)) = spill
+    rep = dict(rep)
+    rep[g.R_STATUS] = status
+    rep[g.R_TIMESTAMP_REP] = timestamp
+    raw = split_raw_data(meta[SPILL_STEPS], t, v, i)
+    data = save_rep_raw_data(path, tuple(meta[SPILL_IDS]), rep, raw[0], raw[1], data)
+    remove_spill(spillpath)                                         # only once the data is safely in the session
+    return (data, raw)
+
+def recover_spills(path):
+    """Promotes every spill file left behind in the session at path by runs that
+    never finished, marking their reps as errored. Returns the ids (run-id, rep-id)
+    of the reps that were recovered."""
+    recovered = []
+    data = None
+    for spillpath in find_spills(path):
+        spill = read_spill(spillpath)
+        if not spill:
+            remove_spill(spillpath)
+            continue
+        ended = time.strftime(g.DATETIME_STORAGE_STRFTIME, time.localtime(os.path.getmtime(spillpath))).lower()   # last written
+        promoted = promote_spill(path, spillpath, g.R_STATUS_ERROR, ended, data)
+        if promoted:
+            data = promoted[0]                                      # (the next one saves to it, without reading the session again)
+            recovered.append(tuple(spill[0][SPILL_IDS]))
+    return recovered
@@ -0,0 +1,390 @@
+# ov_sqlite.py
+#
+# SQLite storage engine for lab sessions (.ovdb files).
+#
+# A .ovdb file holds the same lab session as a .ovs file, split into one
+#   table per collection so that each save only touches the rows it changes:
+#
+#       session     top level keys of the session (name, date, ...)
+#       samples     one row per sample
+#       methods     one row per method
+#       runs        one row per run (without its replicates)
+#       reps        one row per replicate (without its raw data)
+#       calcs       one row per calculation
+#       raw         one row per rep per raw data key, holding the rep's
+#                   (time, volt, current) array as a float64 blob
+#
+#   Every row stores its dict as JSON in 'body'. Columns next to it (uid,
+#   sample, method, ...) mirror the keys that saves look rows up by so those
+#   lookups use an index. 'pos' keeps each collection in the order it would
+#   have in the .ovs file.
+#
+#   This module does not import Qt so it can be used by the process script.
+
+import sqlite3
+import json
+import numpy as np
+
+from global_scripts import ov_globals as g
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS session (pos INTEGER PRIMARY KEY, key TEXT UNIQUE, body TEXT);
+CREATE TABLE IF NOT EXISTS samples (uid TEXT PRIMARY KEY, pos INTEGER, body TEXT);
+CREATE TABLE IF NOT EXISTS methods (uid TEXT PRIMARY KEY, pos INTEGER, body TEXT);
+CREATE TABLE IF NOT EXISTS runs (uid TEXT PRIMARY KEY, pos INTEGER, sample TEXT, method TEXT, body TEXT);
+CREATE TABLE IF NOT EXISTS reps (run TEXT, uid TEXT, pos INTEGER, body TEXT, PRIMARY KEY (run, uid));
+CREATE TABLE IF NOT EXISTS calcs (uid TEXT PRIMARY KEY, pos INTEGER, sample TEXT, body TEXT);
+CREATE TABLE IF NOT EXISTS raw (run TEXT, rep TEXT, key TEXT, n INTEGER, body BLOB, PRIMARY KEY (run, rep, key));
+CREATE INDEX IF NOT EXISTS runs_by_sample ON runs (sample);
+CREATE INDEX IF NOT EXISTS runs_by_method ON runs (method);
+CREATE INDEX IF NOT EXISTS calcs_by_sample ON calcs (sample);
+'''
+
+COLLECTIONS = {g.S_SAMPLES: 'samples',     # session key -> table
+               g.S_METHODS: 'methods',
+               g.S_RUNS: 'runs',
+               g.S_PROCESSED: 'calcs'}
+
+RAW_KEYS = (g.R_DATA, g.R_BACKGROUND)       # rep keys that are stored in the raw table
+REP_SKIP_KEYS = RAW_KEYS + (g.R_RAW_INDEX,) # rep keys that never go in the reps table
+
+
+def is_sqlite_session(path):
+    return str(path).endswith(g.SQLITE_EXT)
+
+
+class SqliteSession():
+    def __init__(self, path):
+        self.path = path
+        self.con = sqlite3.connect(path)
+        self.con.executescript(SCHEMA)
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    #####################################
+    #                                   #
+    #   Row helpers                     #
+    #                                   #
+    #####################################
+
+    def next_pos(self, table, where='', args=()):
+        row = self.con.execute('SELECT MAX(pos) FROM '+table+' '+where, args).fetchone()
+        return 0 if row[0] is None else row[0]+1
+
+    def put_sample(self, sample, pos=None):
+        if pos is None: pos = self.next_pos('samples')
+        self.con.execute('INSERT OR REPLACE INTO samples VALUES (?,?,?)',
+                         (sample[g.R_UID_SELF], pos, json.dumps(sample)))
+
+    def put_method(self, method, pos=None):
+        if pos is None: pos = self.next_pos('methods')
+        self.con.execute('INSERT OR REPLACE INTO methods VALUES (?,?,?)',
+                         (method[g.M_UID_SELF], pos, json.dumps(method)))
+
+    def put_run(self, run, pos=None):
+        """Writes run (without its replicates) to the runs table"""
+        if pos is None: pos = self.next_pos('runs')
+        body = {key: run[key] for key in run if key != g.R_REPLICATES}
+        self.con.execute('INSERT OR REPLACE INTO runs VALUES (?,?,?,?,?)',
+                         (run[g.R_UID_SELF], pos, run.get(g.R_UID_SAMPLE), run.get(g.R_UID_METHOD), json.dumps(body)))
+
+    def put_rep(self, run_id, rep, pos=None):
+        """Writes rep (without its raw data) to the reps table"""
+        if pos is None: pos = self.next_pos('reps', 'WHERE run=?', (run_id,))
+        body = {key: rep[key] for key in rep if key not in REP_SKIP_KEYS}
+        self.con.execute('INSERT OR REPLACE INTO reps VALUES (?,?,?,?)',
+                         (run_id, rep[g.R_UID_SELF], pos, json.dumps(body)))
+
+    def put_calc(self, calc, pos=None):
+        if pos is None: pos = self.next_pos('calcs')
+        self.con.execute('INSERT OR REPLACE INTO calcs VALUES (?,?,?,?)',
+                         (calc[g.R_UID_SELF], pos, calc.get(g.C_SAMPLE_ID), json.dumps(calc)))
+
+    def update_body(self, table, obj, where, args):
+        self.con.execute('UPDATE '+table+' SET body=? '+where, (json.dumps(obj),)+tuple(args))
+
+    def get_body(self, table, where, args):
+        row = self.con.execute('SELECT body FROM '+table+' '+where, args).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_bodies(self, table, where='', args=()):
+        rows = self.con.execute('SELECT body FROM '+table+' '+where+' ORDER BY pos', args).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    #####################################
+    #                                   #
+    #   Lookups                         #
+    #                                   #
+    #   Same as get_rep,                #
+    #   get_run_from_file_data and      #
+    #   get_method_from_file_data in    #
+    #   ov_functions, but only read the #
+    #   rows they need.                 #
+    #                                   #
+    #####################################
+
+    def get_rep(self, ids):
+        return self.get_body('reps', 'WHERE run=? AND uid=?', tuple(ids)) or False
+
+    def get_run(self, run_id):
+        run = self.get_body('runs', 'WHERE uid=?', (run_id,))
+        if not run:
+            return False
+        run[g.R_REPLICATES] = self.get_bodies('reps', 'WHERE run=?', (run_id,))
+        return run
+
+    def get_method(self, method_id):
+        return self.get_body('methods', 'WHERE uid=?', (method_id,)) or False
+
+    def get_sample(self, sample_id):
+        return self.get_body('samples', 'WHERE uid=?', (sample_id,)) or False
+
+    #####################################
+    #                                   #
+    #   Raw data                        #
+    #                                   #
+    #####################################
+
+    def write_raw(self, ids, key, arr):
+        """Stores arr, a 2D float64 array with one row per column in
+        g.R_DATA_COLUMNS, as the raw data of key for the rep with ids. If arr has
+        no samples, deletes the stored raw data instead."""
+        if arr.shape[1]:
+            self.con.execute('INSERT OR REPLACE INTO raw VALUES (?,?,?,?,?)',
+                             (ids[0], ids[1], key, arr.shape[1], np.ascontiguousarray(arr, dtype=g.R_DATA_DTYPE).tobytes()))
+        else:
+            self.con.execute('DELETE FROM raw WHERE run=? AND rep=? AND key=?', (ids[0], ids[1], key))
+
+    def read_raw(self, ids, key):
+        """Returns the raw data of key for the rep with ids as a dict of columns,
+        or None if nothing is stored"""
+        row = self.con.execute('SELECT n, body FROM raw WHERE run=? AND rep=? AND key=?', (ids[0], ids[1], key)).fetchone()
+        if not row:
+            return None
+        arr = np.frombuffer(row[1], dtype=g.R_DATA_DTYPE).reshape((len(g.R_DATA_COLUMNS), row[0]))
+        return {col: arr[i] for i, col in enumerate(g.R_DATA_COLUMNS)}
+
+    def has_raw(self, ids, key=g.R_DATA):
+        row = self.con.execute('SELECT n FROM raw WHERE run=? AND rep=? AND key=?', (ids[0], ids[1], key)).fetchone()
+        return bool(row and row[0])
+
+    def prune_raw(self):
+        """Deletes raw data of reps that no longer exist"""
+        self.con.execute('DELETE FROM raw WHERE NOT EXISTS (SELECT 1 FROM reps WHERE reps.run=raw.run AND reps.uid=raw.rep)')
+
+    #####################################
+    #                                   #
+    #   Whole session                   #
+    #                                   #
+    #####################################
+
+    def read(self):
+        """Returns the whole session as a dict, without raw data (same layout
+        as reading a .ovs file)"""
+        data = {}
+        for (key, body) in self.con.execute('SELECT key, body FROM session ORDER BY pos'):
+            if key in COLLECTIONS:
+                data[key] = []
+            else:
+                data[key] = json.loads(body)
+        for key in COLLECTIONS:
+            if key in data:
+                data[key] = self.get_bodies(COLLECTIONS[key])
+        if g.S_RUNS in data:
+            reps = {}
+            for (run_id, body) in self.con.execute('SELECT run, body FROM reps ORDER BY run, pos'):
+                reps.setdefault(run_id, []).append(json.loads(body))
+            for run in data[g.S_RUNS]:
+                run[g.R_REPLICATES] = reps.get(run[g.R_UID_SELF], [])
+        return data
+
+    def write(self, data, raw):
+        """Replaces the whole session with data. Takes in raw, a dict with keys
+        (run-id, rep-id, raw data key) and 2D arrays as values, holding any raw
+        data to store. Reps not in raw keep their stored raw data."""
+        with self.con:
+            for table in ['session'] + list(COLLECTIONS.values()) + ['reps']:
+                self.con.execute('DELETE FROM '+table)
+            for pos, key in enumerate(data):
+                body = None if key in COLLECTIONS else json.dumps(data[key])
+                self.con.execute('INSERT INTO session VALUES (?,?,?)', (pos, key, body))
+            for pos, sample in enumerate(data.get(g.S_SAMPLES, [])):
+                self.put_sample(sample, pos)
+            for pos, method in enumerate(data.get(g.S_METHODS, [])):
+                self.put_method(method, pos)
+            for pos, calc in enumerate(data.get(g.S_PROCESSED, [])):
+                self.put_calc(calc, pos)
+            for pos, run in enumerate(data.get(g.S_RUNS, [])):
+                self.put_run(run, pos)
+                for rep_pos, rep in enumerate(run[g.R_REPLICATES]):
+                    self.put_rep(run[g.R_UID_SELF], rep, rep_pos)
+            for (run_id, rep_id, key) in raw:
+                self.write_raw((run_id, rep_id), key, raw[(run_id, rep_id, key)])
+            self.prune_raw()
+
+    #####################################
+    #                                   #
+    #   Saves                           #
+    #                                   #
+    #   One method per save type, each  #
+    #   with the same params as the     #
+    #   matching save_* function in     #
+    #   ov_functions. save() runs one   #
+    #   of them in a single transaction.#
+    #                                   #
+    #####################################
+
+    def save(self, saveType, params):
+        with self.con:                      # commits if the save succeeds, rolls back if it raises
+            self.apply_save(saveType, params)
+
+    def apply_save(self, saveType, params):
+        ops = {g.SAVE_TYPE_EDIT_SESH_NAME: self.save_edit_session_name,
+               g.SAVE_TYPE_SAMPLE_NEW: self.save_new_sample,
+               g.SAVE_TYPE_SAMPLE_EDIT: self.save_edit_sample,
+               g.SAVE_TYPE_SAMPLE_DELETE: self.save_delete_sample,
+               g.SAVE_TYPE_RUN_NEW: self.save_add_new_run,
+               g.SAVE_TYPE_REP_DELETE: self.save_delete_rep,
+               g.SAVE_TYPE_REP_MOD: self.save_modify_rep,
+               g.SAVE_TYPE_REP_WITH_DATA: self.save_rep_with_data,
+               g.SAVE_TYPE_RUN_MOD: self.save_modify_run,
+               g.SAVE_TYPE_RUN_MOVE: self.save_move_run,
+               g.SAVE_TYPE_METHOD_TO_SAMPLE: self.save_method_to_sample,
+               g.SAVE_TYPE_METHOD_MOD: self.save_modify_method,
+               g.SAVE_TYPE_CALC_NEW: self.save_new_calc,
+               g.SAVE_TYPE_CALC_EDIT: self.save_old_calc,
+               g.SAVE_TYPE_CALC_DELETE: self.save_delete_calc,
+               g.SAVE_TYPE_CALCS_ARCHIVE: self.save_change_calcs_archive,
+               g.SAVE_TYPE_ANALYSES_DEL: self.save_delete_analyses,
+               g.SAVE_TYPE_CALCS_FROM_METHOD: self.save_update_calcs_method_settings,
+               g.SAVE_TYPE_TRANSACTION: self.save_transaction}
+        if saveType in ops:
+            ops[saveType](params)
+
+    def save_transaction(self, params):
+        for (saveType, p) in params:        # all inside the one transaction opened by save()
+            self.apply_save(saveType, p)
+
+    def save_edit_session_name(self, params):
+        cur = self.con.execute('UPDATE session SET body=? WHERE key=?', (json.dumps(params[0]), g.S_NAME))
+        if not cur.rowcount:
+            self.con.execute('INSERT INTO session VALUES (?,?,?)', (self.next_pos('session'), g.S_NAME, json.dumps(params[0])))
+
+    def save_new_sample(self, params):
+        self.put_sample(params[0])
+
+    def save_edit_sample(self, params):
+        newSamp = params[0]
+        sample = self.get_sample(newSamp[g.R_UID_SELF])
+        if sample:
+            for key in sample.keys():       # only keys already on the sample are updated
+                sample[key] = newSamp[key]
+            self.update_body('samples', sample, 'WHERE uid=?', (sample[g.R_UID_SELF],))
+
+    def save_delete_sample(self, params):
+        s_id = params[0]
+        replist = self.con.execute('SELECT reps.run, reps.uid FROM reps JOIN runs ON runs.uid=reps.run WHERE runs.sample=?', (s_id,)).fetchall()
+        if replist:
+            self.save_delete_rep([replist])     # delete reps, runs, and -- if applicable -- methods
+        self.con.execute('DELETE FROM calcs WHERE sample=?', (s_id,))
+        self.con.execute('DELETE FROM samples WHERE uid=?', (s_id,))
+
+    def save_add_new_run(self, params):
+        newRun = params[0]
+        self.put_run(newRun)
+        for rep in newRun.get(g.R_REPLICATES, []):
+            self.put_rep(newRun[g.R_UID_SELF], rep)
+
+    def save_delete_rep(self, params):
+        tasks = params[0]
+        self.con.executemany('DELETE FROM reps WHERE run=? AND uid=?', [tuple(task) for task in tasks])
+        self.con.execute('DELETE FROM runs WHERE NOT EXISTS (SELECT 1 FROM reps WHERE reps.run=runs.uid)')          # delete empty runs
+        self.con.execute('DELETE FROM methods WHERE NOT EXISTS (SELECT 1 FROM runs WHERE runs.method=methods.uid)') # delete unreferenced methods
+        self.prune_raw()
+
+    def save_modify_rep(self, params):
+        tasks = params[0]
+        newReps = params[1]
+        for i, task in enumerate(tasks):
+            if self.get_rep(task):
+                body = {key: newReps[i][key] for key in newReps[i] if key not in REP_SKIP_KEYS}
+                self.update_body('reps', body, 'WHERE run=? AND uid=?', tuple(task))
+
+    def save_rep_with_data(self, params):
+        self.save_modify_rep([[params[0]], [params[1]]])   # its raw data is written in the same transaction (see save_rep_raw_data)
+
+    def save_modify_run(self, params):
+        run_id = params[0]
+        newRun = params[1]
+        row = self.con.execute('SELECT pos FROM runs WHERE uid=?', (run_id,)).fetchone()
+        if row:
+            newRun = dict(newRun)
+            newRun[g.R_UID_SELF] = run_id   # reps stay attached to the run by its uid
+            self.put_run(newRun, row[0])
+
+    def save_move_run(self, params):
+        tasks = params[0]
+        sample_id = params[1]
+        for run_id in tasks:
+            run = self.get_body('runs', 'WHERE uid=?', (run_id,))
+            if run:
+                run[g.R_UID_SAMPLE] = sample_id
+                self.con.execute('UPDATE runs SET sample=?, body=? WHERE uid=?', (sample_id, json.dumps(run), run_id))
+
+    def save_method_to_sample(self, params):
+        self.put_method(params[0])
+
+    def save_modify_method(self, params):
+        method_id = params[0]
+        newMethod = params[1]
+        row = self.con.execute('SELECT pos FROM methods WHERE uid=?', (method_id,)).fetchone()
+        if row:
+            self.con.execute('DELETE FROM methods WHERE uid=?', (method_id,))
+            self.put_method(newMethod, row[0])
+
+    def save_new_calc(self, params):
+        for newCalc in params[0]:
+            self.put_calc(newCalc)
+
+    def save_old_calc(self, params):
+        calc_id = params[0]
+        newCalc = params[1]
+        row = self.con.execute('SELECT pos FROM calcs WHERE uid=?', (calc_id,)).fetchone()
+        if row:
+            self.con.execute('DELETE FROM calcs WHERE uid=?', (calc_id,))
+            self.put_calc(newCalc, row[0])
+
+    def save_delete_calc(self, params):
+        self.con.executemany('DELETE FROM calcs WHERE uid=?', [(calc_id,) for calc_id in params[0]])
+
+    def save_change_calcs_archive(self, params):
+        archive_status = params[0]
+        for calc_id in params[1]:
+            calc = self.get_body('calcs', 'WHERE uid=?', (calc_id,))
+            if calc:
+                calc[g.C_ARCHIVED] = archive_status
+                self.update_body('calcs', calc, 'WHERE uid=?', (calc_id,))
+
+    def save_delete_analyses(self, params):
+        for task in params[0]:
+            rep = self.get_rep(task)
+            if rep:
+                rep[g.R_ANALYSIS] = {}
+                self.update_body('reps', rep, 'WHERE run=? AND uid=?', tuple(task))
+
+    def save_update_calcs_method_settings(self, params):
+        unit, dl, conf, calcs = params
+        for calc_id in calcs:
+            calc = self.get_body('calcs', 'WHERE uid=?', (calc_id,))
+            if calc and not calc[g.C_ARCHIVED]:
+                calc[g.M_UNIT] = unit
+                calc[g.M_DETECTION_LIMIT] = dl
+                calc[g.M_CONF] = conf
+                self.update_body('calcs', calc, 'WHERE uid=?', (calc_id,))
@@ -0,0 +1,67 @@
+#bench_startup.py
+#
+# Measures how long a cold process.py takes to start, to check that the worker and
+#   one-off processes don't pay for importing Qt. Run it from the top folder of the
+#   project (the same folder OpenVoltam.py is run from):
+#
+#       python processes/bench_startup.py [path to a .ovs file] [number of repeats]
+#
+#   If no session is given, an empty one is made in a temporary folder. It prints the
+#   median time, in a fresh interpreter each time, of:
+#
+#       1. importing ov_functions   the module process.py imported before ov_core
+#                                   existed (pulls in PyQt6)
+#       2. importing ov_core        the module process.py imports now
+#       3. 'process.py read'        a full cold read of the session, start to exit
+#
+#   The difference between 1 and 2 is what each process start saves.
+
+import sys
+import subprocess
+import tempfile
+from os import getcwd
+from os.path import join
+from statistics import median
+from time import perf_counter
+
+sys.path.append(getcwd()) # current working directory must be appended to path for custom ("ov_") imports
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_core import write_data_to_file
+
+def time_cmd(args, n):
+    """Runs the command args n times, returns the median wall time in [s] and
+    whether every run succeeded"""
+    times = []
+    ok = True
+    for i in range(n):
+        t0 = perf_counter()
+        resp = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(perf_counter() - t0)
+        ok = ok and resp.returncode == 0
+    return median(times), ok
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    if not path:
+        path = join(tempfile.mkdtemp(), 'bench'+g.SAMPLE_EXT)
+        data = {g.S_NAME: 'bench'}
+        for key in g.S_BLANK_ARRAYS:
+            data[key] = []
+        write_data_to_file(path, data)
+
+    benches = [('import ov_functions', [sys.executable, '-c', 'import global_scripts.ov_functions']),
+               ('import ov_core', [sys.executable, '-c', 'import global_scripts.ov_core']),
+               ('process.py read', [sys.executable, g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_READ, path])]
+
+    print('median of '+str(n)+' cold starts:')
+    for (name, args) in benches:
+        t, ok = time_cmd(args, n)
+        msg = '    '+name.ljust(22)+str(round(t*g.S2MS, 1))+' ms'
+        if not ok:
+            msg = msg + '   (FAILED, check that all dependencies are installed)'
+        print(msg)
+
+if __name__ == '__main__':
+    main()
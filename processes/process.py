@@ -3,25 +3,35 @@
 
 
 import sys
+import os
 from os import getcwd
+from os import stat
 from os.path import exists
 
 sys.path.append(getcwd()) # current working directory must be appended to path for custom ("ov_") imports
 
 from global_scripts import ov_globals as g
-from global_scripts.ov_functions import (get_data_from_file,
-                                           write_data_to_file,
-                                           remove_data_from_layout,
-                                           get_method_from_file_data,
-                                           get_run_from_file_data,
-                                           get_rep,
-                                           get_v_max_abs)
+from global_scripts.ov_core import (get_data_from_file,
+                                    write_data_to_file,
+                                    remove_data_from_layout,
+                                    get_rep_data,
+                                    has_raw_data,
+                                    save_data_to_file,
+                                    convert_session,
+                                    is_sqlite_session,
+                                    diff_sessions,
+                                    get_step_keep_every,
+                                    get_step_sample_freq,
+                                    get_v_max_abs)
+from global_scripts.ov_ipc import read_frame, write_frame, write_raw_frame, pack_samples
+from global_scripts.ov_spill import recover_spills, promote_spill
 
 from ast import literal_eval
-from csv import DictWriter
+from copy import deepcopy
+from csv import writer as csv_writer
 from re import sub
-import serial.tools.list_ports
-from potentiostat import Potentiostat
+from time import perf_counter
+from itertools import accumulate
 
 
 #################################
@@ -30,11 +40,20 @@ from potentiostat import Potentiostat
 #                               #
 #################################
 
+WORKER_MODE = False     # True when running as a long-lived worker (see WORKER below)
+FRAMES_OUT = None       # binary stream the worker (or a run) writes its frames to
+
 def write_data(s):      # Write data to data channel 
+    if FRAMES_OUT:
+        write_frame(FRAMES_OUT, g.IPC_FRAME_DATA, s)
+        return
     sys.stdout.write(str(s)+'\n')
     sys.stdout.flush()
 
 def write_error(s):     # Write error to error channel
+    if WORKER_MODE:                                         # a worker answers with frames on stdout only,
+        write_frame(FRAMES_OUT, g.IPC_FRAME_ERROR, s)       #   so errors stay in order with the rest of the answer
+        return
     sys.stderr.write(str(s)+'\n')
     sys.stderr.flush()
     
@@ -45,10 +64,8 @@ def write_error(s):     # Write error to error channel
 #                               #
 #################################
 #
-def overwrite():
-    path = sys.argv[2]                  # get path of file to write from
-    data = literal_eval(sys.argv[3])    # get data dict
-    write_data(str(path))
+def overwrite(path, data):             # takes path of file to write to and data dict
+    write_data(path)
     write_data_to_file(path, data)
 
 
@@ -58,73 +75,52 @@ def overwrite():
 #                               #
 #################################
 #
-def export():
-    readpath = sys.argv[2]              # get path of file to read from
-    writepath = sys.argv[3]             # get path of folder to write to
-    tasks = literal_eval(sys.argv[4])   # cast sys.argv[4] from string to list of tuples
-    data = get_data_from_file(readpath) # read file (returns dict)
+def export(readpath, writepath, tasks):     # takes path of file to read from, path of folder to write to, and list of (runID, repID)
     for task in tasks:
         try:
             run_id = task[0]
             rep_id = task[1]
-            run = next(filter(lambda x: x[g.R_UID_SELF] == run_id, data[g.S_RUNS]), None)
-            rep = next(filter(lambda x: x[g.R_UID_SELF] == rep_id, run[g.R_REPLICATES]), None)
-            repData = rep[g.R_DATA]
-            repBack = rep[g.R_BACKGROUND]
+            (repData, repBack) = get_rep_data(readpath, (run_id, rep_id))   # read raw data columns from sidecar
 
             samplename=readpath.split('/')[-1]              # get filename from path 
             groups = samplename.split('.')                  # begin removing the extension (split at all periods)
             samplename = '.'.join(groups[:len(groups)-1])   # finish removing the extension (rejoin all with periods except for last)
 
-            if repData:                
+            if has_raw_data(repData):
                 filename = samplename+'_'+run_id+'_'+rep_id+'_SIGNAL'      # add on the run and rep IDs
                 path = writepath+'/'+filename                         # append filename to path
-                
-
-                suffix = ''
-                i = 1
-                while exists(path+suffix+'.csv'):          # while the file already exists
-                    suffix = '_COPY'+str(i)                     # tack on a suffix
-                    i = i+1                                     # and increment the counter until we find a filename that is not taken!
-                path = path+suffix+'.csv'                       # generate that novel filename
-
-                keys = list(repData[0].keys())
-                with open(path, 'w', encoding='UTF8', newline='') as f:
-                    writer = DictWriter(f, fieldnames=keys) # Tell the writer we are writing from a dictionary with 'keys' as headers
-                    writer.writeheader()                        # Write the header row
-                    writer.writerows(repData)                   # Write  the data'''
-
-                write_data(str(task))
+                write_csv(get_free_csv_path(path), repData)
+                write_data(task)
             else:
-                write_error(str(task))
+                write_error(task)
 
-            if repBack:
+            if has_raw_data(repBack):
                 filename = samplename+'_'+run_id+'_'+rep_id+'_BACKGROUND'  # add on the run and rep IDs
                 path = writepath+'/'+filename
-
-                suffix = ''
-                i = 1
-                while exists(path+suffix+'.csv'):          # while the file already exists
-                    suffix = '_COPY'+str(i)                     # tack on a suffix
-                    i = i+1                                     # and increment the counter until we find a filename that is not taken!
-                path = path+suffix+'.csv'                       # generate that novel filename
-
-                keys = list(repBack[0].keys())
-                with open(path, 'w', encoding='UTF8', newline='') as f:
-                    writer = DictWriter(f, fieldnames=keys) # Tell the writer we are writing from a dictionary with 'keys' as headers
-                    writer.writeheader()                        # Write the header row
-                    writer.writerows(repBack)                   # Write  the data'''
-                
+                write_csv(get_free_csv_path(path), repBack)
                 
         except Exception as e:          # If a specific export task generates an error
             write_error(str(e))
-            write_error(str(task))
+            write_error(task)
 
+def get_free_csv_path(path):
+    suffix = ''
+    i = 1
+    while exists(path+suffix+'.csv'):          # while the file already exists
+        suffix = '_COPY'+str(i)                     # tack on a suffix
+        i = i+1                                     # and increment the counter until we find a filename that is not taken!
+    return path+suffix+'.csv'                       # generate that novel filename
 
-    
-    
+def write_csv(path, cols):
+    keys = list(g.R_DATA_COLUMNS)
+    with open(path, 'w', encoding='UTF8', newline='') as f:
+        writer = csv_writer(f)
+        writer.writerow(keys)                                   # Write the header row
+        writer.writerows(zip(*[cols[key].tolist() for key in keys]))  # Write the data, one row per sample
 
 
+    
+    
 
 
 #################################
@@ -134,7 +130,8 @@ def export():
 #################################
 #
 # This is the script that can be called to write asynchronously to the data file.
-#   There are several types of saves supported. Arguments are passed through commande line sys.argv:
+#   There are several types of saves supported. Arguments are passed through commande line sys.argv (or in a request
+#   frame when running as a worker):
 #
 #       1. path     str.                path to find file for reading/writing
 #       2. saveType str.                defines which type of save is requested 
@@ -146,347 +143,122 @@ def export():
 #       - new run       params = [dict of run params]                       Saves a new run 
 #       - delete rep    params = [(runID, repID),(runID,repID),...]         Deletes all listed reps. Also deletes runs and methods as needed
 #       - rep no data   params = [(runID,repID), dict of rep params]        Modifies existing rep parameters but maintains raw data
-#       - rep w data    params = [(runID,repID), dict of rep params]        Replaces existing rep parameters (including raw data)
+#       - rep w data    params = [(runID,repID), dict of rep params]        Replaces existing rep parameters, including where its raw
+#                                                                           data is (the data is written first, see save_rep_raw_data)
 #       - run modified  params = [runID, dict of run params]                Modifies existing run parameters but maintains replicates
 #       - new calc      params = [dict of calc params]                      Saves a new calculation  
+#       - transaction   params = [[saveType, params], [saveType, params],...] Applies each listed save in order, then
+#                                                                           writes once. If any of them fails, none are saved
 #   For each type of save, when the save completes, it sends a writes the data dictionary (not including raw data)
-#   back as data. 
-
-def save_edit_session_name(data, params):
-    name = params[0]
-    data[g.S_NAME] = name
-    return data
-
-def save_new_sample(data, params):   # Takes the sample parameters
-    newData = params[0]                 # passed in params[0]
-    data[g.S_SAMPLES].append(newData)
-    return data
-
-def save_edit_sample(data, params):
-    newSamp = params[0]
-    s_id = newSamp[g.R_UID_SELF]
-    found = False
-    for sample in data[g.S_SAMPLES]:        # Find the relevant sample from file
-        if sample[g.R_UID_SELF] == s_id:
-            found = True
-            break
-    if found:                               # If found
-        for key in sample.keys():           # Loop thru sample keys
-            sample[key] = newSamp[key]
-    return data
-
-def save_delete_sample(data, params):
-    """Takes in the id of a sample to delete.
-    Algorithm:
-    1. Finds a list of all runs linked to that sample
-    2. Finds a list of all calcs linked to that sample
-    3. Deletes all runs from #1
-    4. Deletes all calcs from #2
-    5. Deletes sample"""
-    s_id = params[0]
-    replist = []
-    calclist = []
-
-    for run in data[g.S_RUNS]:                  # get list of all reps of runs from this sample
-        if run[g.R_UID_SAMPLE] == s_id:
-            for rep in run[g.R_REPLICATES]:
-                replist.append((run[g.R_UID_SELF], rep[g.R_UID_SELF]))
-
-    for calc in data[g.S_PROCESSED]:            # get list of calculations from this sample
-        if calc[g.C_SAMPLE_ID] == s_id:
-            calclist.append(calc[g.R_UID_SELF])
-
-    if replist:
-        data = save_delete_rep(data, [replist])     # delete reps, runs, and -- if applicable -- methods                  
-        
-    if calclist:
-        data = save_delete_calc(data, [calclist])   # delete calcs
-
-    
-    found = False                                   # remove sample with s_id as ID from data
-    for i, s in enumerate(data[g.S_SAMPLES]):
-        if s[g.R_UID_SELF] == s_id:
-            found = True
-            break
-    if found:
-        data[g.S_SAMPLES].pop(i)
-
-    return data
-
-    
-
-    
-    
-
-
-def save_add_new_run(data, params):
-    newRun = params[0]               
-    data[g.S_RUNS].append(newRun)
-    return data
-
-def save_delete_rep(data, params):
-    """ Args:
-        params[0] -- list of tuples w format (runID, repID)
-
-        Function:
-        Deletes all of the replicates indicated in the argument list.
-        Then checks whether there are any runs whose reps have all been deleted.
-            if so, deletes them too.
-        Then checks whether there are any methods which are no longer referenced
-            by any runs in the sample file. If so, deletes these methods too.
-
-        Returns: data"""
-    tasks = params[0]
-
-    #Delete the requested replicates
-    while tasks:                                            
-        task = tasks[0]
-        run_id = task[0]
-        rep_id = task[1]
-
-        found = False
-        index = False
-        for run in data[g.S_RUNS]:                  # First, find the replicate 
-            if run[g.R_UID_SELF] == run_id:
-                for i, rep in enumerate(run[g.R_REPLICATES]):
-                    if rep[g.R_UID_SELF] == rep_id:
-                        found = True
-                        index = i
-                        break
-                if found:
-                    break
-
-        if found:                                   # If it was found, remove it!
-            run[g.R_REPLICATES].pop(index)
-        tasks.pop(0)
-
-    # Delete empty runs
-    some_runs_empty = True
-    while some_runs_empty:                          # Now that we've deleted all reps
-        found = False                               # Check whether there are any runs where al;
-        for i,run in enumerate(data[g.S_RUNS]):     #   reps have been deleted
-            if not run[g.R_REPLICATES]:
-                found = True
-                break
+#   back as data. When running as a worker that already has the session in memory (which is then exactly what
+#   the GUI last got from it), it sends back only a delta of what the save changed instead (see diff_sessions).
+#
+#   The save operations themselves live in ov_core (see apply_save) so that the session journal can be
+#   replayed by anything that reads a session. Saves are not written to the session file directly: each one
+#   is appended to the session's journal, which is folded into the session file once it gets big or old.
+#   For .ovdb sessions (see ov_sqlite), each save is instead a single SQLite transaction.
 
-        if found:                                   # Delete these empty runs as well!
-            data[g.S_RUNS].pop(i)                           
-        else:
-            some_runs_empty = False
-
-    # Delete unreferenced methods
-    methods_to_keep = []                            # Get list of uids of methods to keep
-    for run in data[g.S_RUNS]:
-        if not run[g.R_UID_METHOD] in methods_to_keep:
-            methods_to_keep.append(run[g.R_UID_METHOD])
-            
-    methods_floating = True                         
-    while methods_floating:
-        found = False                               # If there is a floating method
-        for i,method in enumerate(data[g.S_METHODS]):
-            if not method[g.M_UID_SELF] in methods_to_keep:
-                found = True
-                break
-        if found:
-            data[g.S_METHODS].pop(i)                # delete it!
-        else:
-            methods_floating = False
-          
-    return data
-
-def save_modify_rep(data, params):
-    tasks = params[0]       # a list of tuples, each with the form (runID, repID)
-    newReps = params[1]     # a list of the same length as tasks, with all rep params to save
-    for i, task in enumerate(tasks):
-        rep = get_rep(data, task)
-        if rep:
-            keys = list(rep.keys())     # get a list of all keys in saved rep
-            keys.remove(g.R_DATA)       #   except for the data key
-            keys.remove(g.R_BACKGROUND)
-            for key in keys:            # remove all keys and values from rep except data
-                rep.pop(key, None)      
-            for key in newReps[i]:      # add new keys and values to rep (does not include raw data)
-                rep[key] = newReps[i][key]
-    return data
-
-def save_modify_run(data, params):
-    run_id = params[0]
-    newRun = params[1]
-
-    run = get_run_from_file_data(data, run_id)
-    
-    if run:
-        prevReps = run[g.R_REPLICATES]  # store previous replicates (includes raw data)
-        keys = list(run.keys())         # get a list of all keys in saved run
-        for key in keys:                # remove all keys and values from run
-            run.pop(key, None)      
-        for key in newRun:              # add new keys and values to run (does not include replicates)
-            run[key] = newRun[key]
-        run[g.R_REPLICATES] = prevReps  # add the old replicates (with raw data) back in   
-    
-    return data
-
-def save_move_run(data, params):
-    tasks = params[0]
-    sample_id = params[1]
-    for run in data[g.S_RUNS]:              # Loop thru all runs
-        if run[g.R_UID_SELF] in tasks:      # If this run is on the list of runs to move
-            run[g.R_UID_SAMPLE] = sample_id # Reset sample_id to destination sample_id
-    return data
-
-def save_method_to_sample(data, params):     # append method to sample file
-    newMethod = params[0]               
-    data[g.S_METHODS].append(newMethod)
-    return data
-
-def save_modify_method(data, params):        # modify the method in a sample file
-    method_id = params[0]
-    newMethod = params[1]
-    
-    method = get_method_from_file_data(data, method_id)
-
-    if method:
-        keys = list(method.keys())
-        for key in keys:
-            method.pop(key, None)
-        for key in newMethod:
-            method[key] = newMethod[key]
-    return data
-
-def save_new_calc(data, params):   
-    newCalcs = params[0]
-    for newCalc in newCalcs:
-        data[g.S_PROCESSED].append(newCalc)
-    return data
-
-def save_old_calc(data, params):
-    calc_id = params[0]
-    newCalc = params[1]
-    for calc in data[g.S_PROCESSED]:
-        if calc[g.R_UID_SELF] == calc_id:
-            keys = list(calc.keys())
-            for key in keys:
-                calc.pop(key, None)
-            for key in newCalc:
-                calc[key] = newCalc[key]
-            break
-    return data
-
-def save_delete_calc(data, params):
-    tasks = params[0]
-    while tasks:
-        calc_id = tasks[0]
-        found = False
-        index = None
-        for i, calc in enumerate(data[g.S_PROCESSED]):
-            if calc[g.R_UID_SELF] == calc_id:
-                found = True
-                index = i
-                break
-        if found:
-            data[g.S_PROCESSED].pop(index)
-        tasks.pop(0)
-    return data
-
-def save_change_calcs_archive(data, params):
-    archive_status = params[0]
-    calcs = params[1]
-    for calc in data[g.S_PROCESSED]:
-        if calc[g.R_UID_SELF] in calcs:
-            calc[g.C_ARCHIVED] = archive_status
-    return data
-
-def save_delete_analyses(data, params):
-    tasks = params[0]
-    for task in tasks:
-        run_id, rep_id = task
-        for run in data[g.S_RUNS]:
-            rep_wiped = False
-            for rep in run[g.R_REPLICATES]:
-                if run[g.R_UID_SELF] == run_id and rep[g.R_UID_SELF] == rep_id:
-                    rep[g.R_ANALYSIS] = {}
-                    rep_wiped = True
-                    break
-            if rep_wiped: break
-    return data
-
-def save_update_calcs_method_settings(data, params):
-    unit, dl, conf, calcs = params
-    for calc in data[g.S_PROCESSED]:
-        if calc[g.R_UID_SELF] in calcs:
-            if not calc[g.C_ARCHIVED]: 
-                calc[g.M_UNIT] = unit
-                calc[g.M_DETECTION_LIMIT] = dl
-                calc[g.M_CONF] = conf
-    return data
-            
-                    
-
-def save():    
+def save(path, saveType, params):    
     try:
-        path = sys.argv[2]                  # get path of file to read from
-        saveType = sys.argv[3]              # get save type
-        params = literal_eval(sys.argv[4])  # cast sys.argv[4] from string to list
-        data = get_data_from_file(path)     # read file from path (returns dict)
-
-        if saveType == g.SAVE_TYPE_EDIT_SESH_NAME:
-            data=save_edit_session_name(data, params)
-        elif saveType == g.SAVE_TYPE_SAMPLE_NEW:
-            data=save_new_sample(data, params)
-        elif saveType == g.SAVE_TYPE_SAMPLE_EDIT:
-            data=save_edit_sample(data, params)
-        elif saveType == g.SAVE_TYPE_SAMPLE_DELETE:
-            data=save_delete_sample(data, params)
-        elif saveType == g.SAVE_TYPE_RUN_NEW:
-            data=save_add_new_run(data, params)
-        elif saveType == g.SAVE_TYPE_REP_DELETE:
-            data=save_delete_rep(data, params)
-        elif saveType == g.SAVE_TYPE_REP_MOD:
-            data=save_modify_rep(data, params)
-        elif saveType == g.SAVE_TYPE_RUN_MOD:
-            data=save_modify_run(data, params)
-        elif saveType == g.SAVE_TYPE_RUN_MOVE:
-            data=save_move_run(data, params)
-        elif saveType == g.SAVE_TYPE_METHOD_TO_SAMPLE:
-            data=save_method_to_sample(data, params)
-        elif saveType == g.SAVE_TYPE_METHOD_MOD:
-            data=save_modify_method(data, params)
-        elif saveType == g.SAVE_TYPE_CALC_NEW:
-            data=save_new_calc(data, params)
-        elif saveType == g.SAVE_TYPE_CALC_EDIT:
-            data=save_old_calc(data, params)
-        elif saveType == g.SAVE_TYPE_CALC_DELETE:
-            data=save_delete_calc(data, params)
-        elif saveType == g.SAVE_TYPE_CALCS_ARCHIVE:
-            data=save_change_calcs_archive(data,params)
-        elif saveType == g.SAVE_TYPE_ANALYSES_DEL:
-            data=save_delete_analyses(data, params)
-        elif saveType == g.SAVE_TYPE_CALCS_FROM_METHOD:
-            data=save_update_calcs_method_settings(data, params)
-        
-        write_data_to_file(path, data)
+        kept = get_kept_session(path)
+        before = deepcopy(kept) if kept else None   # the save changes the kept copy in place
+        data = save_data_to_file(path, saveType, params, kept)   # apply the save (returns dict)
         data = remove_data_from_layout(data) 
-        write_data(str(data))               #   Write the data (with raw data stripped) to data channel
+        keep_session(path, data)
+        if before:
+            write_data(diff_sessions(before, data)) #   Write only what changed to data channel
+        else:
+            write_data(data)                #   Write the data (with raw data stripped) to data channel
         
     except Exception as e:                  # If process generates an error:
+        SESSIONS.pop(path, None)            #   the kept copy may be half-saved, so drop it
         write_error(str(e))                 #   Write that error to error channel
 
 
+#################################
+#                               #
+#       CONVERT                 #
+#                               #
+#################################
+#
+# Copies a lab session, with all of its raw data, between the .ovs and .ovdb formats.
+#   The format of each path is picked by its extension.
+#
+#       1. src      str.    path of the session to copy
+#       2. dst      str.    path to write the copy to
+#
+def convert(src, dst):
+    if convert_session(src, dst):
+        write_data(dst)
+    else:
+        raise ValueError('Could not convert the lab session, check to make sure file is not corrupted.')
+
+#################################
+#                               #
+#       RECOVER                 #
+#                               #
+#################################
+#
+# Saves the samples of runs that were interrupted (the app crashed or was killed mid-run)
+#   from the spill files they left behind (see ov_spill) into the session. Writes the
+#   ids (runID, repID) of each rep recovered as data.
+#
+#       1. path     str.    path of the session
+#
+def recover(path):
+    for ids in recover_spills(path):
+        write_data(ids)
+
+#################################
+#                               #
+#       PROMOTE                 #
+#                               #
+#################################
+#
+# Saves a rep that just finished running from its spill file (see promote_spill) into the
+#   session, then (if g.R_AUTO_ANALYZE and the rep completed) guesses its analysis and saves
+#   it as the rep's provisional analysis (see ov_analysis). The run viewer sends these to the
+#   main window's worker, so every write to a session comes from the one process. Writes the
+#   session data (or, as a worker, the delta of what changed) as data, like save.
+#
+#       1. path         str.    path of the session
+#       2. ids          list.   (runID, repID) of the rep
+#       3. spillpath    str.    path of the rep's spill file
+#       4. status       str.    status of the rep
+#       5. timestamp    str.    time the rep ended
+#
+def promote(path, ids, spillpath, status, timestamp):
+    try:
+        kept = get_kept_session(path)
+        before = deepcopy(kept) if kept else None   # the save changes the kept copy in place
+        promoted = promote_spill(path, spillpath, status, timestamp, kept)
+        if not promoted:
+            raise ValueError('Replicate '+', '.join(ids)+' is not in the session anymore.')
+        (data, raw) = promoted
+        if g.R_AUTO_ANALYZE and status == g.R_STATUS_COMPLETE:
+            from global_scripts.ov_analysis import save_provisional_analysis    # (scipy, only paid for by the worker)
+            data = save_provisional_analysis(path, ids, raw, data)
+        data = remove_data_from_layout(data)
+        keep_session(path, data)
+        if before:
+            write_data(diff_sessions(before, data))
+        else:
+            write_data(data)
+    except Exception as e:
+        SESSIONS.pop(path, None)            # the kept copy may be half-saved, so drop it
+        write_error(str(e))
+
 #################################
 #                               #
 #       READ/DATA LOAD          #
 #                               #
 #################################
 #
-def read():
-    path = sys.argv[2]                  #   Get path of file to read from
-    data = get_data_from_file(path)     #   Read file from path (returns dict)
+def read(path):                         #   Takes path of file to read from
+    data = get_kept_session(path) or get_data_from_file(path)   #   Read file from path (returns dict, raw data stays in the sidecar)
     if data:
-        for run in data[g.S_RUNS]:              #   For each run in data dict
-            for rep in run[g.R_REPLICATES]:     #   And for each rep of the run
-                rep.pop(g.R_DATA, None)         #   Remove the raw signal data
-                rep.pop(g.R_BACKGROUND, None)   #   Remove the background data
-        write_data(str(data))                   #   Write the data (with raw data stripped) to data channel
+        keep_session(path, data)
+        write_data(data)                #   Write the data (metadata only) to data channel
     else:
         raise ValueError('Could not read the file, check to make sure file is not corrupted.')
 
@@ -498,43 +270,70 @@ def read():
 #
 # This is the script that runs the method directly on the potentiostat
 #
-# Args:
-#   - sys.argv[2] - dt             int or float    the pstat will report a datapoint every dt miliseconds
-#   - sys.argv[3] - i_max          string          this string is specific to the device and sets the current range
-#   - sys.argv[4] - steps          list of steps   a list of steps to send to the device (may include runs and relay setting)
-#   - sys.argv[5] - port           string          name of port to try first to find device
-#   - sys.argv[6] - relays_enabled boolean         T/f whether relays are enabled. If False, all relay toggle steps are ignored
+# A batch of runs (every rep the run viewer was asked to run) is run by one run session: the
+#   run viewer starts this script once, as g.PROC_TYPE_RUN_SESSION, and sends it one request
+#   per rep over stdin for as long as the batch lasts. The session connects to the device
+#   on its first run and keeps the connection, along with what it learned about the device
+#   (its voltage ranges) and the settings last sent to it (see DEVICE), so later reps don't
+#   have to scan the serial ports, reconnect and set everything up again. If a run fails,
+#   the connection is dropped and the next run connects from scratch.
+#
+# Args (each request is a g.IPC_FRAME_REQUEST frame holding [g.PROC_TYPE_RUN, *args]; a one-off
+#   g.PROC_TYPE_RUN process takes the same args, as strings, in sys.argv[2:]):
+#   - dt             int or float    the pstat will report dt datapoints per second (steps with their
+#                                    own g.M_STEP_SAMPLE_FREQ are run at that rate instead)
+#   - i_max          string          this string is specific to the device and sets the current range
+#   - steps          list of steps   a list of steps to send to the device (may include runs and relay setting)
+#   - port           string          name of port to try first to find device
+#   - relays_enabled boolean         T/f whether relays are enabled. If False, all relay toggle steps are ignored
+#   - gpio_pins      list of str     names of the device's GPIO pins, in relay order
 #
 # Communication:
 #   As a script that is designed to be called asynchrounously, it is designed to communicate
 #       back with the program that called it. It does so through by using the sys.stdout()
-#       and sys.stderr() streams.
+#       stream.
 #
-#   Regular communication is passed through sys.stdout() and
-#       messages are given a prefix to indicate which type of communication is being shared
-#       The types of messages shared on sys.stdout() are:
+#   Regular communication is passed through sys.stdout() as frames (see ov_ipc).
+#       Messages go in g.IPC_FRAME_DATA frames and are given a prefix to indicate which
+#       type of communication is being shared. The types of messages are:
 #           - Status messages: These are primarily used for debugging
 #           - Port: indicates which port holds the pstat
 #           - Relay stat: indicates the state of a specific relay which has just been set
-#           - Data: this is the data from the pstat!
+#       The data from the pstat is buffered and sent in binary g.IPC_FRAME_SAMPLES frames,
+#           each holding every sample taken from one step over (at most) the last
+#           g.R_FRAME_INTERVAL seconds, along with the index of that step. Times are counted
+#           from the start of the run: each test's times are offset by how long every test
+#           before it should have taken.
+#       Steps that collect no data (g.M_DATA_NONE, eg. conditioning or deposition) don't send
+#           every sample, since the GUI would throw them away: only every g.R_PREVIEW_EVERY_N-th
+#           sample and the step's last sample are sent, for the live plot (see get_step_keep_every).
 #
-#   Error messages (that shut down run.py) are passed through the sys.stderr() channel. This
-#       is accomplished by raising a ValueError() with a custom error message that the
-#       calling program can receive, interpret, and act on.
+#   Errors that end a run are raised as a ValueError() with a custom error message that the
+#       calling program can receive, interpret, and act on. A run session sends the message
+#       in a g.IPC_FRAME_ERROR frame. Either way, each run ends with a g.IPC_FRAME_FINISHED
+#       frame (a one-off run process just exits, with any error on sys.stderr()).
 #
 # How the run works:
-#   This script is designed to be run by another script as an asynchronous process.
-#   It takes in system command line arguments through sys.argv.
-#   It first tries to find a potentiostat at port.
+#   If the session isn't connected to a device yet, it first tries to find a potentiostat at port.
 #   If it cannot, it looks thru all other available ports and uses the first potentiostat
-#       that it encounters.
+#       that it encounters. Ports are found and connected to by the device backend (see
+#       get_device_backend): the Rodeostat on a serial port, or a simulated potentiostat.
 #   Once a pstat has been connected with, various parameters are set (eg. dt, i_max, v_max
-#       [v_max is calculated from steps], etc.) on the device.
-#   Then the script loops thru steps. For each step, the step is run on the potentiostat.
-#       the pstat returns data every dt miliseconds. This data is immediately returned
+#       [v_max is calculated from steps], etc.) on the device, unless it is already set to them.
+#   Then the steps are compiled into device tests (see compile_steps): if the firmware can run
+#       multi-step tests, consecutive constant voltage steps are run as one test, with no gap
+#       between them. Otherwise (and for ramps and relay steps), each step is a test of its own.
+#   Then the script loops thru the tests. For each, the test is run on the potentiostat.
+#       the pstat returns data every dt miliseconds. This data is returned in batches
 #       to the calling program through sys.stdout(). This script just passes the data
 #       along and assumes that the calling program will handle it.
-#   When the steps have all been run, this program finishes.
+#   When the steps have all been run, the run is finished and the session waits for the next one.
+#
+# Replays:
+#   A run session also takes g.PROC_TYPE_REPLAY requests, [g.PROC_TYPE_REPLAY, path, ids, speed, *args]
+#       with the args of a run. The steps are run just like above, but on a device that plays back
+#       the samples the rep with ids recorded (see replay), so the GUI gets them the way it would
+#       from a live run.
 #
 # Limitations:
 #   1. At this time, this script can only run the following types of steps:
@@ -548,23 +347,42 @@ def read():
 #       (see placeholder in the code below.) Right now, relays aren't actually set.
 #       this also requires a firmware update of the Rodeostat...
 
-def write_run_status(s):
-    s = g.R_STATUS_PREFIX + str(s)
+TEST = []                       # (index in the run's steps, step) of each step the device test being run runs
+TEST_ENDS = []                  # time into that test at which each of those steps ends [s]
+TEST_STEP = 0                   # which of those steps is being run
+RUN_TIME = 0                    # time into the run at which that test started [s]
+RUN_STEP = 0                    # index (in the run's steps) of the step being run
+KEEP_EVERY = 1                  # send every Nth sample of the step being run (0 sends none)
+SEEN = 0                        # samples the device has reported for the step being run
+LAST_SAMPLE = None              # last sample of the step being run, if it wasn't kept
+DEVICE = {}                     # the connected device and what is known about it, kept between the runs of a session
+SAMPLES = ([], [], [])          # samples (t, v, i) not yet sent
+SAMPLES_SENT = perf_counter()   # when samples were last sent
+
+def write_run_samples():        # Send all buffered samples in one frame
+    global SAMPLES, SAMPLES_SENT
+    if SAMPLES[0]:
+        write_raw_frame(FRAMES_OUT, g.IPC_FRAME_SAMPLES, pack_samples(RUN_STEP, *SAMPLES))
+        SAMPLES = ([], [], [])
+    SAMPLES_SENT = perf_counter()
+
+def write_run_message(s):
+    write_run_samples()         # keep messages in order with the samples around them
     write_data(s)
 
-def write_run_data(s):
-    s = g.R_DATA_PREFIX + str(s)
-    write_data(s)
+def write_run_status(s):
+    s = g.R_STATUS_PREFIX + str(s)
+    write_run_message(s)
 
 def write_run_port(s):
     s = g.R_PORT_PREFIX + str(s)
-    write_data(s)
+    write_run_message(s)
 
 def write_run_relay_state(relay, state):
     s = g.R_RELAY_PREFIX+str(relay)+'-'+str(state)
-    write_data(s)
+    write_run_message(s)
 
-def calc_v_max(pstat, steps):
+def calc_v_max(v_ranges, steps):
         v_max_method = 0                                        # Get the maximum abs() voltage of the entire method
         for step in steps:
             if step[g.M_TYPE] != g.M_RELAY_STEP:
@@ -572,8 +390,7 @@ def calc_v_max(pstat, steps):
                 if v_max_step > v_max_method:
                     v_max_method = v_max_step
 
-        v_ranges = pstat.get_all_volt_range()                   # Grab the v_max options from the device
-        v_ranges_int = []
+        v_ranges_int = []                                       # v_ranges are the v_max options of the device
         for v_range in v_ranges:
             v_ranges_int.append(int(sub("[^0-9]", "",v_range))) # And convert them from strings to integers
 
@@ -588,31 +405,119 @@ def calc_v_max(pstat, steps):
         else:                                                   # otherwise, the V is too high, return error!!!
             raise ValueError(g.R_ERROR_VMAX_TOO_HIGH)
 
-def connect_to_device(port):
-    
+def get_device_backend():
+    """Returns the module in devices/ that runs talk to the device thru (see g.DEVICE_BACKEND,
+    which the environment variable g.DEVICE_BACKEND_ENV overrides if it is set)"""
+    backend = os.environ.get(g.DEVICE_BACKEND_ENV) or g.DEVICE_BACKEND
+    if backend == g.DEVICE_BACKEND_RODEOSTAT:
+        from devices import rodeostat
+        return rodeostat
+    elif backend == g.DEVICE_BACKEND_SIMULATED:
+        from devices import simulated
+        return simulated
+    raise ValueError('Unknown device backend: '+str(backend))
+
+def connect_to_device(backend, port):
     try:
-        pstat = Potentiostat(port)      # Check the connection by creating a new PSTAT object and 
+        pstat = backend.connect(port)   # Check the connection by creating a new PSTAT object and 
         pstat.get_hardware_variant()    # running a command that would produce an error with a nonpotentiostat device
         write_run_port(port)
         return (pstat, port)            # if it doesn't throw and error, we're good to go with the current pstat!
     except:
-        PSTAT = None                    # if it does throw an error, read on!
-        return None
+        return None                     # if it does throw an error, read on!
+
+def get_device(port):
+    """Returns the connected potentiostat. Only connects (and asks the device for its
+    voltage ranges) if the session isn't connected already."""
+    if not DEVICE:
+        set_up_device(*device_is_connected(port))
+    else:
+        write_run_port(DEVICE['port'])          # the GUI still wants to know which port the device is on
+    return DEVICE['pstat']
+
+def set_up_device(pstat, port):
+    """Makes pstat, just connected to on port, the session's device"""
+    pstat.set_auto_connect(True)
+    DEVICE['pstat'] = pstat
+    DEVICE['port'] = port
+    DEVICE['volt ranges'] = pstat.get_all_volt_range()
+    DEVICE['output pins'] = set()               # GPIO pins already set as outputs
+    try:
+        DEVICE['tests'] = pstat.get_test_names()    # tests the device's firmware can run
+    except Exception:
+        DEVICE['tests'] = []                        # if it can't say, stick to one test per step
+    write_run_status('device is connected!')
+
+def set_device(key, value, setter):
+    """Sends a setting to the device with setter, unless the device already has that
+    value. Returns True if it was sent."""
+    if key in DEVICE and DEVICE[key] == value:
+        return False
+    setter(value)
+    DEVICE[key] = value
+    return True
 
 def device_is_connected(port):
+    backend = get_device_backend()
     if port:                                # If we're supposed to be connected already
-        resp = connect_to_device(port)
+        resp = connect_to_device(backend, port)
         if resp:                            # If we're still connected, great! 
             return resp
-    for port in serial.tools.list_ports.comports(): # If not: try to connect: loop thru all serial ports with connections
-        if 'USB Serial Device' in port.description or 'ItsyBitsy' in port.description: # if the device name contains "USB Serial Device" or "ItsyBitsy M4"
-            resp = connect_to_device(port.device)
-            if resp:                                # Try to connect to it, if so, great!
-                return resp 
-    raise ValueError(g.R_ERROR_NO_CONNECT)               # If we don't connect at all, write the error message
+    for port in backend.find_ports():       # If not: try to connect: loop thru all ports that may hold a device
+        resp = connect_to_device(backend, port)
+        if resp:                            # Try to connect to it, if so, great!
+            return resp 
+    raise ValueError(g.R_ERROR_NO_CONNECT)  # If we don't connect at all, write the error message
+
+def start_test(test):
+    global TEST, TEST_ENDS, TEST_STEP
+    TEST = test
+    TEST_ENDS = list(accumulate(step.get(g.M_T, 0) for (i, step) in test))
+    TEST_STEP = 0
+    start_step(*test[0])
+
+def end_test():
+    global RUN_TIME
+    end_step()
+    RUN_TIME = RUN_TIME + TEST_ENDS[-1]     # the next test starts where this one should have ended
+
+def start_step(index, step):
+    global RUN_STEP, KEEP_EVERY, SEEN, LAST_SAMPLE
+    RUN_STEP = index
+    KEEP_EVERY = get_step_keep_every(step) if step[g.M_TYPE] != g.M_RELAY_STEP else 1
+    SEEN = 0
+    LAST_SAMPLE = None
+
+def end_step():
+    if KEEP_EVERY and LAST_SAMPLE:          # a preview always ends with the step's last sample, so the GUI
+        keep_sample(*LAST_SAMPLE)           #   knows when the step ended
+    write_run_samples()                     # send what's left of this step before the next one starts
+
+def keep_sample(t, volt, curr):
+    SAMPLES[0].append(t)
+    SAMPLES[1].append(volt)
+    SAMPLES[2].append(curr)
 
 def on_data(chan, t, volt, curr):
-    write_run_data((t,volt,curr))
+    global SEEN, LAST_SAMPLE, TEST_STEP
+    while t > TEST_ENDS[TEST_STEP] and TEST_STEP < len(TEST)-1:    # a test that runs several steps has moved on
+        end_step()                                                  #   to the next one
+        TEST_STEP = TEST_STEP + 1
+        start_step(*TEST[TEST_STEP])
+    t = RUN_TIME + t                        # time is sent counted from the start of the run
+    SEEN = SEEN + 1
+    if KEEP_EVERY and SEEN % KEEP_EVERY == 0:
+        keep_sample(t, volt, curr)
+        LAST_SAMPLE = None
+    else:
+        LAST_SAMPLE = (t, volt, curr)
+    if perf_counter() - SAMPLES_SENT >= g.R_FRAME_INTERVAL:
+        write_run_samples()
+
+def set_device_pin_output(pstat, pin):
+    if pin not in DEVICE['output pins']:
+        pstat.set_dio_pin_mode(pin, 'Output')
+        DEVICE['output pins'].add(pin)
 
 def set_relay(pstat, step, relays_enabled, pins):
     if relays_enabled:
@@ -629,7 +534,13 @@ def set_relay(pstat, step, relays_enabled, pins):
         except:
             raise ValueError(g.R_ERROR_SET_RELAY)
 
-def run_const(pstat, step):
+def set_step_sample_rate(pstat, step, s_freq):
+    rate = get_step_sample_freq(s_freq, step)
+    if set_device('sample rate', rate, pstat.set_sample_rate):     # only talk to the device if this step's rate is new
+        write_run_status('sample rate is: '+str(rate))
+
+def run_const(pstat, step, s_freq):
+    set_step_sample_rate(pstat, step, s_freq)
     v = step[g.M_CONST_V]
     t = int(step[g.M_T] * g.S2MS)
     params = {
@@ -642,7 +553,8 @@ def run_const(pstat, step):
     pstat.run_test('constant', param=params, on_data=on_data, display=None)
     write_run_status('FINISHED a constant voltage')
 
-def run_ramp(pstat, step):
+def run_ramp(pstat, step, s_freq):
+    set_step_sample_rate(pstat, step, s_freq)
     v0 = step[g.M_RAMP_V1]          # get starting voltage
     v1 = step[g.M_RAMP_V2]          # get ending voltage
     t = int(step[g.M_T] * g.S2MS)   # get duration as float in [s], convert to int in [ms]
@@ -656,57 +568,77 @@ def run_ramp(pstat, step):
     write_run_status('STARTING a ramp')
     pstat.run_test('linearSweep', param=params, on_data=on_data, display=None)
     write_run_status('FINISHED a ramp')
-    
-    
-    
 
-def run():
-    # Grab arguments and convert them from strings to intended types, store in script global scope  
-    S_FREQ = literal_eval(sys.argv[2])              # int or float
-    I_MAX = sys.argv[3]                         # string
-    STEPS = literal_eval(sys.argv[4])           # list of dicts (step info)
-    PORT = sys.argv[5]                          # string
-    RELAYS_ENABLED = literal_eval(sys.argv[6])  # bool
-    GPIO_PINS = literal_eval(sys.argv[7])       # list of strings (GPIO pin names)
-    PSTAT = None                                # Potentiostat object 
-
-    resp = device_is_connected(PORT)            # try to connect to device
-    if not resp:
-        return
-    
-    write_run_status('device is connected!')
-    (PSTAT, PORT) = resp
-    PSTAT.set_sample_rate(S_FREQ)               # set sample parameters to device
-    PSTAT.set_curr_range(I_MAX)
-    v_max = calc_v_max(PSTAT, STEPS)
-    if not v_max:
-        return
-    PSTAT.set_volt_range(v_max)
-    PSTAT.set_auto_connect(True)
+def run_multistep(pstat, test, s_freq):
+    set_step_sample_rate(pstat, test[0][1], s_freq)     # steps are only merged if they share a sample rate
+    params = {
+        'quietValue' : test[0][1][g.M_CONST_V],
+        'quietTime'  : 0,
+        'step'       : [(int(step[g.M_T] * g.S2MS), step[g.M_CONST_V]) for (i, step) in test],    # (duration [ms], voltage [V]) of each step
+        }
+    write_run_status('STARTING '+str(len(test))+' constant voltages')
+    pstat.run_test('multiStep', param=params, on_data=on_data, display=None)
+    write_run_status('FINISHED '+str(len(test))+' constant voltages')
+
+def compile_steps(steps, s_freq, multistep):
+    """Takes in the steps of a run, the method's sample frequency and whether the device
+    can run multi-step tests. Returns the device tests that run the steps, in order, each
+    a list of (index in steps, step) of the steps that test runs. Consecutive constant
+    voltage steps that sample at the same rate are merged into one multi-step test (up to
+    g.R_MULTISTEP_MAX_STEPS of them), so they run back to back on the device with no gap
+    and no round trip between them. Every other step is a test of its own."""
+    tests = []
+    for (i, step) in enumerate(steps):
+        last = tests[-1][-1][1] if tests else None
+        if (multistep and last
+                and step[g.M_TYPE] == g.M_CONSTANT and last[g.M_TYPE] == g.M_CONSTANT
+                and get_step_sample_freq(s_freq, step) == get_step_sample_freq(s_freq, last)
+                and len(tests[-1]) < g.R_MULTISTEP_MAX_STEPS):
+            tests[-1].append((i, step))
+        else:
+            tests.append([(i, step)])
+    return tests
+
+def run_test(pstat, test, s_freq, relays_enabled, gpio_pins):
+    start_test(test)
+    step = test[0][1]
+    step_type = step[g.M_TYPE]
+    if step_type == g.M_RELAY_STEP:
+        set_relay(pstat, step, relays_enabled, gpio_pins)
+    elif len(test) > 1:
+        run_multistep(pstat, test, s_freq)
+    elif step_type == g.M_CONSTANT:
+        run_const(pstat, step, s_freq)
+    elif step_type == g.M_RAMP:
+        run_ramp(pstat, step, s_freq)
+    end_test()
+
+def run(s_freq, i_max, steps, port, relays_enabled, gpio_pins):
+    global RUN_TIME
+    pstat = get_device(port)                    # connect to device (if not connected already)
+
+    set_device('sample rate', s_freq, pstat.set_sample_rate)    # set sample parameters to device (steps with their own
+    set_device('current range', i_max, pstat.set_curr_range)   #   sample frequency change it when they start)
+    set_device('volt range', calc_v_max(DEVICE['volt ranges'], steps), pstat.set_volt_range)
 
     try:
         # Set all device GPIO pins as outputs and turn them off to start
-        if RELAYS_ENABLED:
-            for pin in GPIO_PINS:
-                PSTAT.set_dio_pin_mode(pin, 'Output')
-                PSTAT.set_dio_value(pin, 'Low')
+        if relays_enabled:
+            for pin in gpio_pins:
+                set_device_pin_output(pstat, pin)
+                pstat.set_dio_value(pin, 'Low')
     except Exception as e:
         raise ValueError(g.R_ERROR_SET_RELAY)
     
         
-    write_run_status('sample period is: '+str(PSTAT.get_sample_period()))
-    write_run_status('current range is: '+str(PSTAT.get_curr_range()))
-    write_run_status('voltage range is: '+str(PSTAT.get_volt_range()))     
+    write_run_status('sample rate is: '+str(DEVICE['sample rate']))
+    write_run_status('current range is: '+str(DEVICE['current range']))
+    write_run_status('voltage range is: '+str(DEVICE['volt range']))     
     write_run_status("now we're doing stuff!")
 
-    for step in STEPS:
-        step_type = step[g.M_TYPE]
-        if step_type == g.M_RELAY_STEP:
-            set_relay(PSTAT, step, RELAYS_ENABLED, GPIO_PINS)
-        elif step_type == g.M_CONSTANT:
-            run_const(PSTAT, step)
-        elif step_type == g.M_RAMP:
-            run_ramp(PSTAT, step)
+    RUN_TIME = 0
+    for test in compile_steps(steps, s_freq, 'multiStep' in DEVICE['tests']):
+        run_test(pstat, test, s_freq, relays_enabled, gpio_pins)
 
     #### MODIFY THIS TO ACCOUNT FOR DIFFERENT DEVICES WITH DIFFERENT IO PINS
     #
@@ -718,8 +650,131 @@ def run():
     #
     #####################################################
 
+def replay(path, ids, speed, s_freq, i_max, steps, port, relays_enabled, gpio_pins):
+    """Runs steps as run() does (taking the same args after speed), but on a device that
+    plays back the samples recorded by the rep with ids (run-id, rep-id) of the session at
+    path, speed times faster than real time (0: as fast as it can). See devices/replay.py.
+    First tells the GUI how many samples the recording holds."""
+    from devices.replay import ReplayPotentiostat, get_recording
+    recording = get_recording(path, ids)
+    DEVICE.clear()                              # (a session that replays never runs on the real device)
+    set_up_device(ReplayPotentiostat(recording, speed), g.REPLAY_PORT)
+    write_run_message(g.R_REPLAY_PREFIX + str(len(recording[0])))
+    try:
+        run(s_freq, i_max, steps, g.REPLAY_PORT, False, gpio_pins)     # there are no relays to set
+    finally:
+        DEVICE.clear()
+
+def start_run_output():
+    global FRAMES_OUT
+    FRAMES_OUT = sys.stdout.buffer              # frames go to the real stdout...
+    sys.stdout = open(os.devnull, 'w')          #   and any stray print() nowhere (stderr means an error to the GUI)
+
+def run_session():
+    global WORKER_MODE
+    WORKER_MODE = True                          # errors go out as frames, in order with the samples
+    start_run_output()
+    frame = read_frame(sys.stdin.buffer)
+    while frame:                                # until stdin is closed (the batch is done)
+        try:
+            (ftype, request) = frame
+            if request[0] == g.PROC_TYPE_RUN:
+                run(*request[1:])
+            elif request[0] == g.PROC_TYPE_REPLAY:
+                replay(*request[1:])
+            else:
+                raise ValueError('Unknown request: '+str(request[0]))
+        except Exception as e:
+            write_run_samples()                 # send whatever was taken before the error
+            DEVICE.clear()                      # the device may be gone, so connect from scratch next run
+            write_error(str(e))
+        write_frame(FRAMES_OUT, g.IPC_FRAME_FINISHED)
+        frame = read_frame(sys.stdin.buffer)
 
-    
+#################################
+#                               #
+#       WORKER                  #
+#                               #
+#################################
+#
+# Rather than starting this script once per save, read, export or overwrite, the main window starts it once
+#   as a worker and sends it requests over stdin for as long as the lab session is open. This saves the
+#   start-up time of each process, and lets the worker keep each session it has read in memory so saves
+#   don't have to re-read the file.
+#
+#   GUI and worker talk in frames (see ov_ipc). Each request is one g.IPC_FRAME_REQUEST frame holding the
+#   process type followed by its arguments as plain objects (e.g. ['save', path, saveType, params]). Everything
+#   the request sends back is a frame on stdout:
+#
+#       - g.IPC_FRAME_DATA      what write_data() would write for a one-off process
+#       - g.IPC_FRAME_ERROR     what write_error() would write for a one-off process
+#       - g.IPC_FRAME_FINISHED  the request is done (sent once per request, last)
+#
+#   Anything else printed while handling a request goes to stderr so it can't break up the frames.
+#   The worker exits when its stdin is closed.
+
+SESSIONS = {}   # path -> (file stamps, session data) of sessions this worker has read or saved
+
+def get_session_stamps(path):
+    """Returns the size and modification time of the session file at path and
+    of its journal, used to tell whether the file changed since it was read"""
+    stamps = []
+    for p in (path, path + g.JOURNAL_EXT):
+        try:
+            st = stat(p)
+            stamps.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            stamps.append(None)
+    return stamps
+
+def get_kept_session(path):
+    """Returns the session at path as kept in memory by this worker, or None if
+    it isn't kept or the file has been changed by something else since."""
+    if path in SESSIONS:
+        (stamps, data) = SESSIONS[path]
+        if stamps == get_session_stamps(path):
+            return data
+        SESSIONS.pop(path)
+    return None
+
+def keep_session(path, data):
+    if WORKER_MODE and not is_sqlite_session(path):     # sqlite sessions are read row by row anyway
+        SESSIONS[path] = (get_session_stamps(path), data)
+
+def handle_request(request):
+    processType = request[0]
+    args = request[1:]
+    if processType == g.PROC_TYPE_SAVE:
+        save(*args)
+    elif processType == g.PROC_TYPE_OVERWRITE:
+        overwrite(*args)
+    elif processType == g.PROC_TYPE_EXPORT:
+        export(*args)
+    elif processType == g.PROC_TYPE_READ:
+        read(*args)
+    elif processType == g.PROC_TYPE_CONVERT:
+        convert(*args)
+    elif processType == g.PROC_TYPE_RECOVER:
+        recover(*args)
+    elif processType == g.PROC_TYPE_PROMOTE:
+        promote(*args)
+    else:
+        raise ValueError('Unknown request: '+str(processType))
+
+def worker():
+    global WORKER_MODE, FRAMES_OUT
+    WORKER_MODE = True
+    FRAMES_OUT = sys.stdout.buffer      # frames go to the real stdout...
+    sys.stdout = sys.stderr             #   and any stray print() to stderr
+    frame = read_frame(sys.stdin.buffer)
+    while frame:                        # until stdin is closed
+        try:
+            (ftype, request) = frame
+            handle_request(request)
+        except Exception as e:
+            write_error(str(e))
+        write_frame(FRAMES_OUT, g.IPC_FRAME_FINISHED)
+        frame = read_frame(sys.stdin.buffer)
 
 #################################
 #                               #
@@ -727,21 +782,31 @@ def run():
 #                               #
 #################################
 
-try:
-    processType = sys.argv[1]
+def process(argv):      # Run as a one-off process, with arguments from the command line (as strings)
+    processType = argv[1]
     if processType == g.PROC_TYPE_SAVE:
-        save()
+        save(argv[2], argv[3], literal_eval(argv[4]))   # path, save type, params
     elif processType == g.PROC_TYPE_OVERWRITE:
-        overwrite()
+        overwrite(argv[2], literal_eval(argv[3]))       # path, data dict
     elif processType == g.PROC_TYPE_EXPORT:
-        export()
+        export(argv[2], argv[3], literal_eval(argv[4])) # path to read from, folder to write to, list of (runID, repID)
     elif processType == g.PROC_TYPE_READ:
-        read()
+        read(argv[2])                                   # path
     elif processType == g.PROC_TYPE_RUN:
-        run()
-        
+        start_run_output()                              # dt, i_max, steps, port, relays enabled, GPIO pins
+        run(literal_eval(argv[2]), argv[3], literal_eval(argv[4]), argv[5], literal_eval(argv[6]), literal_eval(argv[7]))
+    elif processType == g.PROC_TYPE_RUN_SESSION:
+        run_session()
+    elif processType == g.PROC_TYPE_CONVERT:
+        convert(argv[2], argv[3])                       # src path, dst path
+    elif processType == g.PROC_TYPE_RECOVER:
+        recover(argv[2])                                # path
+    elif processType == g.PROC_TYPE_WORKER:
+        worker()
+
+try:
+    process(sys.argv)
 
 except Exception as e:                  # If process in general generates an error (eg. with args or file read):
     write_error(str(e))                 #   Write that error to error channel
 
-        
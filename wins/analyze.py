@@ -5,7 +5,10 @@ A window that displays as many graphs, one by one, for the user
 to analyze.
 
 Whenever possible, an autoanalysis is generated. However, the user
-always has the option to modify as they see fit.
+always has the option to modify as they see fit. Reps that were
+analyzed in the background after their run (a provisional analysis,
+see ov_analysis) start from that analysis, so it only has to be
+accepted.
 
 The following controls are provided:
     - Next: Brings user to next plot
@@ -15,6 +18,7 @@ The following controls are provided:
 
 from global_scripts.ov_functions import *
 from global_scripts import ov_globals as g
+from global_scripts.ov_analysis import get_provisional_analysis
 
 from embeds.voltamOGram import VoltamogramPlot
 
@@ -41,6 +45,7 @@ class WindowAnalyze(QMainWindow):
         self.tasks = tasks
         self.saved = False
         self.results = []
+        self.provisional = []
 
         self.setWindowTitle(self.parent.data[g.S_NAME]+' | Analyze')
 
@@ -51,6 +56,7 @@ class WindowAnalyze(QMainWindow):
                 self.results.append(prev_a)                 #   if possible
             else:                                           # if not, load an empty dict
                 self.results.append({})
+            self.provisional.append(get_provisional_analysis(self.parent.data, task) or {})
 
         self.stack = QStackedLayout()
         self.voltamograms = []
@@ -198,9 +204,11 @@ class WindowAnalyze(QMainWindow):
         try:
             lines = self.voltamograms[i].get_line_count()
             if lines == 0:
-                self.voltamograms[i].plot_reps([self.tasks[i]], subbackground=True, showsmoothed=True, showraw=True, predictpeak=True)
-                if self.results[i]:
-                    self.voltamograms[i].set_analysis(self.results[i])
+                analysis = self.results[i] or self.provisional[i]   # start from the analysis so far, if there is one
+                self.voltamograms[i].plot_reps([self.tasks[i]], subbackground=True, showsmoothed=True, showraw=True, predictpeak=True,
+                                               analysis=analysis or None)
+                if analysis:
+                    self.voltamograms[i].set_analysis(analysis)
         except Exception as e:
             print(e)
         
@@ -222,6 +230,7 @@ class WindowAnalyze(QMainWindow):
             # Set progress pane element text
             (run_id, rep_id) = self.tasks[j]
             if self.results[j]: but.setText(run_id+', '+rep_id+'  |  Complete')
+            elif self.provisional[j]: but.setText(run_id+', '+rep_id+'  |  Auto')
             else: but.setText(run_id+', '+rep_id)       
         applyStyles()
 
@@ -241,16 +250,19 @@ class WindowAnalyze(QMainWindow):
         for i, task in enumerate(self.tasks):       # for each rep analyzed
             rep = get_rep(self.parent.data, task)   # get the data pre-analysis
             rep[g.R_ANALYSIS] = self.results[i]     # slot in the analysis
+            if self.results[i]:
+                rep.pop(g.R_ANALYSIS_PROVISIONAL, None) # (which replaces the provisional one)
             to_write.append(rep)   
 
         # 2. run async save
         self.status.showMessage("Saving...")
 
-        cb_suc = self.save_success          # callback on success of final async save
-        cb_err = self.save_error            # callback on error of any async save
+        cb_suc = self.save_success          # callback on success of async save
+        cb_err = self.save_error            # callback on error of async save
 
-        cb_calc = partial(self.parent.start_async_save, g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive], cb_suc, cb_err)     # Callback to archive calcs after analysis is saved
-        self.parent.start_async_save(g.SAVE_TYPE_REP_MOD, [self.tasks, to_write], onSuccess=cb_calc, onError=cb_err)
+        saves = [[g.SAVE_TYPE_REP_MOD, [self.tasks, to_write]],                 # Save the analyses and archive impacted calcs
+                 [g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive]]]         #   in one save
+        self.parent.start_async_save(g.SAVE_TYPE_TRANSACTION, saves, onSuccess=cb_suc, onError=cb_err)
             
 
     def save_success(self, event=False):
@@ -12,12 +12,16 @@ export data, view all past runs and analysis, and perhaps run calculations
 from global_scripts import ov_globals as g
 from global_scripts import ov_lang as l
 from global_scripts.ov_functions import *
+from global_scripts.ov_ipc import FrameReader, encode_frame
+from global_scripts.ov_spill import find_spills
+from global_scripts.ov_replay import get_speed_text
 
 # import necessary windows
 from wins.sample import WindowSample
 from wins.method import WindowMethod
 from wins.runConfig import WindowRunConfig
 from wins.runView import WindowRunView
+from wins.replay import WindowReplay
 from wins.resultsView import WindowResultsView
 from wins.analyze import WindowAnalyze
 from wins.calculate import WindowCalculate
@@ -26,7 +30,6 @@ from wins.calculate import WindowCalculate
 from os.path import join as joindir
 from os.path import exists
 from functools import partial
-from ast import literal_eval
 from time import sleep
 
 # import PyQt6/PySide6 stuff
@@ -84,11 +87,17 @@ class WindowMain(QMainWindow):
         self.current_tab = 0
         self.select_all_prog_check_flag = False
         self.save_error_flag = False
+        self.save_sample_ids = None       # samples touched by the last save (None means redraw everything)
         self.read_error_flag = False
+        self.recovered_reps = []          # reps recovered from the spill files of interrupted runs
         self.export_error_msg = ''
         self.status = self.statusBar()
         self.progress_bar = QProgressBar()
-        self.process = None
+        self.process = None               # the request the worker is busy with, if any
+        self.worker = None                # long-lived process.py worker (see start_worker)
+        self.worker_reader = FrameReader()
+        self.worker_queue = []            # requests waiting for the worker (see send_to_worker)
+        self.queue_label = QLabel()       # shows how many requests are waiting
 
         #####################
         #                   #
@@ -99,6 +108,7 @@ class WindowMain(QMainWindow):
         self.progress_bar.setMaximum(0)
         self.progress_bar.setMaximumWidth(g.SB_PROGRESS_BAR_WIDTH)  # Set a fixed width
         self.progress_bar.setVisible(False)     # Hide it initially
+        self.status.addPermanentWidget(self.queue_label)
         self.status.addPermanentWidget(self.progress_bar)
 
         #####################
@@ -149,6 +159,7 @@ class WindowMain(QMainWindow):
         action_run_new.triggered.connect(partial(self.new_win_config_run, g.WIN_MODE_NEW))
         action_run_new_from.triggered.connect(partial(self.open_run_config_with_uid, g.WIN_MODE_NEW))
         action_run_redo.triggered.connect(self.redo_run)
+        menu_rep_replay = self.new_replay_menu()
         action_run_view.triggered.connect(partial(self.open_run_config_with_uid, g.WIN_MODE_VIEW_ONLY))
         action_method_run_view.triggered.connect(partial(self.open_method_with_uid, g.WIN_MODE_VIEW_ONLY))
         action_rep_edit.triggered.connect(self.edit_rep_note)
@@ -190,6 +201,7 @@ class WindowMain(QMainWindow):
         m.addAction(action_run_new)
         m.addAction(action_run_new_from)
         m.addAction(action_run_redo)
+        m.addMenu(menu_rep_replay)
         m.addSeparator()
         m.addAction(action_run_view)
         m.addAction(action_method_run_view)
@@ -215,7 +227,8 @@ class WindowMain(QMainWindow):
         self.actions_run_one_plus = [action_run_export,
                                      action_run_delete,
                                      action_analyze_peaks]
-        self.actions_rep_one_only = [action_rep_edit]
+        self.actions_rep_one_only = [action_rep_edit,
+                                     menu_rep_replay.menuAction()]
         self.actions_rep_one_plus = [action_graph,
                                      action_analyze_peaks]
         self.actions_sample_one_plus = [action_run_new,
@@ -234,6 +247,8 @@ class WindowMain(QMainWindow):
         
         self.a_runAgain = self.context_menu.addAction("New run from config")
         self.a_runRedo = self.context_menu.addAction("Rerun")
+        self.m_replay = self.new_replay_menu()
+        self.context_menu.addMenu(self.m_replay)
         self.context_menu.addSeparator()
         self.a_viewConfig = self.context_menu.addAction("Run info")
         self.a_viewMethod = self.context_menu.addAction("Method info")
@@ -265,7 +280,8 @@ class WindowMain(QMainWindow):
                                 self.a_runRedo,
                                 self.a_viewConfig,
                                 self.a_viewMethod]
-        self.rep_actions_one = [self.a_editRepNote]
+        self.rep_actions_one = [self.a_editRepNote,
+                                self.m_replay.menuAction()]
         
         #####################
         #                   #
@@ -326,6 +342,8 @@ class WindowMain(QMainWindow):
         #   begin data read #
         #                   #
         ##################### 
+        self.start_worker()
+        self.start_async_recover()
         self.start_async_read()
         
         # Display! 
@@ -333,15 +351,20 @@ class WindowMain(QMainWindow):
         self.w.setLayout(lay)
         self.setCentralWidget(self.w)
         
-    def update_win(self):
+    def update_win(self, sample_ids=None):
+        """Redraws the window from self.data. If sample_ids (a set of sample uids) is
+        given, only the tabs of those samples are rebuilt."""
         try:
-            self.layout_old = self.layout.copy()                # Store copy of old layout
-            self.layout = {}                                    # Reinit self.layout to be refilled 
             sample_name = self.data[g.S_NAME]
             self.setWindowTitle(sample_name)                                    # Set the sample window title
             self.lbl_sample_name.updateTitleLbl(sample_name)                    # Set the sample name
-            self.set_move_to_menu()
-            self.set_main_area()
+            if sample_ids is not None and self.tabs:
+                self.refresh_sample_tabs(sample_ids)
+            else:
+                self.layout_old = self.layout.copy()            # Store copy of old layout
+                self.layout = {}                                # Reinit self.layout to be refilled 
+                self.set_move_to_menu()
+                self.set_main_area()
             self.update_highlights()
             self.update_menu()
             self.update_children()
@@ -375,12 +398,10 @@ class WindowMain(QMainWindow):
         if not continue_action:
             return
  
-        # Define callback function
-        cb_calc = partial(self.start_async_save, g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive])
-
         # Figure out which call to make based on whether or not there are calcs to archive
         if calcs_to_archive:
-            self.start_async_save(g.SAVE_TYPE_RUN_MOVE, [runs, sample_id], onSuccess=cb_calc)
+            self.start_async_save(g.SAVE_TYPE_TRANSACTION, [[g.SAVE_TYPE_RUN_MOVE, [runs, sample_id]],
+                                                            [g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive]]])
         else:
             self.start_async_save(g.SAVE_TYPE_RUN_MOVE, [runs, sample_id])
 
@@ -393,10 +414,14 @@ class WindowMain(QMainWindow):
     #                                           #
     #   Functions for creating run layout       #
     #                                           #
-    #   1. widgetize_runs                       #
-    #   2. do_nothing                           #
-    #   3. create_w                             #
-    #   4. add_row_to_main                      #
+    #   1. set_main_area                        #
+    #   2. get_samples_with_calcs               #
+    #   3. make_sample_tab                      #
+    #   4. refresh_sample_tabs                  #
+    #   5. widgetize_runs                       #
+    #   6. do_nothing                           #
+    #   7. create_w                             #
+    #   8. add_row_to_main                      #
     #                                           #
     #############################################
 
@@ -417,79 +442,113 @@ class WindowMain(QMainWindow):
         self.tabs.currentChanged.connect(self.tab_changed)
         self.tab_ids = []
 
-        # Get list of all samples that already have saved calculations
+        samples_with_calcs = self.get_samples_with_calcs()
+        
+        for i, sample in enumerate(d[g.S_SAMPLES]):
+            (w, name, fullname) = self.make_sample_tab(i, sample, samples_with_calcs)
+            self.tabs.addTab(w, name)
+            self.tabs.setTabToolTip(i, fullname)
+            self.tab_ids.append(sample[g.R_UID_SELF])
+
+        self.centralWidget().layout().insertWidget(insert_i, self.tabs)  # insert tab widget to same spot previous tab widget was located (this preserves stretches, animationes, etc.)
+        self.tabs.setCurrentIndex(self.current_tab)         # activate tab (this is needed to stay on same tab during ongoing use, rather than jumping to tab 0)
+        applyStyles()
+
+    
+    def get_samples_with_calcs(self):
+        """Returns a list of the uids of all samples that already have saved calculations"""
         samples_with_calcs = []
-        for calc in d[g.S_PROCESSED]:
+        for calc in self.data[g.S_PROCESSED]:
             s_id = calc[g.C_SAMPLE_ID]
             if not s_id in samples_with_calcs:
                 samples_with_calcs.append(s_id)
-        
-        for i, sample in enumerate(d[g.S_SAMPLES]):
-            # Set up sample header
-            lbl_s_name = QLabel("<div style='font-size: 16pt'>"+sample[g.SA_NAME]+"</div>")
-            lbl_s_name.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-            lbl_s_name.setWordWrap(True)
-            desc = self.get_sample_description(sample)
-            lbl_desc = QLabel(desc)
-            lbl_desc.setWordWrap(True)
-            lbl_desc.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-
-            but_edit = QPushButton()
-            but_edit.setIcon(QIcon(g.ICON_EDIT))
-            but_edit.clicked.connect(self.edit_sample)
-            but_del = QPushButton()
-            but_del.setIcon(QIcon(g.ICON_TRASH))
-            but_del.clicked.connect(self.delete_sample)
-
-            v = QVBoxLayout()
-            v.addWidget(lbl_s_name)
-            v.addLayout(horizontalize([but_edit, but_del]))
+        return samples_with_calcs
+
+    def make_sample_tab(self, i, sample, samples_with_calcs):
+        """Builds the tab of sample (the ith sample). Returns (tab widget, tab name, full sample name)"""
+        # Set up sample header
+        lbl_s_name = QLabel("<div style='font-size: 16pt'>"+sample[g.SA_NAME]+"</div>")
+        lbl_s_name.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        lbl_s_name.setWordWrap(True)
+        desc = self.get_sample_description(sample)
+        lbl_desc = QLabel(desc)
+        lbl_desc.setWordWrap(True)
+        lbl_desc.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+
+        but_edit = QPushButton()
+        but_edit.setIcon(QIcon(g.ICON_EDIT))
+        but_edit.clicked.connect(self.edit_sample)
+        but_del = QPushButton()
+        but_del.setIcon(QIcon(g.ICON_TRASH))
+        but_del.clicked.connect(self.delete_sample)
+
+        v = QVBoxLayout()
+        v.addWidget(lbl_s_name)
+        v.addLayout(horizontalize([but_edit, but_del]))
             
-            if desc:
-                v.addWidget(lbl_desc)
-
-            s_id = sample[g.R_UID_SELF]
-            if s_id in samples_with_calcs:                                      # if this sample has calculations
-                w_res = WindowCalculate(self, g.WIN_MODE_EMBED, sample_id=s_id) # Add embedded calc results
-                v.addWidget(QHLine())
-                v.addWidget(w_res)
-            v.addStretch()
+        if desc:
+            v.addWidget(lbl_desc)
+
+        s_id = sample[g.R_UID_SELF]
+        if s_id in samples_with_calcs:                                      # if this sample has calculations
+            w_res = WindowCalculate(self, g.WIN_MODE_EMBED, sample_id=s_id) # Add embedded calc results
+            v.addWidget(QHLine())
+            v.addWidget(w_res)
+        v.addStretch()
             
-            w0 = QWidget()
-            w0.setLayout(v)
-            color_index = i%7
-            w0.setObjectName('sample-'+str(color_index))
+        w0 = QWidget()
+        w0.setLayout(v)
+        color_index = i%7
+        w0.setObjectName('sample-'+str(color_index))
 
-            h = QHBoxLayout()
-            h.addWidget(w0)
+        h = QHBoxLayout()
+        h.addWidget(w0)
             
-            # IF there are runs, setup sample tree
-            runs = get_runs_in_sample(self.data, sample[g.R_UID_SELF])
-            if runs:
-                w_cust=self.widgetize_runs(sample[g.R_UID_SELF])
-                h.addWidget(w_cust)
-            else:                       # if there are not runs
-                #v.addStretch()          # add a stretch to the layout to keep everything nice and tidy
-                h.addStretch()
+        # IF there are runs, setup sample tree
+        runs = get_runs_in_sample(self.data, sample[g.R_UID_SELF])
+        if runs:
+            w_cust=self.widgetize_runs(sample[g.R_UID_SELF])
+            h.addWidget(w_cust)
+        else:                       # if there are not runs
+            #v.addStretch()          # add a stretch to the layout to keep everything nice and tidy
+            h.addStretch()
 
             
-            w = QWidget()
-            #w.setLayout(v)
-            w.setLayout(h)
-
-            tabname_len = 12
-            fullname = sample[g.SA_NAME]
-            if len(fullname) <= tabname_len:
-                name = fullname
-            else:
-                name = fullname[0:tabname_len]+'...'
-            
-            self.tabs.addTab(w, name)
+        w = QWidget()
+        #w.setLayout(v)
+        w.setLayout(h)
+
+        tabname_len = 12
+        fullname = sample[g.SA_NAME]
+        if len(fullname) <= tabname_len:
+            name = fullname
+        else:
+            name = fullname[0:tabname_len]+'...'
+        return (w, name, fullname)
+
+    def refresh_sample_tabs(self, sample_ids):
+        """Rebuilds only the tabs of the samples in sample_ids (eg. after a save that
+        only touched those samples), keeping the current tab and selection"""
+        self.layout_old = self.layout.copy()
+        samples_with_calcs = self.get_samples_with_calcs()
+        current_tab = self.tabs.currentIndex()
+        self.tabs.blockSignals(True)                            # swapping tabs shouldn't count as the user changing tabs
+        for i, sample in enumerate(self.data[g.S_SAMPLES]):
+            s_id = sample[g.R_UID_SELF]
+            if s_id not in sample_ids:
+                continue
+            for run in list(self.layout.keys()):                # drop this sample's runs from the layout, widgetize_runs re-adds them
+                if self.layout[run]['sample_id'] == s_id:
+                    self.layout.pop(run)
+            (w, name, fullname) = self.make_sample_tab(i, sample, samples_with_calcs)
+            w_old = self.tabs.widget(i)
+            self.tabs.removeTab(i)
+            w_old.deleteLater()
+            self.tabs.insertTab(i, w, name)
             self.tabs.setTabToolTip(i, fullname)
-            self.tab_ids.append(sample[g.R_UID_SELF])
-
-        self.centralWidget().layout().insertWidget(insert_i, self.tabs)  # insert tab widget to same spot previous tab widget was located (this preserves stretches, animationes, etc.)
-        self.tabs.setCurrentIndex(self.current_tab)         # activate tab (this is needed to stay on same tab during ongoing use, rather than jumping to tab 0)
+        self.tabs.setCurrentIndex(current_tab)
+        self.tabs.blockSignals(False)
+        self.scroll_area_resized()
         applyStyles()
 
     
@@ -1140,10 +1199,8 @@ class WindowMain(QMainWindow):
         reps = self.get_all_selected_reps()
 
         # Check which reps actually have data
-        all_data = get_data_from_file(self.path)
         for i, rep in reversed(list(enumerate(reps))):
-            full_rep = get_rep(all_data, rep)
-            if not full_rep[g.R_DATA]:
+            if not rep_has_data(self.path, rep):
                 reps.pop(i)
         if not reps:                        # If none of the selected reps have data, alert the user
             show_alert(self, "Alert", "None of the selected runs have data, please collect some data and try again.")
@@ -1174,14 +1231,32 @@ class WindowMain(QMainWindow):
             reps = self.get_all_selected_reps()
             self.new_win_view_run(reps)
 
+    def new_replay_menu(self):
+        """Returns a 'Replay' menu with an action for each speed in g.REPLAY_SPEEDS"""
+        menu = QMenu('Replay', self)
+        for speed in g.REPLAY_SPEEDS:
+            action = menu.addAction('At '+get_speed_text(speed))
+            action.triggered.connect(partial(self.replay_rep, speed))
+        return menu
+
+    def replay_rep(self, speed):
+        """Replays the selected rep's recorded data thru a run viewer (see WindowReplay),
+        speed times faster than real time (0: as fast as it can)"""
+        task = self.get_single_selected_rep()
+        if not rep_has_data(self.path, task):
+            show_alert(self, "Alert!", "This replicate has no data to replay.")
+            return
+        self.new_win_one_of_type(WindowReplay(self, task, speed))
+
     def delete_reps(self):
         reps = self.get_all_selected_reps()                                             # Get selected reps
         continue_action, calcs_to_archive = check_calc_conflict(self.data, reps)        # Confirm whether user wants to continue, given this impacts calcs
         if not continue_action:                                                         
             return
         if self.confirm_delete_reps():                                                       # Confirm user wants to delete
-            callback = partial(self.start_async_save, g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive])  # Define callback fn to archive impacted calcs
-            self.start_async_save(g.SAVE_TYPE_REP_DELETE, [reps], onSuccess=callback)   # Delete selected reps (and maybe their parent runs and connected methods) from file
+            saves = [[g.SAVE_TYPE_REP_DELETE, [reps]],                                  # Delete selected reps (and maybe their parent runs and connected methods) from file
+                     [g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive]]]             #   and archive impacted calcs, in one save
+            self.start_async_save(g.SAVE_TYPE_TRANSACTION, saves)
 
    
     def confirm_delete_reps(self):
@@ -1339,58 +1414,157 @@ class WindowMain(QMainWindow):
 
 
 
+
+    #############################################
+    #                                           #
+    #   Functions for the worker process        #
+    #                                           #
+    #   1. start_worker                         #
+    #   2. send_to_worker                       #
+    #   3. send_next_request                    #
+    #   4. update_queue_status                  #
+    #   5. handle_worker_stdout                 #
+    #   6. handle_worker_stderr                 #
+    #   7. handle_worker_finished               #
+    #   8. stop_worker                          #
+    #                                           #
+    #   All reads, saves and exports for this   #
+    #   session go to one process.py worker     #
+    #   that lives as long as this window.      #
+    #   It takes one request at a time, so      #
+    #   requests wait in self.worker_queue      #
+    #   (first in, first out) until it's free.  #
+    #                                           #
+    #############################################
+
+    def start_worker(self):
+        self.worker_reader = FrameReader()
+        self.worker = QProcess()
+        self.worker.readyReadStandardOutput.connect(self.handle_worker_stdout)
+        self.worker.readyReadStandardError.connect(self.handle_worker_stderr)
+        self.worker.finished.connect(self.handle_worker_finished)
+        if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
+            self.worker.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_WORKER])
+        else:
+            self.worker.start(g.PROC_SCRIPT, [g.PROC_TYPE_WORKER])
+        self.worker.waitForStarted()
+
+    def send_to_worker(self, request, onData, onError, onFinished, onStart=False):
+        """Takes in:
+            - request       list. The process type followed by its arguments (e.g. [g.PROC_TYPE_READ, self.path])
+            - onData        fn. Called with each data payload the worker sends back for this request
+            - onError       fn. Called with each error payload the worker sends back for this request
+            - onFinished    fn. Called once the worker is done with this request
+            - onStart       fn (optional). Called right before the request is sent to the worker
+        Adds the request to the end of the queue and sends it as soon as the worker is free."""
+        self.worker_queue.append({'request': request,
+                                  'onStart': onStart,
+                                  'onData': onData,
+                                  'onError': onError,
+                                  'onFinished': onFinished})
+        self.send_next_request()
+
+    def send_next_request(self):
+        """If the worker is free, sends it the request at the front of the queue"""
+        if self.process or not self.worker_queue:
+            self.update_queue_status()
+            return
+        entry = self.worker_queue.pop(0)
+        request = entry['request']
+        if request is None:                             # saves are built when sent, so that later
+            request = [g.PROC_TYPE_SAVE, self.path, entry['saveType'], entry['params']]  # saves can merge into them
+        if not self.worker or self.worker.state() == QProcess.ProcessState.NotRunning:
+            self.start_worker()                         # (re)start the worker if it isn't running
+        if entry['onStart']:
+            entry['onStart']()
+        self.process = (entry['onData'], entry['onError'], entry['onFinished'])
+        self.worker.write(encode_frame(g.IPC_FRAME_REQUEST, request))
+        self.update_queue_status()
+
+    def update_queue_status(self):
+        """Shows how many requests are waiting on the worker, and shows the
+        progress bar for as long as the worker is busy"""
+        busy = bool(self.process)
+        self.progress_bar.setVisible(busy or bool(self.worker_queue))
+        if self.worker_queue:
+            self.queue_label.setText(str(len(self.worker_queue))+' queued')
+        else:
+            self.queue_label.setText('')
+
+    def handle_worker_stdout(self):
+        frames = self.worker_reader.feed(bytes(self.worker.readAllStandardOutput()))
+        for (ftype, payload) in frames:
+            if not self.process:                        # nothing is waiting on the worker
+                print(payload)
+                continue
+            (onData, onError, onFinished) = self.process
+            if ftype == g.IPC_FRAME_FINISHED:
+                self.process = None                     # clear first, onFinished may queue another request
+                onFinished()
+                self.send_next_request()
+            elif ftype == g.IPC_FRAME_DATA:
+                onData(payload)
+            elif ftype == g.IPC_FRAME_ERROR:
+                onError(payload)
+
+    def handle_worker_stderr(self):
+        stderr = bytes(self.worker.readAllStandardError()).decode('utf8')
+        print(stderr)
+
+    def handle_worker_finished(self):
+        self.worker = None
+        if self.process:                                # if the worker died in the middle of a request
+            (onData, onError, onFinished) = self.process
+            self.process = None
+            onError('The worker process stopped unexpectedly.')
+            onFinished()
+        self.send_next_request()                        # restarts the worker if anything is still queued
+
+    def stop_worker(self):
+        self.worker_queue = []                          # the window is closing, drop anything not yet sent
+        if self.worker:
+            worker = self.worker
+            self.worker = None
+            worker.finished.disconnect()
+            worker.closeWriteChannel()                  # the worker exits once its stdin is closed
+            if not worker.waitForFinished(g.W_STOP_TIMEOUT):
+                worker.kill()
 
     #############################################
     #                                           #
     #   Functions for asynchronous export       #
     #                                           #
     #   1. start_async_export                   #
-    #   2. handle_export_stdout                 #
-    #   3. handle_export_stderr                 #
-    #   4. handle_finished_export               #
+    #   2. start_export                         #
+    #   3. handle_export_data                   #
+    #   4. handle_export_error                  #
+    #   5. handle_finished_export               #
     #                                           #
     #############################################
 
     def start_async_export(self, reps, destPath):
-        if not self.process:
-            self.export_success = []
-            self.export_fail = []
-            self.export_error_msg = ''
-            self.process = QProcess()
-            self.process.readyReadStandardOutput.connect(self.handle_export_stdout)
-            self.process.readyReadStandardError.connect(self.handle_export_stderr)
-            self.process.finished.connect(self.handle_finished_export)
-            self.status.showMessage("Exporting...")
-            self.progress_bar.setVisible(True)
-            if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
-                self.process.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_EXPORT, self.path, destPath, str(reps)])
-            else:
-                self.process.start(g.PROC_SCRIPT, [g.PROC_TYPE_EXPORT, self.path, destPath, str(reps)])            
-
-    def handle_export_stdout(self):
-        print('normal msg!')
-        data = self.process.readAllStandardOutput()
-        stdout = bytes(data).decode("utf8")
-        outs = stdout.split('\r\n')
-        for out in outs:
-            if out:
-                self.export_success.append(out)
-        
+        self.send_to_worker([g.PROC_TYPE_EXPORT, self.path, destPath, reps],
+                            self.handle_export_data,
+                            self.handle_export_error,
+                            self.handle_finished_export,
+                            self.start_export)
+
+    def start_export(self):
+        self.export_success = []
+        self.export_fail = []
+        self.export_error_msg = ''
+        self.status.showMessage("Exporting...")
+
+    def handle_export_data(self, out):
+        self.export_success.append(out)
 
-    def handle_export_stderr(self):
+    def handle_export_error(self, err):
         print('error msg:')
-        data = self.process.readAllStandardError()
-        stderr = bytes(data).decode("utf8")
-        #print(stderr)
-        errs = stderr.split('\r\n')                 # If multiple errors come in at once, split them up              
-        for err in errs:                            # Loop thru them all
-            if err:                             
-                try:
-                    literal_eval(err)               # Check if is anything other than string
-                    self.export_fail.append(err)    # if so, it is tuple! store it
-                except:
-                    self.export_error_msg = err     # Set the flag and store the message
-                    print(err)                      
+        if isinstance(err, list):           # Check if is anything other than string
+            self.export_fail.append(err)    # if so, it is (runID, repID)! store it
+        else:
+            self.export_error_msg = err     # Set the flag and store the message
+            print(err)                      
 
     def handle_finished_export(self):
         if not self.export_fail and not self.export_error_msg:     # complete success!   
@@ -1401,9 +1575,7 @@ class WindowMain(QMainWindow):
         else:                                                       # error message from export process
             self.status.showMessage("ERROR: Export could not complete.", g.SB_DURATION_ERROR)
         self.show_export_results_dialog(self.export_success, self.export_fail, self.export_error_msg)
-        self.progress_bar.setVisible(False)
         self.export_error_flag = False
-        self.process = None
 
     def show_export_results_dialog(self, yes, no, error=False):
         title = "Export complete."
@@ -1414,12 +1586,10 @@ class WindowMain(QMainWindow):
         if no:
             msg = msg+"\nWarning: Failed to export:\n"
             for rep in no:
-                rep = literal_eval(rep)
                 msg = msg+rep[0]+': '+rep[1]+'\n'
         if yes:
             msg = msg + "\nSuccessully exported:\n"
             for rep in yes:
-                rep = literal_eval(rep)
                 msg = msg+rep[0]+': '+rep[1]+'\n'
 
         if no: title = "Warning: some replicates failed to export"
@@ -1430,57 +1600,71 @@ class WindowMain(QMainWindow):
 
 
 
+    #############################################
+    #                                           #
+    #   Functions for run recovery              #
+    #                                           #
+    #   1. start_async_recover                  #
+    #   2. handle_recover_data                  #
+    #   3. handle_recover_error                 #
+    #   4. handle_finished_recover              #
+    #                                           #
+    #   Runs that were interrupted (the app     #
+    #   crashed or was killed mid-run) leave    #
+    #   a spill file behind (see ov_spill).     #
+    #   When the session is opened, the worker  #
+    #   saves their samples into the session    #
+    #   before it is read.                      #
+    #                                           #
+    #############################################
+
+    def start_async_recover(self):
+        if not find_spills(self.path):
+            return
+        self.send_to_worker([g.PROC_TYPE_RECOVER, self.path],
+                            self.handle_recover_data,
+                            self.handle_recover_error,
+                            self.handle_finished_recover,
+                            partial(self.status.showMessage, "Recovering interrupted runs..."))
+
+    def handle_recover_data(self, ids):
+        self.recovered_reps.append(ids)
+
+    def handle_recover_error(self, err):
+        print('recover error msg!')
+        print(err)
+
+    def handle_finished_recover(self):
+        if self.recovered_reps:
+            msg = 'The following replicates were interrupted before they finished. The data they collected has been recovered and they have been marked as errored:\n\n'
+            msg = msg + '\n'.join([ids[0]+', '+ids[1] for ids in self.recovered_reps])
+            show_alert(self, 'Recovered interrupted runs', msg)
+        self.recovered_reps = []
+
     #############################################
     #                                           #
     #   Functions for asynchronous data read    #
     #                                           #
     #   1. start_async_read                     #
-    #   2. handle_read_stdout                   #
-    #   3. handle_read_stderr                   #
+    #   2. handle_read_data                     #
+    #   3. handle_read_error                    #
     #   4. handle_finished_read                 #
     #                                           #
     #############################################
 
     def start_async_read(self):
-        print("hello, i'm an async read!")
-
-        ##############
-        #
-        #   HERE! Sort async process stuff for linux
-        #
-        #
-        #################
-
-        if not self.process:
-            self.process = QProcess()
-            self.process.readyReadStandardOutput.connect(self.handle_read_stdout)
-            self.process.readyReadStandardError.connect(self.handle_read_stderr)
-            self.process.finished.connect(self.handle_finished_read)
-            self.status.showMessage("Loading data...")
-            self.progress_bar.setVisible(True)
-            
-            
-            if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
-                self.process.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_READ, self.path])
-            else:
-                self.process.start(g.PROC_SCRIPT, [g.PROC_TYPE_READ, self.path])
+        self.send_to_worker([g.PROC_TYPE_READ, self.path],
+                            self.handle_read_data,
+                            self.handle_read_error,
+                            self.handle_finished_read,
+                            partial(self.status.showMessage, "Loading data..."))
 
-    def handle_read_stdout(self):
-        print('load normal msg!')
-        data = self.process.readAllStandardOutput()
-        stdout = bytes(data).decode("utf8")
-        try:
-            self.data = literal_eval(stdout)
-            #print(self.data)
-        except:
-            print('ERROR on literal eval of stdout:')
-            print(stdout)
+    def handle_read_data(self, data):
+        self.data = data
 
-    def handle_read_stderr(self):
+    def handle_read_error(self, err):
         print('load error msg!')
-        data = self.process.readAllStandardError()
-        stderr = bytes(data).decode("utf8")
-        print(stderr)
+        print(err)
         self.read_error_flag = True
 
     def handle_finished_read(self):
@@ -1490,9 +1674,7 @@ class WindowMain(QMainWindow):
             self.status.showMessage("Data loaded!", g.SB_DURATION)
             self.update_win()
             setWsEnabled(self.buts, True)                                   #   Enable buttons
-        self.progress_bar.setVisible(False)
         self.read_error_flag = False
-        self.process = None
         
 
 
@@ -1501,62 +1683,75 @@ class WindowMain(QMainWindow):
     #   Functions for asynchronous data save    #
     #                                           #
     #   1. start_async_save                     #
-    #   2. handle_save_stdout                   #
-    #   3. handle_save_stderr                   #
+    #   2. handle_save_data                     #
+    #   3. handle_save_error                    #
     #   4. handle_finished_save                 #
     #                                           #
+    #   Saves wait in the worker queue. If a    #
+    #   save can be merged into the one queued  #
+    #   right before it (see merge_saves in     #
+    #   ov_core), it is, and both sets of       #
+    #   callbacks run when the merged save is   #
+    #   done.                                   #
+    #                                           #
     #############################################
 
     def start_async_save(self, saveType, params, onSuccess=False, onError=False):
-        if self.process:        # if there is alreayd a process running
-            return              # don't start another one! 
-        
-        self.process = QProcess()
-        self.process.readyReadStandardOutput.connect(self.handle_save_stdout)
-        self.process.readyReadStandardError.connect(self.handle_save_stderr)
-        self.process.finished.connect(partial(self.handle_finished_save, onSuccess, onError))
-        self.status.showMessage("Saving...")
-        self.progress_bar.setVisible(True)
-
-        if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
-            self.process.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_SAVE, self.path, saveType, str(params)])
+        last = self.worker_queue[-1] if self.worker_queue else None
+        merged = None
+        if last and last['request'] is None:                        # if the last queued request is a save (not yet sent)
+            merged = merge_saves(last['saveType'], last['params'], saveType, params)
+        if merged is not None:                                      # fold this save into it
+            last['params'] = merged
+            entry = last
+        else:                                                       # otherwise queue a new save
+            entry = {'request': None,                               #   request is built when it is sent
+                     'saveType': saveType,
+                     'params': params,
+                     'successCallbacks': [],
+                     'errorCallbacks': []}
+            entry['onStart'] = partial(self.status.showMessage, "Saving...")
+            entry['onData'] = self.handle_save_data
+            entry['onError'] = self.handle_save_error
+            entry['onFinished'] = partial(self.handle_finished_save, entry['successCallbacks'], entry['errorCallbacks'])
+            self.worker_queue.append(entry)
+        if onSuccess:
+            entry['successCallbacks'].append(onSuccess)
+        if onError:
+            entry['errorCallbacks'].append(onError)
+        self.send_next_request()
+
+    def handle_save_data(self, data):
+        if is_delta(data) and self.data:                                # the worker sent only what the save changed
+            if g.S_SAMPLES in data:                                     #   samples added, removed or renamed: redraw everything
+                self.save_sample_ids = None
+            else:                                                       #   otherwise redraw only the samples it touched
+                self.save_sample_ids = get_delta_sample_ids(self.data, data)
+            self.data = apply_delta(self.data, data)
+            if self.save_sample_ids is not None:
+                self.save_sample_ids.update(get_delta_sample_ids(self.data, data))
         else:
-            self.process.start(g.PROC_SCRIPT, [g.PROC_TYPE_SAVE, self.path, saveType, str(params)])
-
-            
-
-    def handle_save_stdout(self):
-        print('normal msg:')
-        data = self.process.readAllStandardOutput()
-        stdout = bytes(data).decode("utf8")
-        #print(stdout)
-        try:
-            data = literal_eval(stdout)
+            self.save_sample_ids = None
             self.data = data
-        except:
-            print(data)
 
-    def handle_save_stderr(self):
+    def handle_save_error(self, err):
         print('error msg:')
-        data = self.process.readAllStandardError()
-        stderr = bytes(data).decode("utf8")
-        print(stderr)
+        print(err)
         self.save_error_flag = True
 
     def handle_finished_save(self, onSuccess, onError):
+        """onSuccess and onError are lists of callback fns, one from each save merged into this one"""
         try:
-            self.progress_bar.setVisible(False)                                             # Rehide the progress bar
-            self.process = None                                                             # Wipe the process from memory
             if self.save_error_flag:                                                        # If run errored
                 self.save_error_flag = False                                                #   Reset flag
                 self.status.showMessage("ERROR: Save could not complete.", g.SB_DURATION)   #   Show error message
-                if onError:                                                                 #   If there is an onError callback fn
-                    onError()                                                               #   run it! 
+                for fn in onError:                                                          #   Run any onError callback fns
+                    fn()
             else:                                                                           # If the run succeeded
                 self.status.showMessage("Saved!", g.SB_DURATION)                            #   Show success message
-                self.update_win()                                                           #   Update main window with new data
-                if onSuccess:                                                               #   If there is an onSuccess callback fn
-                    onSuccess()                                                             #   run it!
+                self.update_win(self.save_sample_ids)                                       #   Update main window with new data
+                for fn in onSuccess:                                                        #   Run any onSuccess callback fns
+                    fn()
                                                                      
         except Exception as e:
             print(e)
@@ -1637,6 +1832,7 @@ class WindowMain(QMainWindow):
                 self.children[0].close()        # closing the 0th child window (closing pops it from list)
                 
 
+            self.stop_worker()
             self.parent.children.remove(self)   # remove reference to this window from parent for memory cleanup
             event.accept()
         else:
@@ -79,6 +79,7 @@ from global_scripts.ov_functions import *
 
 from wins.sample import QVLine
 from embeds.methodPlot import MethodPlot
+from devices.supportedDevices import devices as DEVICES
 
 from functools import partial
 from copy import deepcopy
@@ -328,6 +329,12 @@ class WindowMethod(QMainWindow):
             self.data_collect.addItem('None', g.M_DATA_NONE)
             self.data_collect.addItem('Data', g.M_DATA_SIGNAL)
             self.data_collect.addItem('Background', g.M_DATA_BACKGROUND)
+
+            step_freq_lbl = QLabel('Sample frequency')
+            self.step_freq = QDoubleSpinBox()
+            self.step_freq.setRange(0, g.M_SAMPLE_FREQ_MAX)
+            self.step_freq.setSpecialValueText('Same as method')    # shown at 0, when the step has no frequency of its own
+            step_freq_unit_lbl = QLabel('Hz')
             
             step_type_lbl = QLabel('Step type')
             self.step_type = QComboBox()                                        # Create dropdown menu
@@ -392,6 +399,7 @@ class WindowMethod(QMainWindow):
             # Set up the group box where user enters step information
             v2a = QVBoxLayout()
             v2a.addLayout(horizontalize([data_collect_lbl,self.data_collect]))
+            v2a.addLayout(horizontalize([step_freq_lbl,self.step_freq,step_freq_unit_lbl]))
             v2a.addWidget(QHLine())
             v2a.addLayout(horizontalize([step_type_lbl,self.step_type]))
             v2a.addLayout(self.s_type)
@@ -524,6 +532,7 @@ class WindowMethod(QMainWindow):
         # Reset all values common to all runs
         self.step_name.setText('')
         self.data_collect.setCurrentIndex(0)
+        self.step_freq.setValue(0)
         self.step_type.setCurrentIndex(g.QT_NOTHING_SELECTED_INDEX)
 
         # clear relay content within the add/edit step pane
@@ -854,6 +863,7 @@ class WindowMethod(QMainWindow):
             if self.data_collect.itemData(i) == step[g.M_DATA_COLLECT]:
                 self.data_collect.setCurrentIndex(i)
                 break
+        self.step_freq.setValue(step.get(g.M_STEP_SAMPLE_FREQ, 0))
 
         # Check all the appropriate relays for this step
         for relay_index in step[g.M_RELAYS_ON]:
@@ -957,6 +967,8 @@ class WindowMethod(QMainWindow):
                 sr = self.ramp_duration_to_scan_rate(v0, vf, t)
                 w_volt.setText('ramp: '+str(v0)+'V'+' --> '+str(vf)+'V')
                 w_t = QLabel(str(sr)+'V/s')
+            if g.M_STEP_SAMPLE_FREQ in step:
+                w_t.setText(w_t.text()+' @ '+str(step[g.M_STEP_SAMPLE_FREQ])+'Hz')
 
             
             ws_relay = []
@@ -1221,6 +1233,8 @@ class WindowMethod(QMainWindow):
                 g.M_TYPE: step_type,
                 g.M_T: self.ts[step_type].value()
                 }            
+            if self.step_freq.value():                                  # only steps with a frequency of their own store one
+                data_general[g.M_STEP_SAMPLE_FREQ] = self.step_freq.value()
             
             ############################################ IF ADDING ANOTHER STEP TYPE, ADD ANOTHER ELIF TO THE CODE BELOW ############
             data_specific = {}                                                                                                      #
@@ -1357,10 +1371,10 @@ class WindowMethod(QMainWindow):
             dl = data[g.M_DETECTION_LIMIT]
             conf = data[g.M_CONF] 
 
-            cb_analysis = partial(self.parent.start_async_save, g.SAVE_TYPE_ANALYSES_DEL, [analyses_to_delete], cb_suc, cb_err)     # Callback to delete analyses after method is saved
-            cb_calcs = partial(self.parent.start_async_save, g.SAVE_TYPE_CALCS_FROM_METHOD, [unit, dl, conf, calcs_to_update], cb_analysis, cb_err)
-            
-            self.parent.start_async_save(g.SAVE_TYPE_METHOD_MOD, [self.method_id, data], onSuccess=cb_calcs, onError=cb_err)
+            saves = [[g.SAVE_TYPE_METHOD_MOD, [self.method_id, data]],                         # Save the method,
+                     [g.SAVE_TYPE_CALCS_FROM_METHOD, [unit, dl, conf, calcs_to_update]],        #   update the calcs that use it
+                     [g.SAVE_TYPE_ANALYSES_DEL, [analyses_to_delete]]]                          #   and delete analyses it invalidates, all in one save
+            self.parent.start_async_save(g.SAVE_TYPE_TRANSACTION, saves, onSuccess=cb_suc, onError=cb_err)
 
     def gather_inputs(self):
         # Gather optional savgol filter parameters
@@ -1408,12 +1422,18 @@ class WindowMethod(QMainWindow):
         return data
         
     def start_async_overwrite(self, toWrite):
-        self.process = QProcess()
+        self.status.showMessage("Saving method...")
+        if hasattr(self.parent, 'send_to_worker'):      # if opened from a lab session, use the session's worker
+            self.parent.send_to_worker([g.PROC_TYPE_OVERWRITE, self.path, toWrite],   # (queued if the worker is busy)
+                                       self.handle_overwrite_data,
+                                       self.handle_overwrite_error,
+                                       self.handle_finished_overwrite)
+            return
+            
+        self.process = QProcess()                       # otherwise, start a process just for this
         self.process.readyReadStandardOutput.connect(self.handle_overwrite_stdout)
         self.process.readyReadStandardError.connect(self.handle_overwrite_stderr)
         self.process.finished.connect(partial(self.handle_finished_overwrite))
-        self.status.showMessage("Saving method...")
-        print('got here!')
         
         if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
             self.process.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_OVERWRITE, self.path, str(toWrite)])
@@ -1425,13 +1445,19 @@ class WindowMethod(QMainWindow):
     def handle_overwrite_stdout(self):
         data = self.process.readAllStandardOutput()
         stdout = bytes(data).decode("utf8")
-        print(stdout)
+        self.handle_overwrite_data(stdout)
 
     def handle_overwrite_stderr(self):
-        print('error msg:')
         data = self.process.readAllStandardError()
         stderr = bytes(data).decode("utf8")
-        print(stderr)
+        self.handle_overwrite_error(stderr)
+
+    def handle_overwrite_data(self, out):
+        print(out)
+
+    def handle_overwrite_error(self, err):
+        print('error msg:')
+        print(err)
         self.save_error_flag = True
 
     def handle_finished_overwrite(self):
@@ -1483,6 +1509,14 @@ class WindowMethod(QMainWindow):
         if len(self.steps) == 0:                                                              # if no steps have been added
             show_alert(self, 'Error!', 'Please add at least one step to the method.')
             return False
+        unsupported = []
+        for step in self.steps:                                                               # if no supported device can sample
+            freq = get_step_sample_freq(self.dt.value(), step)                                #   as often as a step asks for
+            if not any(device_supports_sample_freq(device, freq) for device in DEVICES):
+                unsupported.append(step[g.M_STEP_NAME]+' ('+str(freq)+' Hz)')
+        if unsupported:
+            resp = show_warning("Warning: sample frequency", "Just a heads up, no supported device can sample at the frequency of these steps:\n"+'\n'.join(unsupported)+"\nAre you sure you want to continue?")
+            if not resp: return False
         if "" in self.relays:
             show_alert(self, 'Error!', 'Please enter a device name for all external devices/relays.')
             return False
@@ -1526,7 +1560,7 @@ class WindowMethod(QMainWindow):
             show_alert(self, 'Error!', 'Please ensure that a valid range is given for peak location (Analysis tab).')
             return False
         if self.g_sg.isChecked() and signal_steps:
-            freq = self.dt.value()
+            freq = get_step_sample_freq(self.dt.value(), signal_steps[0])
             dur = signal_steps[0][g.M_T]
             samples = int(freq * dur)
             if self.sg_window.value() >= samples:
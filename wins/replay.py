@@ -0,0 +1,93 @@
+"""
+replay.py
+
+This file defines a class WindowReplay, a run viewer (see runView)
+that replays a rep that was already run instead of running it on
+the potentiostat. The run session plays back the rep's recorded
+samples in real time, faster, or as fast as it can (see replay in
+process.py), and they go thru everything the samples of a live run
+go thru: the run session's frames, the queue, store_queued_data,
+the live plot and the save.
+
+The replayed rep is saved to a scratch copy of the session in a
+temporary folder (deleted when the window closes), never to the
+session itself, so the rep that was replayed is left as it is.
+
+When the replay is done, its throughput (see ov_replay) is shown
+in the run details.
+"""
+import os
+import shutil
+import tempfile
+import time
+from copy import deepcopy
+
+from global_scripts import ov_globals as g
+from global_scripts.ov_functions import *
+from global_scripts.ov_replay import ReplayStats, get_speed_text
+from wins.runView import WindowRunView
+
+
+class WindowReplay(WindowRunView):
+    def __init__(self, parent, task, speed):
+        self.speed = speed
+        self.stats = ReplayStats(speed)
+        self.scratch = tempfile.mkdtemp()
+        self.scratch_path = os.path.join(self.scratch, 'replay'+g.SAMPLE_EXT)
+        self.scratch_data = deepcopy(parent.data)
+        write_data_to_file(self.scratch_path, deepcopy(self.scratch_data))
+
+        super().__init__(parent, [tuple(task)])
+        self.setWindowTitle("OpenVoltam | Replay ("+get_speed_text(speed)+")")
+        self.but_analyze.hide()                     # (the replayed rep isn't in the session)
+
+    def get_run_request(self, i_max, relay_pins):
+        request = super().get_run_request(i_max, relay_pins)
+        return [g.PROC_TYPE_REPLAY, self.parent.path, self.tasks[self.current_task], self.speed] + request[1:]
+
+    def get_session_path(self):
+        return self.scratch_path
+
+    def get_session_data(self):
+        return self.scratch_data
+
+    def handle_save_data(self, data):
+        if is_delta(data):                          # (the worker keeps the scratch session too, see promote)
+            self.scratch_data = apply_delta(self.scratch_data, data)
+        else:
+            self.scratch_data = data
+
+    def update_parent_win(self, task):
+        pass                                        # (the main window doesn't show the scratch session)
+
+    def handle_msgs(self, frames):
+        for (ftype, payload) in frames:
+            if ftype == g.IPC_FRAME_DATA and str(payload).startswith(g.R_REPLAY_PREFIX):
+                self.stats.expected = int(str(payload)[len(g.R_REPLAY_PREFIX):])
+        super().handle_msgs(frames)
+
+    def store_queued_data(self, payload):
+        try:
+            (step_i, cols) = super().store_queued_data(payload)
+        except Exception:
+            self.stats.add_dropped()
+            raise
+        self.stats.add_frame(step_i, cols[0], time.perf_counter())
+        return (step_i, cols)
+
+    def graph_new_data(self):
+        t0 = time.perf_counter()
+        super().graph_new_data()
+        self.stats.add_draw(time.perf_counter() - t0)
+
+    def all_done(self):
+        super().all_done()
+        s = '<br><br><u>Replay</u><br>'
+        for (label, value) in self.stats.get_summary():
+            s = s + '<b>'+label+':</b> '+value+'<br>'
+        self.message(s)
+
+    def closeEvent(self, event):
+        super().closeEvent(event)
+        if event.isAccepted():
+            shutil.rmtree(self.scratch, ignore_errors=True)
@@ -15,7 +15,6 @@ from global_scripts.ov_functions import *
 from embeds.methodPlot import MethodPlot
 from devices.supportedDevices import devices
 
-from functools import partial
 
 from PyQt6.QtCore import Qt, QDateTime
 from PyQt6.QtWidgets import (
@@ -551,9 +550,10 @@ class WindowRunConfig(QMainWindow):
 
             cb_suc = self.after_save_changes_success
             cb_err = self.after_save_changes_error
-            cb_calc = partial(self.parent.start_async_save, g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive], cb_suc, cb_err)     # get callback to update calc archive status
-            self.status.showMessage('Saving run configuration...')                                                                                          #   callback calls run config after save routine on completion
-            self.parent.start_async_save(g.SAVE_TYPE_RUN_MOD, [self.run_id, new_data], onSuccess=cb_calc, onError=cb_err)      # run save with callback
+            saves = [[g.SAVE_TYPE_RUN_MOD, [self.run_id, new_data]],            # save the run and update calc archive status
+                     [g.SAVE_TYPE_CALCS_ARCHIVE, [True, calcs_to_archive]]]     #   in one save
+            self.status.showMessage('Saving run configuration...')
+            self.parent.start_async_save(g.SAVE_TYPE_TRANSACTION, saves, onSuccess=cb_suc, onError=cb_err)      # run save with callback
 
     def after_save_changes_success(self):
         self.status.showMessage('All changes saved.', g.SB_DURATION)
@@ -16,6 +16,27 @@ the following algorithm:
     input (save/delete, stop run, restart run, etc.)
 4. At end of complete run (all replicates complete), saves
     all data to file. 
+
+While a replicate runs, its samples are also streamed to a spill
+file (see ov_spill), so they survive the app crashing mid-run.
+Saving a replicate promotes its spill file into the session.
+
+Every replicate is run by the same run session (a process.py started
+once per window, see run_session in process.py), which stays connected
+to the potentiostat between replicates.
+
+Samples from the run session are decoded and stored by a worker thread
+(store_data_worker). The GUI thread only redraws the live plot, on a
+timer (refresh_plot), and hears that a replicate's samples are all
+stored through the data_stored signal.
+
+Finished replicates are saved by the main window's worker process
+(see promote in process.py), the one process that writes to the
+session, one after the other, while the next replicate is already
+running. Each save writes only that replicate (see promote_spill).
+Once saved, the worker also guesses the replicate's analysis and
+stores it as a provisional analysis, for the analysis window to
+start from (see ov_analysis).
     
 """
 import sys
@@ -23,8 +44,12 @@ import sys
 from global_scripts import ov_globals as g
 from global_scripts import ov_lang as l
 from global_scripts.ov_functions import *
+from global_scripts.ov_ipc import FrameReader, unpack_samples, encode_frame
+from global_scripts.ov_buffer import AcquisitionBuffer
+from global_scripts.ov_spill import SpillWriter, remove_spill
 
 from ast import literal_eval
+from functools import partial
 import threading
 from queue import SimpleQueue as Queue
 import time
@@ -33,7 +58,7 @@ from devices.supportedDevices import devices as DEVICES
 from embeds.runPlots import RunPlots
 from embeds.voltamOGram import VoltamogramPlot
 
-from PyQt6.QtCore import QProcess, QDateTime
+from PyQt6.QtCore import QProcess, QDateTime, QTimer, pyqtSignal
 from PyQt6.QtWidgets import (
     QMainWindow,
     QWidget,
@@ -47,6 +72,8 @@ from PyQt6.QtWidgets import (
 )
 
 class WindowRunView(QMainWindow):
+    data_stored = pyqtSignal()          # emitted by the worker thread once every sample of a rep is stored
+
     def __init__(self, parent, tasks):
         super().__init__()
         self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
@@ -67,6 +94,13 @@ class WindowRunView(QMainWindow):
         self.relays = []
         self.stopped = False
         self.q = Queue()
+        self.data_stored.connect(self.after_data_stored)
+        self.plot_timer = QTimer(self)
+        self.plot_timer.setSingleShot(True)     # rearmed by refresh_plot, so ticks never pile up
+        self.plot_timer.timeout.connect(self.refresh_plot)
+        self.spill = None               # SpillWriter of the rep running (or last run)
+        self.saves_pending = 0          # saves sent to the main window's worker that it hasn't finished yet
+        self.failed_saves = []
         self.status = self.statusBar()
         
         # Stacked layout in upper left
@@ -120,8 +154,8 @@ class WindowRunView(QMainWindow):
         lbl_error_in_save = QLabel("Yikes, we ran into an error saving the run!")
         lbl_error_in_save.setWordWrap(True)
         but_save_er_save = QPushButton('Try save again')
-        but_save_er_skip = QPushButton('go to next rep WITHOUT saving')
-        but_save_er_save.clicked.connect(self.next_run_with_save)
+        but_save_er_skip = QPushButton('finish WITHOUT saving')
+        but_save_er_save.clicked.connect(self.retry_saves)
         but_save_er_skip.clicked.connect(self.skip_save)
         v1 = QVBoxLayout()
         v1.addWidget(lbl_error_in_save)
@@ -135,14 +169,14 @@ class WindowRunView(QMainWindow):
         # Stacked item 5: All done.
         lbl_done = QLabel("Run complete!")
         lbl_done.setWordWrap(True)
-        but_analyze = QPushButton("Analyze results")
-        but_analyze.clicked.connect(self.analyze)
+        self.but_analyze = QPushButton("Analyze results")
+        self.but_analyze.clicked.connect(self.analyze)
         but_done = QPushButton("Close")
         but_done.clicked.connect(self.close)
         
         v1 = QVBoxLayout()
         v1.addWidget(lbl_done)
-        v1.addWidget(but_analyze)
+        v1.addWidget(self.but_analyze)
         v1.addWidget(but_done)
         w = QWidget()
         w.setLayout(v1)
@@ -248,8 +282,8 @@ class WindowRunView(QMainWindow):
         '''self.relay_statuses = {}'''
         try:
             (run_id, rep_id) = self.tasks[0]
-            run = get_run_from_file_data(self.parent.data, run_id)
-            method = get_method_from_file_data(self.parent.data, run[g.R_UID_METHOD])
+            run = get_run_from_file_data(self.get_session_data(), run_id)
+            method = get_method_from_file_data(self.get_session_data(), run[g.R_UID_METHOD])
             devs = method[g.M_EXT_DEVICES]
             this_device = next((device for device in DEVICES if device['name'] == run[g.R_DEVICE]), None)
             relay_pins = this_device['gpio']
@@ -289,11 +323,11 @@ class WindowRunView(QMainWindow):
     def start_run(self):
         try:
             if self.current_task < len(self.tasks):
-                if not self.process:
+                if not self.running_flag:
                     self.msg_box.setCurrentIndex(0)
                     (self.run_id, self.rep_id) = self.tasks[self.current_task]
-                    self.run = get_run_from_file_data(self.parent.data, self.run_id)
-                    self.method = get_method_from_file_data(self.parent.data, self.run[g.R_UID_METHOD])      ####### CAN WE MAKE method a local variable? Not self? Check in after modifying data save routine
+                    self.run = get_run_from_file_data(self.get_session_data(), self.run_id)
+                    self.method = get_method_from_file_data(self.get_session_data(), self.run[g.R_UID_METHOD])      ####### CAN WE MAKE method a local variable? Not self? Check in after modifying data save routine
                     self.steps = self.get_steps(self.method)
                     if not self.relays_in_steps(self.steps):
                         self.relays_enabled = False
@@ -304,13 +338,13 @@ class WindowRunView(QMainWindow):
                     self.graphs.init_plot(self.method)
 
                     # set pre-run variables
-                    [self.t, self.v, self.I] = [[],[],[]]
-                    self.current_step_index = 0
-                    self.t_prev = -1
-                    self.t_to_add = 0
+                    self.buffer = AcquisitionBuffer.for_method(self.method)
+                    if self.spill and self.spill.is_open():    # the last try of this rep (try_again) was never saved,
+                        self.spill.discard()                    #   so drop its samples (a closed spill is being saved)
+                    self.spill = SpillWriter(self.get_session_path(), (self.run_id, self.rep_id), self.steps)
                     self.error_run_msg = ''
                     self.error_run_flag = False
-                    self.data_storage_complete_flag = False
+                    self.n_plotted = 0
                     
                     # Setup some flags at beginning of run
                     self.running_flag = True
@@ -325,25 +359,23 @@ class WindowRunView(QMainWindow):
                     this_device = next((device for device in DEVICES if device['name'] == self.run[g.R_DEVICE]), None)
                     relay_pins = this_device['gpio']
 
-                    # Setup and start interrupt to retreive and plot data (this should end after last data from run is saved)
-                    thread = threading.Thread(target=self.interrupt_data_getter) 
-                    thread.daemon = True                            # interrupt ends when the start_run() fn returns
+                    # Start the worker that stores the rep's data as it arrives (it ends once the last of it
+                    #   is stored), and the timer that plots it
+                    thread = threading.Thread(target=self.store_data_worker)
+                    thread.daemon = True
                     thread.start()
+                    self.plot_timer.start(int(1000*g.R_PLOT_REFRESH_TIME))
 
-                    # Initiate and begin external process (that I/Os with potentiostat
-                    self.process = QProcess()
-                    self.process.readyReadStandardOutput.connect(self.handle_stdout)
-                    self.process.readyReadStandardError.connect(self.handle_stderr)
-                    self.process.stateChanged.connect(self.handle_state)
-                    self.process.finished.connect(self.handle_finished)
+                    # Start the run session (the external process that I/Os with the potentiostat) if
+                    #   it isn't running yet, and ask it to run this rep
+                    if not self.process:
+                        self.start_run_session()
 
                     self.status.showMessage('Running...')
                     self.count_status.setText(str(self.current_task+1))
 
-                    if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
-                        self.process.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_RUN, str(self.dt), i_max, str(self.steps), self.port, str(self.relays_enabled), str(relay_pins)])
-                    else:
-                        self.process.start(g.PROC_SCRIPT, [g.PROC_TYPE_RUN, str(self.dt), i_max, str(self.steps), self.port, str(self.relays_enabled), str(relay_pins)])
+                    request = self.get_run_request(i_max, relay_pins)
+                    self.process.write(encode_frame(g.IPC_FRAME_REQUEST, request))
 
 
 
@@ -351,9 +383,38 @@ class WindowRunView(QMainWindow):
             print('you are here!')
             print(e)
 
+    def get_run_request(self, i_max, relay_pins):
+        """Returns the request that asks the run session to run the current rep"""
+        return [g.PROC_TYPE_RUN, self.dt, i_max, self.steps, self.port, self.relays_enabled, relay_pins]
+
+    def get_session_path(self):
+        """Returns the path of the session the reps are saved to"""
+        return self.parent.path
+
+    def get_session_data(self):
+        """Returns the data of the session the reps are saved to"""
+        return self.parent.data
+
+    def start_run_session(self):
+        self.run_reader = FrameReader()
+        self.process = QProcess()
+        self.process.readyReadStandardOutput.connect(self.handle_stdout)
+        self.process.readyReadStandardError.connect(self.handle_stderr)
+        self.process.stateChanged.connect(self.handle_state)
+        self.process.finished.connect(self.handle_session_finished)
+        if g.PROC_RUN_FROM == g.PROC_RUN_FROM_PYTHON:
+            self.process.start(g.PROC_PYTHON_CMD, [g.PROC_SCRIPT_PYTHON, g.PROC_TYPE_RUN_SESSION])
+        else:
+            self.process.start(g.PROC_SCRIPT, [g.PROC_TYPE_RUN_SESSION])
+
+    def end_run_session(self):
+        """Lets the run session exit (and let go of the potentiostat) once it is done"""
+        if self.process:
+            self.process.closeWriteChannel()
+
     def set_run_details(self):
 
-        rep = get_rep(self.parent.data, self.tasks[self.current_task])
+        rep = get_rep(self.get_session_data(), self.tasks[self.current_task])
         
         s = '<u>'+self.tasks[self.current_task][0]+', '+self.tasks[self.current_task][1]+'</u><br>'
         s = s + '<b>Run type: </b>'+l.rc_types[self.run[g.R_TYPE]][g.L] +'<br>'
@@ -379,10 +440,22 @@ class WindowRunView(QMainWindow):
     def handle_stdout(self):
         #print('stdout')
         data = self.process.readAllStandardOutput()
-        stdout = bytes(data).decode("utf8")
-        
-        [prefixes, msgs] = self.unpack_msgs(stdout)
-        print(stdout)
+        frames = []
+        for frame in self.run_reader.feed(bytes(data)):
+            if frame[0] == g.IPC_FRAME_ERROR:           # the run failed...
+                self.handle_msgs(frames)
+                frames = []
+                self.handle_run_error(frame[1])
+            elif frame[0] == g.IPC_FRAME_FINISHED:      # ...or is over (after an error too)
+                self.handle_msgs(frames)
+                frames = []
+                self.handle_finished()
+            else:
+                frames.append(frame)
+        self.handle_msgs(frames)
+
+    def handle_msgs(self, frames):
+        [prefixes, msgs] = self.unpack_msgs(frames)
         for i, prefix in enumerate(prefixes):
             if prefix == g.R_DATA_PREFIX:
                 self.q.put(msgs[i])
@@ -430,9 +503,22 @@ class WindowRunView(QMainWindow):
         self.error_run_msg = err
         
                                                     #   typically by a return/newline (\r\n)
+    def handle_run_error(self, err):
+        print('ERROR PASSED THRU RUN SESSION')
+        print(err)
+        self.error_run_flag = True
+        self.error_run_msg = err
+
     def handle_state(self, state):
         return
 
+    def handle_session_finished(self):
+        """The run session exited. If it died in the middle of a run, that run is over, with an error"""
+        self.process = None
+        if self.running_flag and not self.stopped:
+            self.error_run_flag = True
+            self.handle_finished()
+
     def handle_finished(self):
         self.time_completed = QDateTime.currentDateTime().toString(g.DATETIME_STORAGE_FORMAT)
         self.status.showMessage('')
@@ -446,11 +532,18 @@ class WindowRunView(QMainWindow):
             #
             #
             ##########################
-        try:    
-            self.process = None                         # these two lines must be in this order, because running_flag==False
-            self.running_flag = False                   #   is a precondition for the interrupt to begin the save process
-            while not self.data_storage_complete_flag:  # Wait here until data is saved, before removing reference to process
-                time.sleep(0.25)
+        self.running_flag = False
+        self.q.put(None)                                # every sample of the rep is queued before this, so once the
+                                                        #   worker gets here it emits data_stored (-> after_data_stored)
+
+    def after_data_stored(self):
+        """Every sample of the rep is stored. Draws the last of them, then saves the rep,
+        or shows what went wrong if the run had an error."""
+        if self.stopped:
+            return
+        try:
+            self.plot_timer.stop()
+            self.graph_new_data()
 
             if self.error_run_flag:     # If there was an error during this run
                 self.status.showMessage('Error!')
@@ -470,8 +563,7 @@ class WindowRunView(QMainWindow):
                     self.msg_box.setCurrentIndex(3)
                 
             else:                                       # If run completed withou an error
-                self.status.showMessage('Saving...')    # ...This will only appear if we sort out async saves here....oh well. ####
-                self.synchronous_data_save()
+                self.queue_data_save()
                 
             
         except Exception as e:
@@ -481,14 +573,21 @@ class WindowRunView(QMainWindow):
     def message(self, s):
         self.run_details.append(s)
 
-    def unpack_msgs(self, str_bundle):
+    def unpack_msgs(self, frames):
+        """Takes in the frames read from the run process. Returns [prefixes, messages].
+        Sample frames get the data prefix and keep their payload as is (it is
+        unpacked by store_queued_data)"""
         try:
             prefixes = []
             messages = []
-            str_msgs = str_bundle.split('\r\n')
-            for s in str_msgs:
-                prefixes.append(s[0:len(g.R_DATA_PREFIX)])
-                messages.append(s[len(g.R_DATA_PREFIX):len(s)])
+            for (ftype, payload) in frames:
+                if ftype == g.IPC_FRAME_SAMPLES:
+                    prefixes.append(g.R_DATA_PREFIX)
+                    messages.append(payload)
+                else:
+                    s = str(payload)
+                    prefixes.append(s[0:len(g.R_DATA_PREFIX)])
+                    messages.append(s[len(g.R_DATA_PREFIX):len(s)])
             return [prefixes, messages]
         except Exception as e:
             print(e)
@@ -518,16 +617,28 @@ class WindowRunView(QMainWindow):
         
     def next_run_with_save(self):
         self.msg_box.setCurrentIndex(0)
-        self.synchronous_data_save()
+        self.queue_data_save()
 
     def next_run_save_nothing(self):
         self.msg_box.setCurrentIndex(0)
-        [self.t, self.v, self.I] = [[],[],[]]
-        self.synchronous_data_save()
+        self.buffer = AcquisitionBuffer()
+        self.spill.discard()                                                # start the spill over with no samples in it
+        self.spill = SpillWriter(self.get_session_path(), self.tasks[self.current_task], self.steps)
+        self.queue_data_save()
+
+    def retry_saves(self):
+        self.msg_box.setCurrentIndex(0)
+        saves = self.failed_saves
+        self.failed_saves = []
+        for save in saves:
+            self.start_save(save)
 
     def skip_save(self):
         self.msg_box.setCurrentIndex(0)
-        self.go_to_next_step()
+        for save in self.failed_saves:
+            remove_spill(save[1])                   # the user doesn't want their data
+        self.failed_saves = []
+        self.all_done()
 
     def toggle_relays_and_repeat(self):
         self.relays_enabled = False
@@ -544,23 +655,23 @@ class WindowRunView(QMainWindow):
     
     def set_voltamogram(self):
         run_id = self.tasks[0][0]                   # get run info
-        run = get_run_from_file_data(self.parent.data, run_id)
+        run = get_run_from_file_data(self.get_session_data(), run_id)
         sample_id = run[g.R_UID_SAMPLE]             # get sample run is attached to
         method_id = run[g.R_UID_METHOD]             # get method from run
         
         runs_to_plot = [] 
-        for run in self.parent.data[g.S_RUNS]:      # find all runs with matching method and sample
+        for run in self.get_session_data()[g.S_RUNS]:   # find all runs with matching method and sample
             if run[g.R_UID_METHOD] == method_id and run[g.R_UID_SAMPLE] == sample_id:
                 runs_to_plot.append(run)
                                                     # plot the found runs!
         self.voltamogram.plot_runs(runs_to_plot, showsmoothed=True, showraw=False,
                                        color='grey', legend=False)
 
-    def update_voltamogram(self, task):
+    def update_voltamogram(self, task, raw=None):
+        """Plots the rep of task. raw is its (data, background), if they are at hand"""
         try:
-            print(task)
             self.voltamogram.plot_reps([task], showsmoothed=True, showraw=False,
-                                       color='black', legend=False)
+                                       color='black', legend=False, raw={tuple(task): raw} if raw else None)
         except Exception as e:
             print(e)
         
@@ -569,50 +680,94 @@ class WindowRunView(QMainWindow):
     #                                       #
     #   Functions for async save            #
     #                                       #
+    #   1. queue_data_save                  #
+    #   2. start_save                       #
+    #   3. handle_save_data                 #
+    #   4. handle_finished_save             #
+    #   5. after_rep_saved                  #
+    #   6. update_parent_win                #
+    #   7. after_rep_save_failed            #
+    #   8. end_save                         #
+    #                                       #
     #########################################
 
-    def synchronous_data_save(self):
-        try:
-            data = get_data_from_file(self.parent.path)
-            task = self.tasks[self.current_task]
-            rep = get_rep(data, task)
-            if self.error_run_flag:
-                rep[g.R_STATUS] = g.R_STATUS_ERROR
-            else:
-                rep[g.R_STATUS] = g.R_STATUS_COMPLETE
-            rep[g.R_TIMESTAMP_REP] = self.time_completed
-            try:
-                (new_signal, new_background) = self.raw_data_to_dict()
-                rep[g.R_DATA] = new_signal
-                rep[g.R_BACKGROUND] = new_background
-            except Exception as e:
-                print(e)
-
-            write_data_to_file(self.parent.path, data)
-            self.update_voltamogram(task)
-            data = remove_data_from_layout(data)
-            self.parent.data = data
-            self.parent.update_win()
-            self.status.showMessage('Complete.')
-            self.go_to_next_step()
-            
+    def queue_data_save(self):
+        """Hands the rep that just finished to the save worker and goes on to the
+        next task right away, without waiting for the save"""
+        task = self.tasks[self.current_task]
+        if self.error_run_flag:
+            status = g.R_STATUS_ERROR
+        else:
+            status = g.R_STATUS_COMPLETE
+        self.spill.close()                                  # every sample is in the spill file by now
+        self.start_save((task, self.spill.path, status, self.time_completed))
+        self.go_to_next_step()
 
-        except Exception as e:
-            self.msg_box.setCurrentIndex(4) # if save error, alert the user!
-            print(e)
+    def start_save(self, save):
+        """Takes in a save (task, path of its spill file, status, time completed) and
+        sends it to the main window's worker, which promotes the spill file into the
+        session (see promote in process.py) after any save already queued"""
+        (task, spillpath, status, timestamp) = save
+        errors = []
+        self.saves_pending = self.saves_pending + 1
+        self.status.showMessage('Saving...')
+        self.parent.send_to_worker([g.PROC_TYPE_PROMOTE, self.get_session_path(), list(task), spillpath, status, timestamp],
+                                   self.handle_save_data,
+                                   errors.append,
+                                   partial(self.handle_finished_save, save, errors))
+
+    def handle_save_data(self, data):
+        self.parent.handle_save_data(data)                  # (the worker sends the session, or what the save changed in it)
+
+    def handle_finished_save(self, save, errors):
+        if errors:
+            self.after_rep_save_failed(save, ' '.join(errors))
+        else:
+            self.after_rep_saved(save[0])
+
+    def after_rep_saved(self, task):
+        rep = get_rep(self.get_session_data(), task)
+        raw = get_rep_data(self.get_session_path(), task, rep.get(g.R_RAW_INDEX))
+        self.update_voltamogram(task, raw)
+        self.update_parent_win(task)
+        self.end_save()
+
+    def update_parent_win(self, task):
+        """Redraws the main window's tab of the sample that the rep of task is of"""
+        run = get_run_from_file_data(self.get_session_data(), task[0])
+        self.parent.update_win({run[g.R_UID_SAMPLE]})
+
+    def after_rep_save_failed(self, save, err):
+        print(err)
+        self.failed_saves.append(save)                      # (its spill file is kept until it is saved)
+        self.end_save()
+
+    def end_save(self):
+        self.saves_pending = self.saves_pending - 1
+        if not self.saves_pending:
+            if self.running_flag:
+                self.status.showMessage('Running...')
+            elif self.current_task >= len(self.tasks):      # that was the last save of the last task
+                self.all_done()
 
     def go_to_next_step(self):
         self.current_task = self.current_task + 1
         if self.current_task < len(self.tasks):
             self.start_run()
-        else:
+        elif not self.saves_pending:                # otherwise end_save calls all_done once the saves are done
             self.all_done()
             
     def all_done(self):
+        self.end_run_session()
+        if self.failed_saves:                       # let the user try the saves that failed again
+            self.status.showMessage('Error!')
+            self.msg_box.setCurrentIndex(4)
+            return
+        self.status.showMessage('Complete.')
         s = '<u>Run summary</u><br><br>'
         ers = False
         for task in self.tasks:
-            rep = get_rep(self.parent.data, task)
+            rep = get_rep(self.get_session_data(), task)
             if rep[g.R_STATUS] == g.R_STATUS_COMPLETE:
                 s = s +'<b>'+ task[0] + ', ' + task[1] +'</b>:   <u>Complete</u><br>'
             elif rep[g.R_STATUS] == g.R_STATUS_ERROR:
@@ -630,19 +785,6 @@ class WindowRunView(QMainWindow):
 
         
         
-    # STUFF FOR ASYNC SAVE...REHAB THIS SOMEDAY?
-    '''self.status.showMessage('Saving run...')
-        self.parent.start_async_save(g.SAVE_TYPE_REP_WITH_DATA,
-                                     [self.tasks[self.current_task], newRep],
-                                     onSuccess=self.after_save_success,
-                                     onError=self.after_save_error)'''
-
-    '''def after_save_success(self):
-        print('saved successfully!')
-
-    def after_save_error(self):
-        print('save ErR0r!')'''
-    ##########################
 
                          
     
@@ -659,8 +801,12 @@ class WindowRunView(QMainWindow):
             if self.process:
                 self.stopped = True
                 self.running_flag = False
+                self.plot_timer.stop()
+                self.q.put(None)                # let the worker end
                 self.process.kill()
                 self.process = None
+                if self.spill and self.spill.is_open():
+                    self.spill.discard()        # the user stopped it, so its samples are not wanted (and not to be recovered)
                 # Display message that allows user to resume from start of active run
                 #
                 #
@@ -716,117 +862,69 @@ class WindowRunView(QMainWindow):
                 return True      
         return False
         
-    def raw_data_to_dict(self):
-        # figure out which data to actually keep
-        t = []
-        collects_signal = []
-        collects_background = []
-        
-        for step in self.steps:
-            if step[g.M_TYPE] != g.M_RELAY_STEP:
-                if not t:
-                    t0 = 0
-                    t1 = step[g.M_T]
-                else:
-                    t0 = t[-1]
-                    t1 = t[-1]+step[g.M_T]
-
-                t.append(t0)
-                t.append(t1)
-
-                ############################################################# HERE MODIFY THIS TO INCLUDE SIGNAL AND BACKGROUND ALIGNMENT
-                
-                if step[g.M_DATA_COLLECT] == g.M_DATA_SIGNAL:
-                    collects_signal.append((t0,t1))
-                if step[g.M_DATA_COLLECT] == g.M_DATA_BACKGROUND:
-                    collects_background.append((t0,t1))
-            
-
-        # only store for saving the data that the user has asked to save
-        data = []
-        background = []
-        for i, t in enumerate(self.t):
-            for collect_signal in collects_signal:
-                if t >= collect_signal[0] and t <= collect_signal[1]:
-                    data.append({g.R_DATA_TIME: round(self.t[i], 4),
-                                 g.R_DATA_VOLT: self.v[i],
-                                 g.R_DATA_CURR: self.I[i]})
-                    break
-            for collect_back in collects_background:
-                if t >= collect_back[0] and t <= collect_back[1]:
-                    background.append({g.R_DATA_TIME: round(self.t[i], 4),
-                                 g.R_DATA_VOLT: self.v[i],
-                                 g.R_DATA_CURR: self.I[i]})
-                    break
-
-                #########################################################################################################
-                
-        return (data, background)
-
     #########################################
     #                                       #
-    #   Interrupt data getter               #
-    #    (and associated functions)         #
+    #   Data worker and live plot           #
     #                                       #
-    #   1. interrupt_data_getter            #
-    #   2. store_and_graph_from_queue       #
+    #   1. store_data_worker                #
+    #   2. refresh_plot                     #
     #   3. graph_new_data                   #
     #   4. store_queued_data                #
-    #   5. save_rep_raw_data                #
     #                                       #
     #########################################
 
-    def interrupt_data_getter(self):
+    def store_data_worker(self):
         """
-        This function is designed to be run as an interrupt and should only be started
-        once the run has been initiated and self.running==True.
+        Runs in its own thread, started for each rep by start_run. Takes each batch of
+        samples off the queue as handle_msgs puts it there, and stores it (in the buffer
+        and the spill file). Never touches the GUI.
 
-        As long as the running flag is set, this fn loops every g.R_PLOT_REFRESH_TIME seconds.
-        On each loop, if there is data waiting on the queue, calls a function to handle
-        that data.
-
-        Once the run is complete, it waits for g.R_POST_RUN_WAIT_TIME to ensure that all
-        straggler datapoints are in the queue, then handles the queued  data one last time.
+        handle_finished puts None on the queue after the rep's last batch. When the worker
+        gets to it, every sample is stored: it emits data_stored and ends.
+        """
+        while True:
+            item = self.q.get()                 # (blocks until there is something)
+            if item is None:
+                break
+            try:
+                self.store_queued_data(item)
+            except Exception as e:
+                print(e)
+        self.data_stored.emit()                 # (Qt delivers this to after_data_stored on the GUI thread)
 
+    def refresh_plot(self):
         """
-        
-        while self.running_flag:          # while run is ongoing
-            #print('checking')
-            self.store_and_graph_from_queue()   
-            time.sleep(g.R_PLOT_REFRESH_TIME)   # (this controls frequency of interrupt)
-
-        time.sleep(g.R_POST_RUN_WAIT_TIME)      # once run is complete, wait a bit to make sure all remaining data is in queue
-        self.store_and_graph_from_queue()       # and store and graph all the data remaining in queue
-        self.data_storage_complete_flag = True  # Indicate that all data has been stored in RAM and return, ending interrupt thread
-
-    def store_and_graph_from_queue(self):
-        while not self.q.empty():                       # and there is some data in queue
-            self.store_queued_data() # store the data
-        self.graph_new_data()
+        Runs on the GUI thread off self.plot_timer while the rep is running. Draws the
+        samples stored since the last refresh, if there are any.
+
+        The next refresh is scheduled for when this one is done, and the busier drawing
+        keeps the GUI, the longer the wait: the time between refreshes is the time the
+        draw took over g.R_PLOT_MAX_LOAD, and between g.R_PLOT_REFRESH_TIME and
+        g.R_PLOT_MAX_REFRESH_TIME. If drawing falls behind, refreshes are skipped and the
+        samples in between are drawn together by the next one.
+        """
+        if not self.running_flag:
+            return
+        interval = g.R_PLOT_REFRESH_TIME
+        if len(self.buffer) > self.n_plotted:
+            t0 = time.perf_counter()
+            self.graph_new_data()
+            drawtime = time.perf_counter() - t0
+            interval = min(max(drawtime / g.R_PLOT_MAX_LOAD, g.R_PLOT_REFRESH_TIME), g.R_PLOT_MAX_REFRESH_TIME)
+        self.plot_timer.start(int(1000*interval))
         
     def graph_new_data(self):
-        self.graphs.update_plots(self.t, self.v, self.I)
-
-    def store_queued_data(self):
-        a = self.q.get()                                            # Get oldest item from queue
-        data_tup = literal_eval(a)                                  # Convert to tuple
-        t_now = data_tup[0]                                         # Grab time from tuple
-        if t_now < self.t_prev:                                     # If this is the start of a new step
-            step = self.method[g.M_STEPS][self.current_step_index]  #   get the current step
-            dur = step[g.M_T]                                       #   get expected duration from method
-            if dur - self.t_prev < self.dt:                         #   if the last time value reported is less than dt from the duration
-                self.t_to_add = self.t_to_add + dur                 #       yay! the duration was pretty accurate!
-            else:                                                   #   otherwise
-                self.t_to_add = self.t_prev                         #       assume the previous run ended after last timestamp
-            self.current_step_index = self.current_step_index + 1   # increment the current step index
-            
-        t_new = t_now + self.t_to_add
-        v_new = data_tup[1]
-        I_new = data_tup[2]
-        self.t.append(t_now + self.t_to_add)                        # Append values for plotting 
-        self.v.append(v_new)
-        self.I.append(I_new)                                        # Append tuple to appropriate method list
-        self.t_prev = t_now                                         # Store this time as the previous time for next
+        (t, v, I) = self.buffer.view()
+        self.graphs.update_plots(t, v, I)
+        self.n_plotted = len(t)
+
+    def store_queued_data(self, payload):
+        """Stores a batch of samples. Returns (index of their step, their columns)"""
+        (step_i, cols) = unpack_samples(payload)                    # Get the batch of samples as arrays
+                                                                    #   (times are already counted from the start of the run)
+        self.buffer.append(cols[0], cols[1], cols[2])               # Append values for plotting...
+        self.spill.append(step_i, cols[0], cols[1], cols[2])        # ...and for saving
+        return (step_i, cols)
 
     
 
@@ -869,9 +967,15 @@ class WindowRunView(QMainWindow):
         if self.running_flag:
             event.ignore()
             show_alert(self, "Alert!", "Sorry, cannot close this window while the run is ongoing. If you need to stop an ongoing run, just unplug the potentiostat!")
+        elif self.saves_pending:
+            event.ignore()
+            show_alert(self, "Alert!", "Sorry, cannot close this window until the runs are done saving.")
         else:
             self.parent.setEnabled(True)
             self.parent.set_enabled_children(True)
+            if self.spill and self.spill.is_open():     # a rep the user never chose to save
+                self.spill.discard()
+            self.end_run_session()
             self.accept_close(event)
 
     def accept_close(self, closeEvent):